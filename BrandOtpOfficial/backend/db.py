@@ -1,7 +1,11 @@
 import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 
 # Load environment variables (.env handling for local/dev)
 env_path = Path(__file__).parent / '.env'
@@ -58,8 +62,40 @@ wallets_collection = db["wallets"]
 payments_collection = db["payments"]
 numbers_collection = db["numbers"]      # If number-related used anywhere
 smsman_purchases_collection = db["smsman_purchases"]
+purchase_sagas_collection = db["purchase_sagas"]
+stats_rollups_collection = db["stats_rollups"]
+user_counters_collection = db["user_counters"]
+jobs_collection = db["jobs"]
 # Helpers / quick accessor
 def get_db():
     return db
 
+# Bounded pool for blocking PyMongo calls made from async routes, so a slow
+# Atlas round trip stalls one worker thread instead of the event loop
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", 32))
+_db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking PyMongo call on the DB thread pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
+
+# Flipped off the first time the server rejects a transaction (standalone mongod)
+_transactions_supported = True
+
+def run_in_transaction(callback):
+    """Run callback(session) in a transaction, or without one if unsupported"""
+    global _transactions_supported
+    if _transactions_supported:
+        try:
+            with client.start_session() as session:
+                return session.with_transaction(callback)
+        except OperationFailure as e:
+            # IllegalOperation: transactions need a replica set (Atlas always has one)
+            if e.code != 20 and "replica set" not in str(e):
+                raise
+            print("⚠️ MongoDB transactions unavailable, multi-document writes are not atomic")
+            _transactions_supported = False
+    return callback(None)
+
 print("🎉 Database setup completed successfully!")
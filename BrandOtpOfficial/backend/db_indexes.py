@@ -0,0 +1,202 @@
+# backend/db_indexes.py
+"""
+Index bootstrap for every Mongo collection.
+
+Runs at startup (ensure_indexes) and as a CLI:
+
+    python -m backend.db_indexes            # create indexes + explain check
+    python -m backend.db_indexes --explain  # only report collection scans
+
+create_index is idempotent, so re-running is cheap. An index that cannot be
+built (e.g. duplicate emails blocking a unique index) is reported and skipped
+instead of stopping the app.
+"""
+import sys
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from backend.db import (
+    users_collection,
+    payments_collection,
+    wallets_collection,
+    otp_requests_collection,
+    orders_collection,
+    smsman_purchases_collection,
+    purchase_sagas_collection,
+    jobs_collection
+)
+
+JOB_RETENTION = 7 * 24 * 3600  # Finished jobs are kept a week for inspection
+
+INDEXES: List[Tuple[Any, List[IndexModel]]] = [
+    (users_collection, [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_id")
+    ]),
+    (smsman_purchases_collection, [
+        IndexModel([("request_id", ASCENDING)], name="request_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created"),  # SMS poller sync
+        IndexModel([("country_id", ASCENDING), ("created_at", DESCENDING)], name="country_created")  # Search popularity
+    ]),
+    (payments_collection, [
+        # Ledger entries have no order_id, only Pay0 top-up records do
+        IndexModel(
+            [("order_id", ASCENDING)],
+            name="order_id_unique",
+            unique=True,
+            partialFilterExpression={"order_id": {"$type": "string"}}
+        ),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_id"),
+        # One debit and at most one refund credit per saga: concurrent recoveries cannot refund twice
+        IndexModel(
+            [("saga_id", ASCENDING), ("type", ASCENDING)],
+            name="saga_type_unique",
+            unique=True,
+            partialFilterExpression={"saga_id": {"$exists": True}}
+        ),
+        # One refund credit per cancelled number: a redelivered refund job fails instead of crediting twice
+        IndexModel(
+            [("request_id", ASCENDING), ("type", ASCENDING)],
+            name="request_refund_unique",
+            unique=True,
+            partialFilterExpression={"request_id": {"$exists": True}, "type": "credit"}
+        ),
+        IndexModel(
+            [("credit_state", ASCENDING), ("claimed_at", ASCENDING)],
+            name="credit_state_claimed",
+            partialFilterExpression={"credit_state": {"$exists": True}}
+        )
+    ]),
+    (wallets_collection, [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_id"),
+        IndexModel(
+            [("order_id", ASCENDING), ("status", ASCENDING)],
+            name="order_status",
+            partialFilterExpression={"order_id": {"$exists": True}}
+        ),
+        # One ledger credit per Pay0 order: a replayed top-up fails instead of crediting twice
+        IndexModel(
+            [("order_id", ASCENDING)],
+            name="order_id_unique",
+            unique=True,
+            partialFilterExpression={"order_id": {"$type": "string"}}
+        ),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_id")
+    ]),
+    (otp_requests_collection, [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created")
+    ]),
+    (orders_collection, [
+        IndexModel([("created_at", DESCENDING)], name="created_at")
+    ]),
+    (purchase_sagas_collection, [
+        IndexModel([("state", ASCENDING), ("updated_at", ASCENDING)], name="state_updated")
+    ]),
+    (jobs_collection, [
+        IndexModel([("state", ASCENDING), ("run_at", ASCENDING)], name="state_run_at"),
+        IndexModel([("state", ASCENDING), ("lease_until", ASCENDING)], name="state_lease"),
+        # Only queued/running jobs carry a dedupe_key; it is unset when they finish
+        IndexModel(
+            [("dedupe_key", ASCENDING)],
+            name="dedupe_key_unique",
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$type": "string"}}
+        ),
+        IndexModel([("finished_at", ASCENDING)], name="finished_ttl", expireAfterSeconds=JOB_RETENTION)
+    ])
+]
+
+# Indexes replaced by a differently named one: (collection, old name, replacement).
+# The old index is dropped once its replacement exists, never before.
+REPLACED_INDEXES: List[Tuple[Any, str, str]] = [
+    (payments_collection, "saga_type", "saga_type_unique")
+]
+
+# Listing indexes end in _id so keyset pages (created_at, _id) need no sort stage.
+# Representative hot queries: (collection, filter, sort)
+REPRESENTATIVE_QUERIES: List[Tuple[Any, dict, List[Tuple[str, int]]]] = [
+    (users_collection, {"email": "user@example.com"}, []),
+    (users_collection, {"username": "someone"}, []),
+    (smsman_purchases_collection, {"request_id": 123456}, []),
+    (smsman_purchases_collection, {"user_id": "0" * 24}, [("created_at", DESCENDING)]),
+    (smsman_purchases_collection, {"status": "waiting_sms", "created_at": {"$gte": 0}}, []),
+    (smsman_purchases_collection, {"country_id": 91, "created_at": {"$gte": 0}}, []),
+    (payments_collection, {"order_id": "ORD_example"}, []),
+    (payments_collection, {"user_id": "0" * 24}, [("created_at", DESCENDING)]),
+    (wallets_collection, {"user_id": "0" * 24}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    (wallets_collection, {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),  # Admin transactions
+    (users_collection, {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),  # Admin users
+    (wallets_collection, {"order_id": "ORD_example", "status": "completed"}, []),
+    (payments_collection, {"credit_state": "pending", "claimed_at": {"$lt": 0}}, []),  # Top-up sweeper
+    (payments_collection, {"request_id": 123456, "type": "credit"}, []),  # Number refund check
+    (otp_requests_collection, {"user_id": "user@example.com"}, [("created_at", DESCENDING)]),
+    (purchase_sagas_collection, {"state": {"$in": ["started", "reserved"]}, "updated_at": {"$lt": 0}}, []),
+    (jobs_collection, {"state": "queued", "run_at": {"$lte": 0}}, [("run_at", ASCENDING)]),  # Job lease
+    (jobs_collection, {"state": "running", "lease_until": {"$lt": 0}}, [])
+]
+
+def ensure_indexes() -> Dict[str, Any]:
+    """Create every declared index; returns {collection: [names]} plus any failures"""
+    report: Dict[str, Any] = {"created": {}, "failed": []}
+
+    for collection, models in INDEXES:
+        names = []
+        for model in models:
+            try:
+                names.extend(collection.create_indexes([model]))
+            except OperationFailure as e:
+                name = model.document.get("name")
+                print(f"⚠️ Index {collection.name}.{name} not built: {e}")
+                report["failed"].append({"collection": collection.name, "index": name, "error": str(e)})
+        report["created"][collection.name] = names
+
+    for collection, old, replacement in REPLACED_INDEXES:
+        existing = collection.index_information()
+        if old in existing and replacement in existing:
+            collection.drop_index(old)
+            print(f"🗑️ Dropped index {collection.name}.{old} (replaced by {replacement})")
+
+    total = sum(len(names) for names in report["created"].values())
+    print(f"✅ Indexes ensured: {total} across {len(INDEXES)} collections, {len(report['failed'])} failed")
+    return report
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+def find_collection_scans() -> List[Dict[str, Any]]:
+    """explain() each representative query and return the ones planned as COLLSCAN"""
+    scans = []
+    for collection, query, sort in REPRESENTATIVE_QUERIES:
+        cursor = collection.find(query).limit(50)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        except OperationFailure as e:
+            print(f"⚠️ explain failed for {collection.name} {query}: {e}")
+            continue
+        if _has_collscan(plan):
+            scans.append({"collection": collection.name, "filter": str(query), "sort": str(sort)})
+
+    if scans:
+        for scan in scans:
+            print(f"❌ COLLSCAN: {scan['collection']} {scan['filter']} sort={scan['sort']}")
+    else:
+        print(f"✅ No collection scans in {len(REPRESENTATIVE_QUERIES)} representative queries")
+    return scans
+
+if __name__ == "__main__":
+    if "--explain" not in sys.argv:
+        ensure_indexes()
+    sys.exit(1 if find_collection_scans() else 0)
@@ -5,8 +5,10 @@ from datetime import datetime
 from bson import ObjectId
 
 # Import database and auth
-from backend.db import users_collection
-from backend.utils.auth_utils import get_current_user
+from backend.db import users_collection, run_db
+from backend.utils.auth_utils import get_current_user, invalidate_user
+from backend.utils.wallet_utils import get_wallet_balance
+from backend.utils.user_counters import get_counters
 
 router = APIRouter()
 
@@ -28,10 +30,11 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
             "email": user.get("email", ""),
             "balance": float(user.get("balance", 0.0)),
             "is_active": user.get("is_active", True),
-            "created_at": user.get("created_at").isoformat() if user.get("created_at") else None,
-            "total_orders": 0,  # You can count from orders collection later
-            "total_spent": 0.0   # You can calculate from transactions later
+            "created_at": user.get("created_at").isoformat() if user.get("created_at") else None
         }
+        counters = await run_db(get_counters, current_user["id"])
+        profile_data["total_orders"] = counters["total_orders"]
+        profile_data["total_spent"] = counters["total_spent"]
         
         return {
             "success": True,
@@ -49,12 +52,13 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
 async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     """Get dashboard statistics"""
     try:
-        # You can expand this with real data from your collections
+        counters = await run_db(get_counters, current_user["id"])
         stats = {
-            "total_balance": float(current_user.get("balance", 0.0)),
-            "total_orders": 0,
-            "active_numbers": 0,
-            "pending_requests": 0
+            "total_balance": await run_db(get_wallet_balance, current_user["id"]) or 0.0,
+            "total_orders": counters["total_orders"],
+            "total_spent": counters["total_spent"],
+            "active_numbers": counters["active_numbers"],
+            "pending_requests": counters["otp_pending"]
         }
         
         return {
@@ -96,6 +100,7 @@ async def update_user_profile(
             )
             
             if result.modified_count > 0:
+                invalidate_user(current_user["id"])
                 return {"success": True, "message": "Profile updated successfully"}
             else:
                 return {"success": False, "message": "No changes made"}
@@ -2,12 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
 from fastapi.responses import JSONResponse
 from datetime import datetime
 from bson import ObjectId
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import pymongo
 
-from backend.db import db, users_collection, services_collection, otp_requests_collection, orders_collection, wallets_collection
+from backend.db import db, run_db, users_collection, services_collection, otp_requests_collection, orders_collection, wallets_collection
 from backend.models.service import ServiceUpdate, ServiceResponse
-from backend.utils.auth_utils import get_current_user
+from backend.utils.auth_utils import get_current_user, invalidate_user
+from backend.utils.pagination import fetch_page, count_total
+from backend.utils import stats_rollups, job_queue
 
 # Create router instance
 router = APIRouter()
@@ -82,18 +84,22 @@ async def verify_admin(current_user=Depends(get_current_user)):
 @router.get("/users")
 async def get_all_users(
     limit: int = Query(50, ge=1, le=200, description="Number of users to fetch"),
-    skip: int = Query(0, ge=0, description="Number of users to skip"),
+    skip: int = Query(0, ge=0, description="Number of users to skip (legacy, prefer cursor)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    total: Literal["exact", "estimated", "none"] = Query("estimated", description="How to count total users"),
     admin=Depends(verify_admin)
 ):
     """Return list of all users with their wallet balances"""
     try:
-        # Get users with pagination
-        users = list(
-            users_collection
-            .find({}, {"hashed_password": 0})  # Exclude password hash
-            .sort("created_at", pymongo.DESCENDING)
-            .skip(skip)
-            .limit(limit)
+        # Get users with keyset pagination
+        users, next_cursor = await run_db(
+            fetch_page,
+            users_collection,
+            {},
+            limit,
+            cursor=cursor,
+            skip=skip,
+            projection={"hashed_password": 0, "password": 0}  # Exclude password hash
         )
 
         # Add wallet balance and format user data
@@ -111,20 +117,21 @@ async def get_all_users(
             }
             result.append(user_data)
 
-        # Get total count for pagination info
-        total_users = users_collection.count_documents({})
-
         return {
             "success": True,
             "users": result,
             "pagination": {
-                "total": total_users,
+                "total": await run_db(count_total, users_collection, {}, total),
+                "total_mode": total,
                 "limit": limit,
                 "skip": skip,
-                "has_more": skip + limit < total_users
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -238,7 +245,9 @@ async def get_all_transactions(
     start_date: Optional[str] = Query(None, description="Filter transactions by start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Filter transactions by end date (YYYY-MM-DD)"),
     limit: int = Query(50, ge=1, le=200, description="Number of transactions to fetch"),
-    skip: int = Query(0, ge=0, description="Number of transactions to skip"),
+    skip: int = Query(0, ge=0, description="Number of transactions to skip (legacy, prefer cursor)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    total: Literal["exact", "estimated", "none"] = Query("estimated", description="How to count matching transactions"),
     admin=Depends(verify_admin)
 ):
     """Return all wallet transactions with optional filters"""
@@ -275,14 +284,8 @@ async def get_all_transactions(
             if date_filter:
                 query["created_at"] = date_filter
 
-        # Get transactions with pagination
-        transactions = list(
-            wallets_collection
-            .find(query)
-            .sort("created_at", pymongo.DESCENDING)
-            .skip(skip)
-            .limit(limit)
-        )
+        # Get transactions with keyset pagination
+        transactions, next_cursor = await run_db(fetch_page, wallets_collection, query, limit, cursor=cursor, skip=skip)
 
         # Format transactions
         result = []
@@ -301,17 +304,16 @@ async def get_all_transactions(
             }
             result.append(transaction_data)
 
-        # Get total count
-        total_transactions = wallets_collection.count_documents(query)
-
         return {
             "success": True,
             "transactions": result,
             "pagination": {
-                "total": total_transactions,
+                "total": await run_db(count_total, wallets_collection, query, total),
+                "total_mode": total,
                 "limit": limit,
                 "skip": skip,
-                "has_more": skip + limit < total_transactions
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
             }
         }
         
@@ -377,68 +379,49 @@ async def search_users(
         )
 
 @router.get("/reports/summary")
-async def get_summary_report(admin=Depends(verify_admin)):
-    """Get summary report with key metrics"""
+async def get_summary_report(
+    refresh: bool = Query(False, description="Rebuild the rollups before reading"),
+    admin=Depends(verify_admin)
+):
+    """Get summary report with key metrics (served from the stats rollup documents)"""
     try:
-        # Count total users
-        total_users = users_collection.count_documents({})
-        active_users = users_collection.count_documents({"is_active": True})
-
-        # Count total wallet transactions
-        total_transactions = wallets_collection.count_documents({})
-
-        # Calculate total wallet balances
-        pipeline = [
-            {"$group": {"_id": None, "total_balance": {"$sum": "$balance"}}}
-        ]
-        balance_result = list(users_collection.aggregate(pipeline))
-        total_wallet_balance = balance_result[0]["total_balance"] if balance_result else 0
-
-        # Calculate total revenue (sum of completed orders)
-        revenue_pipeline = [
-            {"$match": {"status": {"$in": ["COMPLETED", "SUCCESS"]}}},
-            {"$group": {"_id": None, "total_revenue": {"$sum": "$amount"}}}
-        ]
-        revenue_result = list(orders_collection.aggregate(revenue_pipeline))
-        total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
-
-        # Count services
-        total_services = services_collection.count_documents({})
-        active_services = services_collection.count_documents({"status": "active"})
-
-        # Count OTP requests
-        total_otp_requests = otp_requests_collection.count_documents({})
-        pending_otp_requests = otp_requests_collection.count_documents({"status": "pending"})
-
-        # Get recent activity (last 7 days)
-        week_ago = datetime.utcnow() - pymongo.timedelta(days=7)
-        recent_users = users_collection.count_documents({"created_at": {"$gte": week_ago}})
-        recent_transactions = wallets_collection.count_documents({"created_at": {"$gte": week_ago}})
+        rollups = await run_db(stats_rollups.get_rollups, refresh)
+        totals = rollups["totals"]
+        daily = rollups["daily"]
 
         return {
             "success": True,
             "summary": {
                 "users": {
-                    "total": total_users,
-                    "active": active_users,
-                    "recent_registrations": recent_users
+                    "total": totals["users_total"],
+                    "active": totals["users_active"],
+                    "recent_registrations": sum(day["users_registered"] for day in daily)
                 },
                 "transactions": {
-                    "total": total_transactions,
-                    "recent": recent_transactions
+                    "total": totals["wallet_transactions"],
+                    "recent": sum(day["wallet_transactions"] for day in daily)
                 },
                 "finances": {
-                    "total_wallet_balance": total_wallet_balance,
-                    "total_revenue": total_revenue
+                    "total_wallet_balance": totals["wallet_balance"],
+                    "total_revenue": totals["orders_revenue"],
+                    "number_revenue": totals["purchase_revenue"],
+                    "number_profit": totals["purchase_profit"]
                 },
                 "services": {
-                    "total": total_services,
-                    "active": active_services
+                    "total": totals["services_total"],
+                    "active": totals["services_active"]
                 },
                 "otp_requests": {
-                    "total": total_otp_requests,
-                    "pending": pending_otp_requests
-                }
+                    "total": totals["otp_total"],
+                    "pending": totals["otp_pending"]
+                },
+                "purchases": {
+                    "total": totals["purchases"],
+                    "cancelled": totals["purchases_cancelled"],
+                    "recent": sum(day["purchases"] for day in daily)
+                },
+                "daily": daily,
+                "rebuilt_at": rollups["rebuilt_at"]
             }
         }
         
@@ -600,6 +583,32 @@ async def search_orders(
             detail=f"Failed to search orders: {str(e)}"
         )
 
+@router.get("/jobs")
+async def get_job_queue_depth(admin=Depends(verify_admin)):
+    """Job queue depth per type and state, including dead-lettered jobs"""
+    try:
+        return {"success": True, "queue": await run_db(job_queue.queue_depth)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read job queue: {str(e)}"
+        )
+
+@router.post("/jobs/retry-dead")
+async def retry_dead_jobs(
+    job_type: Optional[str] = Query(None, description="Only retry jobs of this type"),
+    admin=Depends(verify_admin)
+):
+    """Move dead-lettered jobs back into the queue"""
+    try:
+        retried = await run_db(job_queue.retry_dead, job_type)
+        return {"success": True, "retried": retried}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retry jobs: {str(e)}"
+        )
+
 @router.post("/user/{user_id}/toggle-status")
 async def toggle_user_status(
     user_id: str = Path(..., title="User ID to toggle status"),
@@ -634,6 +643,8 @@ async def toggle_user_status(
         )
 
         if result.modified_count > 0:
+            invalidate_user(user_id)
+            stats_rollups.record_status_change(new_status)
             status_text = "activated" if new_status else "deactivated"
             return {
                 "success": True,
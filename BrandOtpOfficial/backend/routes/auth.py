@@ -2,15 +2,16 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr, StringConstraints
 from typing import Annotated
-import bcrypt
 from datetime import datetime, timedelta
 from bson import ObjectId
 import os
 import jwt
 
 # Import database and auth utilities
-from backend.db import users_collection
+from backend.db import users_collection, run_db
 from backend.utils.auth_utils import get_current_user
+from backend.utils.password_utils import hash_password, verify_password, needs_rehash
+from backend.utils.stats_rollups import record_signup
 
 router = APIRouter()
 
@@ -29,37 +30,13 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: Annotated[str, StringConstraints(min_length=4)]
 
-# Password utilities
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    try:
-        pwd_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(pwd_bytes, salt)
-        return hashed_password.decode('utf-8')
-    except Exception as e:
-        print(f"❌ Hash password error: {e}")
-        raise HTTPException(status_code=500, detail="Password hashing failed")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password using bcrypt"""
-    try:
-        if not plain_password or not hashed_password:
-            return False
-        pwd_bytes = plain_password.encode('utf-8')
-        hashed_bytes = hashed_password.encode('utf-8')
-        result = bcrypt.checkpw(pwd_bytes, hashed_bytes)
-        return result
-    except Exception as e:
-        print(f"❌ Password verification error: {e}")
-        return False
-
 def create_access_token(data: dict):
     """Create JWT access token"""
     try:
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        to_encode.update({"exp": expire})
+        now = datetime.utcnow()
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        to_encode.update({"exp": expire, "iat": now})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     except Exception as e:
@@ -73,13 +50,13 @@ async def signup(user_data: UserSignup):
         print(f"🚀 SIGNUP: {user_data.email}")
 
         # Check existing users
-        if users_collection.find_one({"email": user_data.email}):
+        if await run_db(users_collection.find_one, {"email": user_data.email}, {"_id": 1}):
             raise HTTPException(status_code=400, detail="Email already registered")
-        if users_collection.find_one({"username": user_data.username}):
+        if await run_db(users_collection.find_one, {"username": user_data.username}, {"_id": 1}):
             raise HTTPException(status_code=400, detail="Username already taken")
 
         # Hash password
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await hash_password(user_data.password)
 
         # Create user document
         user_doc = {
@@ -92,13 +69,19 @@ async def signup(user_data: UserSignup):
         }
 
         # Insert user
-        result = users_collection.insert_one(user_doc)
+        result = await run_db(users_collection.insert_one, user_doc)
         user_id = str(result.inserted_id)
+        await run_db(record_signup)
 
         print(f"✅ SIGNUP: User created {user_id}")
 
         # Create token
-        access_token = create_access_token(data={"user_id": user_id, "email": user_data.email})
+        access_token = create_access_token(data={
+            "user_id": user_id,
+            "email": user_data.email,
+            "username": user_data.username,
+            "is_active": True
+        })
 
         return {
             "access_token": access_token,
@@ -124,7 +107,7 @@ async def login(user_credentials: UserLogin):
         print(f"🚀 LOGIN: {user_credentials.email}")
 
         # Find user
-        user = users_collection.find_one({"email": user_credentials.email})
+        user = await run_db(users_collection.find_one, {"email": user_credentials.email})
         if not user:
             print(f"❌ LOGIN: User not found")
             raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -136,19 +119,33 @@ async def login(user_credentials: UserLogin):
             raise HTTPException(status_code=401, detail="Account setup incomplete")
 
         # Verify password
-        if not verify_password(user_credentials.password, user['password']):
+        if not await verify_password(user_credentials.password, user['password']):
             print(f"❌ LOGIN: Invalid password")
             raise HTTPException(status_code=401, detail="Invalid email or password")
 
         print(f"✅ LOGIN: Password verified")
 
+        # Upgrade hashes made with an older cost factor while we have the password
+        if needs_rehash(user['password']):
+            try:
+                new_hash = await hash_password(user_credentials.password)
+                await run_db(users_collection.update_one, {"_id": user["_id"]}, {"$set": {"password": new_hash}})
+                print(f"🔐 LOGIN: Password rehashed with current cost factor")
+            except Exception as e:
+                print(f"⚠️ LOGIN: Rehash skipped: {e}")
+
         # Check if active
         if not user.get("is_active", True):
             raise HTTPException(status_code=401, detail="Account deactivated")
 
         # Create token
         user_id = str(user["_id"])
-        access_token = create_access_token(data={"user_id": user_id, "email": user["email"]})
+        access_token = create_access_token(data={
+            "user_id": user_id,
+            "email": user["email"],
+            "username": user.get("username", "User"),
+            "is_active": user.get("is_active", True)
+        })
 
         user_response = {
             "id": user_id,
@@ -179,10 +176,17 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     try:
         print(f"✅ /me endpoint: User {current_user.get('username')}")
         
+        # Auth comes from claims/cache; the balance is always read fresh
+        user = await run_db(users_collection.find_one, {"_id": ObjectId(current_user["id"])}, {"balance": 1})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
         return {
             "success": True,
-            "user": current_user
+            "user": {**current_user, "balance": float(user.get("balance", 0.0))}
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Get user info error: {e}")
         raise HTTPException(status_code=500, detail="Failed to get user info")
@@ -191,7 +195,7 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 async def test_auth():
     """Test endpoint"""
     try:
-        user_count = users_collection.count_documents({})
+        user_count = await run_db(users_collection.count_documents, {})
         return {
             "message": "Auth working!",
             "status": "success",
@@ -2,11 +2,14 @@ from datetime import datetime
 from bson import ObjectId
 from typing import Dict, Optional, List
 import pymongo
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response
 from fastapi.responses import JSONResponse
 
-from backend.db import db, otp_requests_collection, services_collection, users_collection, wallets_collection
+from backend.db import db, otp_requests_collection, services_collection, users_collection, wallets_collection, run_db
 from backend.utils.auth_utils import get_current_user
+from backend.utils.wallet_utils import credit_user_wallet, debit_user_wallet
+from backend.utils.pagination import fetch_page
+from backend.utils.user_counters import get_counters, record_otp_created, record_otp_transition
 from backend.models.otp_request import OtpRequestCreate, OtpRequestResponse, OtpRequestInDB
 
 # Create router instance
@@ -33,103 +36,20 @@ def get_user_wallet_balance(user_id: str) -> dict:
         return {"success": False, "error": str(e), "balance": 0.0}
 
 def debit_user_wallet_sync(user_id: str, amount: float, reason: str = "OTP Service"):
-    """Debit money from user wallet"""
-    try:
-        if "@" in user_id:
-            user = users_collection.find_one({"email": user_id})
-        else:
-            user = users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if not user:
-            return {"success": False, "error": "User not found"}
-        
-        current_balance = user.get("balance", 0.0)
-        if current_balance < amount:
-            return {"success": False, "error": "Insufficient balance"}
-        
-        new_balance = current_balance - amount
-        
-        result = users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        if result.modified_count > 0:
-            # Create transaction record
-            transaction = {
-                "user_id": str(user["_id"]),
-                "user_email": user["email"],
-                "type": "debit",
-                "amount": amount,
-                "previous_balance": current_balance,
-                "new_balance": new_balance,
-                "reason": reason,
-                "status": "completed",
-                "created_at": datetime.utcnow()
-            }
-            wallets_collection.insert_one(transaction)
-            
-            return {
-                "success": True,
-                "new_balance": new_balance,
-                "transaction_id": str(transaction.get("_id"))
-            }
-        
-        return {"success": False, "error": "Failed to update balance"}
-        
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    """Debit money from user wallet (atomic, guarded by balance >= amount)"""
+    return debit_user_wallet(user_id, amount, reason)
 
 def credit_user_wallet_sync(user_id: str, amount: float, reason: str = "OTP Refund"):
     """Credit money to user wallet"""
-    try:
-        if "@" in user_id:
-            user = users_collection.find_one({"email": user_id})
-        else:
-            user = users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if not user:
-            return {"success": False, "error": "User not found"}
-        
-        current_balance = user.get("balance", 0.0)
-        new_balance = current_balance + amount
-        
-        result = users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        if result.modified_count > 0:
-            # Create transaction record
-            transaction = {
-                "user_id": str(user["_id"]),
-                "user_email": user["email"],
-                "type": "credit",
-                "amount": amount,
-                "previous_balance": current_balance,
-                "new_balance": new_balance,
-                "reason": reason,
-                "status": "completed",
-                "created_at": datetime.utcnow()
-            }
-            wallets_collection.insert_one(transaction)
-            
-            return {
-                "success": True,
-                "new_balance": new_balance,
-                "transaction_id": str(transaction.get("_id"))
-            }
-        
-        return {"success": False, "error": "Failed to update balance"}
-        
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    return credit_user_wallet(user_id, amount, reason)
 
 # ✅ Routes
 @router.get("/history", response_model=List[OtpRequestResponse])
 async def get_otp_history(
+    response: Response,
     limit: int = Query(10, ge=1, le=100, description="Number of records to fetch"),
-    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    skip: int = Query(0, ge=0, description="Number of records to skip (legacy, prefer cursor)"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
     current_user = Depends(get_current_user)
 ):
     """Get user's OTP request history"""
@@ -137,14 +57,15 @@ async def get_otp_history(
         user_id = str(current_user.get("email"))
         
         # Get OTP requests for the user
-        cursor = otp_requests_collection.find({"user_id": user_id})\
-            .sort("created_at", pymongo.DESCENDING)\
-            .skip(skip)\
-            .limit(limit)
+        docs, next_cursor = await run_db(
+            fetch_page, otp_requests_collection, {"user_id": user_id}, limit, cursor=cursor, skip=skip
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         # Convert to list of OtpRequestResponse
         otp_requests = []
-        for doc in cursor:
+        for doc in docs:
             doc["id"] = str(doc["_id"])
             del doc["_id"]
             # Format datetime objects to strings
@@ -156,6 +77,8 @@ async def get_otp_history(
         
         return otp_requests
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -223,6 +146,7 @@ async def request_otp(request: OtpRequestCreate, current_user = Depends(get_curr
         
         result = otp_requests_collection.insert_one(otp_request)
         request_id = str(result.inserted_id)
+        record_otp_created(current_user["id"], "pending", service_price)
         
         return {
             "success": True,
@@ -337,6 +261,7 @@ async def cancel_otp_request(request_id: str = Path(...), current_user = Depends
                     }
                 }
             )
+            record_otp_transition(current_user["id"], otp_request["status"], "cancelled")
             
             return {
                 "success": True,
@@ -370,6 +295,7 @@ async def cancel_otp_request(request_id: str = Path(...), current_user = Depends
                 }
             }
         )
+        record_otp_transition(current_user["id"], otp_request["status"], "cancelled")
         
         return {
             "success": True,
@@ -393,39 +319,17 @@ async def cancel_otp_request(request_id: str = Path(...), current_user = Depends
 async def get_otp_stats(current_user = Depends(get_current_user)):
     """Get user's OTP request statistics"""
     try:
-        user_id = str(current_user.get("email"))
-        
-        # Get various counts
-        total_requests = otp_requests_collection.count_documents({"user_id": user_id})
-        pending_requests = otp_requests_collection.count_documents({
-            "user_id": user_id, 
-            "status": "pending"
-        })
-        completed_requests = otp_requests_collection.count_documents({
-            "user_id": user_id, 
-            "status": "completed"
-        })
-        cancelled_requests = otp_requests_collection.count_documents({
-            "user_id": user_id, 
-            "status": "cancelled"
-        })
-        
-        # Get total amount spent
-        pipeline = [
-            {"$match": {"user_id": user_id}},
-            {"$group": {"_id": None, "total_spent": {"$sum": "$amount_paid"}}}
-        ]
-        spent_result = list(otp_requests_collection.aggregate(pipeline))
-        total_spent = spent_result[0]["total_spent"] if spent_result else 0
+        # One read of the per-user counters instead of four counts and an aggregate
+        counters = await run_db(get_counters, current_user["id"])
         
         return {
             "success": True,
             "stats": {
-                "total_requests": total_requests,
-                "pending_requests": pending_requests,
-                "completed_requests": completed_requests,
-                "cancelled_requests": cancelled_requests,
-                "total_amount_spent": total_spent
+                "total_requests": counters["otp_total"],
+                "pending_requests": counters["otp_pending"],
+                "completed_requests": counters["otp_completed"],
+                "cancelled_requests": counters["otp_cancelled"],
+                "total_amount_spent": counters["otp_spent"]
             }
         }
         
@@ -483,6 +387,7 @@ async def update_otp_status(
         )
         
         if result.modified_count > 0:
+            record_otp_transition(otp_request["user_id"], otp_request.get("status"), status)
             return {
                 "success": True,
                 "request_id": request_id,
@@ -10,6 +10,8 @@ from bson import ObjectId
 # Fixed imports - Correct paths
 from backend.db import db, get_db, otp_requests_collection, users_collection, wallets_collection
 from backend.utils.auth_utils import get_current_user  # ✅ Fixed import
+from backend.utils.wallet_utils import credit_user_wallet, debit_user_wallet
+from backend.utils.user_counters import record_otp_created, record_otp_transition
 from backend.models.otp_request import OtpRequestCreate, OtpRequestResponse  # ✅ Fixed import path
 
 # Load environment variables
@@ -29,92 +31,17 @@ router = APIRouter()
 # ✅ Added wallet utility functions (sync versions)
 def debit_user_wallet_sync(user_id: str, amount: float, reason: str = "Service charge"):
     """Sync function to debit from user wallet"""
-    try:
-        # Find user by email or ObjectId
-        if "@" in user_id:
-            user = users_collection.find_one({"email": user_id})
-        else:
-            user = users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if not user:
-            raise ValueError("User not found")
-        
-        current_balance = user.get("balance", 0.0)
-        if current_balance < amount:
-            raise ValueError("Insufficient balance")
-        
-        new_balance = current_balance - amount
-        
-        # Update balance
-        result = users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        if result.modified_count > 0:
-            # Create transaction record
-            transaction = {
-                "user_id": str(user["_id"]),
-                "user_email": user["email"],
-                "type": "debit",
-                "amount": amount,
-                "previous_balance": current_balance,
-                "new_balance": new_balance,
-                "reason": reason,
-                "status": "completed",
-                "created_at": datetime.utcnow()
-            }
-            wallets_collection.insert_one(transaction)
-            
-            return {"success": True, "new_balance": new_balance}
-        else:
-            raise ValueError("Failed to update balance")
-            
-    except Exception as e:
-        raise ValueError(f"Wallet debit failed: {str(e)}")
+    result = debit_user_wallet(user_id, amount, reason)
+    if not result["success"]:
+        raise ValueError(f"Wallet debit failed: {result['error']}")
+    return {"success": True, "new_balance": result["new_balance"]}
 
 def credit_user_wallet_sync(user_id: str, amount: float, reason: str = "Money added"):
     """Sync function to credit to user wallet"""
-    try:
-        # Find user by email or ObjectId
-        if "@" in user_id:
-            user = users_collection.find_one({"email": user_id})
-        else:
-            user = users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if not user:
-            raise ValueError("User not found")
-        
-        current_balance = user.get("balance", 0.0)
-        new_balance = current_balance + amount
-        
-        # Update balance
-        result = users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        if result.modified_count > 0:
-            # Create transaction record
-            transaction = {
-                "user_id": str(user["_id"]),
-                "user_email": user["email"],
-                "type": "credit",
-                "amount": amount,
-                "previous_balance": current_balance,
-                "new_balance": new_balance,
-                "reason": reason,
-                "status": "completed",
-                "created_at": datetime.utcnow()
-            }
-            wallets_collection.insert_one(transaction)
-            
-            return {"success": True, "new_balance": new_balance}
-        else:
-            raise ValueError("Failed to update balance")
-            
-    except Exception as e:
-        raise ValueError(f"Wallet credit failed: {str(e)}")
+    result = credit_user_wallet(user_id, amount, reason)
+    if not result["success"]:
+        raise ValueError(f"Wallet credit failed: {result['error']}")
+    return {"success": True, "new_balance": result["new_balance"]}
 
 # Helper function to make API requests to OTP Bazaar
 async def make_api_request(endpoint: str, method: str = "GET", data: Dict = None) -> Dict:
@@ -205,6 +132,7 @@ async def create_otp_request(
         
         result = otp_requests_collection.insert_one(otp_request)
         otp_request["id"] = str(result.inserted_id)
+        record_otp_created(current_user["id"], "active", price)
         
         return {
             "success": True,
@@ -267,6 +195,7 @@ async def check_otp_status(request_id: str, current_user = Depends(get_current_u
             {"_id": otp_request["_id"]},
             {"$set": update_data}
         )
+        record_otp_transition(current_user["id"], otp_request.get("status"), update_data["status"])
         
         return {
             "request_id": request_id,
@@ -322,6 +251,7 @@ async def cancel_otp_request(request_id: str, current_user = Depends(get_current
                 }
             }
         )
+        record_otp_transition(current_user["id"], otp_request.get("status"), "cancelled")
         
         # ✅ Fixed: Use sync wallet function (no await)
         if price > 0:
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
-import time
 
 from backend.utils.pay0_client import create_order
+from backend.utils.ids import new_order_id
+from backend.utils import topups
+from backend.db import run_db
 from backend.utils.auth_utils import get_current_user
 
 router = APIRouter()
@@ -18,18 +20,18 @@ async def create_pay0_order(order: OrderBody, current_user: dict = Depends(get_c
     """
     try:
         user_id = current_user.get("id")
-        timestamp = int(time.time())
-        order_id = f"BRANDOTP_{user_id[:4]}_{timestamp}"
+        order_id = new_order_id("BRANDOTP")
 
         redirect_url = f"https://brandotpofficials.netlify.app/payment-status.html?orderid={order_id}"
 
         # Create order
-        payment_resp = create_order(
+        payment_resp = await create_order(
             order.customer_mobile,
             order.amount,
             redirect_url,
             user_id,
-            "WalletTopup"
+            "WalletTopup",
+            order_id=order_id
         )
         
         # ✅ FIXED: Extract payment_url from nested 'result' object
@@ -42,6 +44,9 @@ async def create_pay0_order(order: OrderBody, current_user: dict = Depends(get_c
             print(f"❌ Pay0 API Response: {payment_resp}")
             raise Exception(f"payment_url missing in response: {payment_resp}")
 
+        # PENDING record: the webhook/status check flip it to SUCCESS exactly once
+        await run_db(topups.record_pending, order_id, user_id, order.amount)
+
         return {
             "success": True,
             "order_id": order_id,
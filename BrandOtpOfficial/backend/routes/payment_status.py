@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from bson import ObjectId
 import time
 
-from backend.db import users_collection, payments_collection
+from backend.db import payments_collection, run_db
 from backend.utils.auth_utils import get_current_user
+from backend.utils import topups
 from backend.utils.order_status_sdk import OrderStatusSDK
 from backend.config import config
 
@@ -22,7 +22,11 @@ async def check_payment_status(
         user_id = current_user.get("id")
         
         # 1. Check if payment already processed
-        existing_payment = payments_collection.find_one({"order_id": order_id})
+        existing_payment = await run_db(payments_collection.find_one, {"order_id": order_id}, {"status": 1, "user_id": 1})
+        
+        # Only the user who created the order may claim it
+        if existing_payment and existing_payment.get("user_id") and existing_payment["user_id"] != user_id:
+            raise HTTPException(status_code=403, detail="This order belongs to another account")
         
         if existing_payment and existing_payment.get("status") == "SUCCESS":
             return {
@@ -34,7 +38,7 @@ async def check_payment_status(
         
         # 2. Check status with Pay0 API
         status_sdk = OrderStatusSDK()
-        pay0_response = status_sdk.check_order_status(
+        pay0_response = await status_sdk.check_order_status(
             user_token=config.PAY0_USER_TOKEN,
             order_id=order_id
         )
@@ -55,34 +59,30 @@ async def check_payment_status(
             # 4. Update user wallet
             amount = float(result.get("amount", 0))
             
-            # Update user balance in MongoDB
-            update_result = users_collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$inc": {"balance": amount}}
+            # Claim the order - the webhook may be crediting it right now
+            claimed = await run_db(
+                topups.claim,
+                order_id,
+                user_id,
+                amount,
+                "Wallet Top-up via Pay0",
+                source="status_check",
+                txn_status=txn_status,
+                utr=result.get("utr", ""),
+                date=result.get("date", "")
             )
+            if not claimed:
+                return {
+                    "success": True,
+                    "status": "SUCCESS",
+                    "message": "Payment already verified and wallet updated",
+                    "already_processed": True
+                }
             
-            # 5. Save/Update payment record
-            payment_data = {
-                "order_id": order_id,
-                "user_id": user_id,
-                "amount": amount,
-                "status": "SUCCESS",
-                "txn_status": txn_status,
-                "utr": result.get("utr", ""),
-                "date": result.get("date", ""),
-                "updated_at": time.time(),
-                "type": "credit",
-                "reason": "Wallet Top-up via Pay0"
-            }
-            
-            if existing_payment:
-                payments_collection.update_one(
-                    {"order_id": order_id},
-                    {"$set": payment_data}
-                )
-            else:
-                payment_data["created_at"] = time.time()
-                payments_collection.insert_one(payment_data)
+            # 5. Credit now so the page shows the new balance (the sweeper retries failures)
+            credit = await run_db(topups.apply_credit, order_id)
+            if not credit["success"]:
+                raise HTTPException(status_code=500, detail=f"Wallet update failed: {credit['error']}")
             
             print(f"✅ Wallet updated: User {user_id}, Amount +₹{amount}, Order {order_id}")
             
@@ -104,8 +104,9 @@ async def check_payment_status(
         else:  # FAILED
             # Save failed payment record
             if existing_payment:
-                payments_collection.update_one(
-                    {"order_id": order_id},
+                await run_db(
+                    payments_collection.update_one,
+                    {"order_id": order_id, "status": {"$ne": "SUCCESS"}},
                     {"$set": {"status": "FAILED", "updated_at": time.time()}}
                 )
             
@@ -115,6 +116,8 @@ async def check_payment_status(
                 "message": "Payment failed. Please try again or contact support."
             }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Payment status check error: {e}")
         raise HTTPException(status_code=500, detail=f"Error checking payment status: {str(e)}")
@@ -2,7 +2,6 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
-import requests
 import os
 from dotenv import load_dotenv
 from bson import ObjectId
@@ -13,8 +12,9 @@ from .webhook import router as webhook_router
 
 # अपने प्रोजेक्ट के यूटिलिटी और डीबी को इम्पोर्ट करें
 from backend.utils.auth_utils import get_current_user
-from backend.utils.wallet_utils import credit_user_wallet
-from backend.db import wallets_collection
+from backend.utils import topups
+from backend.utils import pay0_client
+from backend.db import wallets_collection, run_db
 
 # यह इस फ़ाइल का मुख्य राउटर है
 router = APIRouter()
@@ -35,6 +35,11 @@ async def check_payment_status(order_id: str, current_user: dict = Depends(get_c
     फ्रंटएंड से ऑर्डर आईडी लेता है, Pay0 से स्टेटस की पुष्टि करता है, और वॉलेट अपडेट करता है।
     """
     try:
+        # 0. ऑर्डर किसी और यूजर का है तो क्लेम न करने दें
+        recorded_owner = await run_db(topups.owner, order_id)
+        if recorded_owner and recorded_owner != current_user["id"]:
+            raise HTTPException(status_code=403, detail="This order belongs to another account")
+
         # 1. जाँचें कि यह ट्रांजेक्शन पहले से सफल तो नहीं हो चुका
         existing_transaction = wallets_collection.find_one({
             "order_id": order_id,
@@ -47,16 +52,14 @@ async def check_payment_status(order_id: str, current_user: dict = Depends(get_c
             )
 
         # 2. Pay0 API से पेमेंट का स्टेटस पूछें
-        pay0_url = "https://pay0.shop/api/check-order-status"
-        payload = {
-            "user_token": PAY0_API_KEY, # अपनी Pay0 API Key का उपयोग करें
-            "order_id": order_id
-        }
-        
-        response = requests.post(pay0_url, data=payload)
-        response.raise_for_status()
-
-        data = response.json()
+        # अपनी Pay0 API Key का उपयोग करें (shared async client, retries included)
+        status_code, data = await pay0_client.send_form(
+            "/check-order-status", {"user_token": PAY0_API_KEY, "order_id": order_id}
+        )
+        if status_code is None:
+            raise HTTPException(status_code=503, detail=f"Could not connect to payment gateway: {data.get('message')}")
+        if not 200 <= status_code < 300:
+            raise HTTPException(status_code=503, detail=f"Payment gateway error: HTTP {status_code}")
 
         # 3. स्टेटस के आधार पर एक्शन लें
         if data.get("status") == "SUCCESS":
@@ -64,19 +67,25 @@ async def check_payment_status(order_id: str, current_user: dict = Depends(get_c
             if payment_amount <= 0:
                 raise HTTPException(status_code=400, detail="Invalid payment amount received from gateway.")
 
-            # 4. यूजर का वॉलेट क्रेडिट करें
-            credit_result = credit_user_wallet(
-                user_id=current_user["id"],
-                amount=payment_amount,
-                reason=f"Add Money - Pay0 (Order: {order_id})"
+            # 4. ऑर्डर क्लेम करें - एक ही बार क्रेडिट होगा (webhook भी यही करता है)
+            claimed = await run_db(
+                topups.claim,
+                order_id,
+                current_user["id"],
+                payment_amount,
+                f"Add Money - Pay0 (Order: {order_id})",
+                source="check_status"
             )
+            if not claimed:
+                return JSONResponse(
+                    status_code=200,
+                    content={"success": True, "message": "Payment already confirmed and wallet updated."}
+                )
+
+            # 5. यूजर का वॉलेट क्रेडिट करें
+            credit_result = await run_db(topups.apply_credit, order_id)
 
             if credit_result.get("success"):
-                # ट्रांजेक्शन में order_id को अपडेट करें ताकि दोबारा क्रेडिट न हो
-                wallets_collection.update_one(
-                    {"_id": ObjectId(credit_result["transaction_id"])},
-                    {"$set": {"order_id": order_id}}
-                )
                 return JSONResponse(status_code=200, content={"success": True, "message": "Payment successful! Your wallet has been credited."})
             else:
                 raise HTTPException(status_code=500, detail=credit_result.get("error", "Failed to update wallet balance."))
@@ -87,8 +96,8 @@ async def check_payment_status(order_id: str, current_user: dict = Depends(get_c
         else: # FAILED, CANCELLED, etc.
             return JSONResponse(status_code=400, content={"success": False, "detail": f"Payment status: {data.get('status', 'Failed')}"})
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=503, detail=f"Could not connect to payment gateway: {e}")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {str(e)}")
 
@@ -1,7 +1,10 @@
 # backend/routes/smsman_numbers.py - FIXED FOR ALL COUNTRIES
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import json
 import time
 from bson import ObjectId
 
@@ -11,13 +14,16 @@ from backend.utils.smsman_client import (
     get_services_by_country,  # ✅ NEW IMPORT
     get_countries, 
     get_service_price, 
-    buy_number as smsman_buy_number,
-    get_sms as smsman_get_sms
+    cache_stats
 )
+from backend.utils import catalog_render, price_refresher, purchase_saga, service_search, singleflight
+from backend.utils.sms_poller import sms_hub
+from backend.utils.providers import provider_router
 
 # Import database and auth
-from backend.db import users_collection, smsman_purchases_collection, payments_collection
-from backend.utils.auth_utils import get_current_user
+from backend.db import smsman_purchases_collection, run_db, run_in_transaction
+from backend.utils.auth_utils import get_current_user, get_user_from_token
+from backend.utils import job_queue
 
 router = APIRouter()
 
@@ -47,11 +53,12 @@ def get_country_code_prefix(country_id: int) -> str:
 
 # ===== ENDPOINT 1: GET SERVICES (UPDATED FOR ALL COUNTRIES) =====
 @router.get("/services")
-async def get_services_endpoint(country_id: Optional[int] = None):
+async def get_services_endpoint(request: Request, country_id: Optional[int] = None):
     """
     Get services with 70% markup
     - If country_id provided: Return country-specific pricing
     - If no country_id: Return default pricing (India/Russia fallback)
+    ✅ Served as pre-encoded bytes per price-sheet version, with ETag / 304
     """
     try:
         if country_id:
@@ -66,20 +73,46 @@ async def get_services_endpoint(country_id: Optional[int] = None):
             print(f"✅ Loaded {len(services)} services for country {country_id}")
         else:
             # Get default services (India/Russia)
-            print("🔄 Loading default services...")
             services = await get_services()
-            print(f"✅ Loaded {len(services)} default services")
         
-        return {
+        rendered = await catalog_render.render(country_id, services, {
             "success": True,
             "services": services,
             "count": len(services),
             "country_id": country_id
-        }
+        })
+        return catalog_render.respond(request, rendered)
     except Exception as e:
         print(f"❌ Services Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ===== SERVICE SEARCH =====
+@router.get("/services/search")
+async def search_services_endpoint(
+    country_id: int = 91,
+    q: str = "",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_count: int = Query(0, ge=0),
+    sort: str = "relevance",
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search one country's catalog by name, filter by price/availability, sort and paginate"""
+    if sort not in service_search.SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(service_search.SORTS)}")
+    
+    try:
+        services = await get_services_by_country(country_id)
+        return await service_search.search(
+            country_id, services, q,
+            min_price=min_price, max_price=max_price, min_count=min_count,
+            sort=sort, page=page, limit=limit
+        )
+    except Exception as e:
+        print(f"❌ Service search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ===== ENDPOINT 2: GET COUNTRIES =====
 @router.get("/countries")
 async def get_countries_endpoint():
@@ -140,96 +173,29 @@ async def buy_number_endpoint(
         
         print(f"🛒 Buy Request: User {user_id}, Service {app_id}, Country {country_id}")
         
-        # STEP 1: Get user balance
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        user_balance = float(user.get("balance", 0))
-        print(f"💰 User Balance: ₹{user_balance}")
-        
-        # STEP 2: Get live price with 70% markup
-        price_info = await get_service_price(app_id, country_id)
-        
-        if "error" in price_info:
-            raise HTTPException(status_code=400, detail=f"Pricing error: {price_info['error']}")
-        
-        user_price = price_info["user_price"]
-        original_price = price_info["original_price"]
-        profit = price_info["profit_amount"]
-        
-        print(f"💰 Price: Original=₹{original_price}, User=₹{user_price}, Profit=₹{profit}")
-        
-        # STEP 3: Check balance
-        if user_balance < user_price:
-            shortage = user_price - user_balance
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient balance. Required: ₹{user_price}, Available: ₹{user_balance}, Shortage: ₹{shortage:.2f}"
-            )
-        
-        # STEP 4: Buy from SMSMan
-        buy_result = await smsman_buy_number(app_id, country_id)
-        
-        if "error" in buy_result:
-            raise HTTPException(status_code=500, detail=f"Purchase failed: {buy_result['error']}")
-        
-        if "number" not in buy_result or "request_id" not in buy_result:
-            raise HTTPException(status_code=500, detail="Invalid response from SMSMan")
-        
-        # STEP 5: Deduct from wallet (FIX 3)
-        new_balance = user_balance - user_price
-        users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        print(f"✅ Wallet Updated: ₹{user_balance} → ₹{new_balance}")
-        
-        # STEP 6: Save purchase record
-        purchase_record = {
-            "user_id": user_id,
-            "request_id": buy_result["request_id"],
-            "country_id": country_id,
-            "application_id": app_id,
-            "number": buy_result["number"],
-            "country_code": get_country_code_prefix(country_id),  # FIX 1
-            "original_price": original_price,
-            "charged_price": user_price,
-            "profit_earned": profit,
-            "status": "waiting_sms",
-            "sms_code": None,
-            "can_cancel": True,  # FIX 4 - Can cancel before SMS
-            "created_at": time.time(),
-            "updated_at": time.time()
-        }
-        
-        smsman_purchases_collection.insert_one(purchase_record)
-        
-        # STEP 7: Log transaction
-        payment_record = {
-            "user_id": user_id,
-            "type": "debit",
-            "amount": user_price,
-            "reason": f"Number Purchase - {buy_result['number']}",
-            "status": "completed",
-            "created_at": time.time()
-        }
-        payments_collection.insert_one(payment_record)
-        
-        print(f"✅ Purchase Complete: Request {buy_result['request_id']}")
+        country_code = get_country_code_prefix(country_id)  # FIX 1
+
+        # Reserve funds -> buy from SMSMan -> commit, or refund on failure (FIX 3)
+        result = await purchase_saga.run_purchase(user_id, app_id, country_id, country_code)
+        if not result["success"]:
+            raise HTTPException(status_code=result["status_code"], detail=result["error"])
+
+        purchase_record = result["purchase"]
+        await sms_hub.adopt(purchase_record)
+
+        print(f"✅ Purchase Complete: Request {purchase_record['request_id']}, New Balance: ₹{result['new_balance']}")
         
         # FIX 1: Return with country code
         return {
             "success": True,
-            "request_id": buy_result["request_id"],
-            "number": buy_result["number"],
-            "country_code": get_country_code_prefix(country_id),  # ✅ FIX 1
-            "display_number": f"{get_country_code_prefix(country_id)} {buy_result['number']}",  # ✅ FIX 1
-            "charged_amount": user_price,
-            "original_cost": original_price,
-            "profit": profit,
-            "new_balance": new_balance,
+            "request_id": purchase_record["request_id"],
+            "number": purchase_record["number"],
+            "country_code": country_code,  # ✅ FIX 1
+            "display_number": f"{country_code} {purchase_record['number']}",  # ✅ FIX 1
+            "charged_amount": result["charged_amount"],
+            "original_cost": result["original_cost"],
+            "profit": result["profit"],
+            "new_balance": result["new_balance"],
             "status": "waiting_sms"
         }
         
@@ -240,6 +206,38 @@ async def buy_number_endpoint(
         raise HTTPException(status_code=500, detail=str(e))
 
 # ===== FIX 5: GET SMS WITH STATUS =====
+async def _tracked_purchase(request_id: int, user_id: str):
+    """Poller state for a purchase owned by user_id, loaded from Mongo on a miss"""
+    entry = sms_hub.get_state(request_id)
+    if entry is not None and entry.user_id == user_id:
+        return entry
+    
+    # Verify purchase belongs to user
+    purchase = await run_db(smsman_purchases_collection.find_one, {
+        "request_id": request_id,
+        "user_id": user_id
+    })
+    
+    if not purchase:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+    
+    return sms_hub.track(purchase)
+
+def _sms_status_payload(entry) -> dict:
+    payload = {
+        "success": True,
+        "sms_received": bool(entry.sms_code),
+        "number": entry.number,
+        "display_number": f"{entry.country_code} {entry.number}",
+        "status": entry.status
+    }
+    if entry.sms_code:
+        payload["sms_code"] = entry.sms_code
+        payload["status"] = "completed"
+    elif entry.status == "waiting":
+        payload["message"] = "Waiting for SMS..."
+    return payload
+
 @router.get("/sms/{request_id}")
 async def get_sms_endpoint(
     request_id: int,
@@ -247,69 +245,12 @@ async def get_sms_endpoint(
 ):
     """
     GET SMS - FIX 5: Auto refresh support
+    ✅ Cheap read of the central poller's state (no upstream call per poll)
     """
     try:
-        user_id = current_user.get("id")
-        
-        # Verify purchase belongs to user
-        purchase = smsman_purchases_collection.find_one({
-            "request_id": request_id,
-            "user_id": user_id
-        })
-        
-        if not purchase:
-            raise HTTPException(status_code=404, detail="Purchase not found")
-        
-        # If SMS already received, return cached
-        if purchase.get("sms_code"):
-            return {
-                "success": True,
-                "sms_received": True,
-                "sms_code": purchase["sms_code"],
-                "number": purchase["number"],
-                "display_number": f"{purchase['country_code']} {purchase['number']}",
-                "status": "completed"
-            }
-        
-        # Fetch from SMSMan
-        sms_result = await smsman_get_sms(str(request_id))
-        
-        # Check if SMS received
-        if sms_result.get("status") == "received" and sms_result.get("sms_code"):
-            # Update purchase record
-            smsman_purchases_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "sms_code": sms_result["sms_code"],
-                        "status": "completed",
-                        "can_cancel": False,  # FIX 4 - Cannot cancel after SMS
-                        "completed_at": time.time(),
-                        "updated_at": time.time()
-                    }
-                }
-            )
-            
-            print(f"✅ SMS Received: Request {request_id}, Code: {sms_result['sms_code']}")
-            
-            return {
-                "success": True,
-                "sms_received": True,
-                "sms_code": sms_result["sms_code"],
-                "number": purchase["number"],
-                "display_number": f"{purchase['country_code']} {purchase['number']}",
-                "status": "completed"
-            }
-        else:
-            # Still waiting
-            return {
-                "success": True,
-                "sms_received": False,
-                "status": "waiting",
-                "message": "Waiting for SMS...",
-                "number": purchase["number"],
-                "display_number": f"{purchase['country_code']} {purchase['number']}"
-            }
+        entry = await _tracked_purchase(request_id, current_user.get("id"))
+        sms_hub.record_read()
+        return _sms_status_payload(entry)
             
     except HTTPException:
         raise
@@ -317,7 +258,108 @@ async def get_sms_endpoint(
         print(f"❌ Get SMS Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ===== SMS STREAM (SERVER PUSH) =====
+@router.get("/sms/{request_id}/stream")
+async def stream_sms_endpoint(
+    request_id: int,
+    request: Request,
+    token: Optional[str] = Query(None, description="JWT for EventSource clients that cannot send headers")
+):
+    """
+    Server-Sent Events stream for one purchase.
+    Subscribe once; the central poller pushes the code and closes the stream
+    on completion, cancel or expiry.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    current_user = await run_db(get_user_from_token, token)
+    entry = await _tracked_purchase(request_id, current_user.get("id"))
+    
+    def format_event(event: dict) -> str:
+        payload = {**event, "number": entry.number, "display_number": f"{entry.country_code} {entry.number}"}
+        return f"event: {event['status']}\ndata: {json.dumps(payload)}\n\n"
+    
+    async def event_stream():
+        queue = sms_hub.subscribe(entry)
+        try:
+            # Already settled - send the final state and close
+            if entry.status != "waiting":
+                yield format_event({**_sms_status_payload(entry), "final": True})
+                return
+            
+            yield format_event({"status": "waiting", "sms_received": False, "message": "Waiting for SMS...", "final": False})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event)
+                if event.get("final"):
+                    break
+        finally:
+            sms_hub.unsubscribe(request_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ===== FIX 2 & FIX 4: CANCEL NUMBER WITH REFUND =====
+def _claim_cancellation(request_id: int, user_id: str) -> Optional[dict]:
+    """
+    Mark the purchase cancelled and queue its refund in one transaction, so a
+    crash can never leave a purchase flagged refunded with no refund job.
+    Returns the pre-cancel purchase, or None if it could not be claimed.
+    """
+    def claim(session):
+        # Claim the cancellation atomically so a double click can't refund twice
+        now = time.time()
+        purchase = smsman_purchases_collection.find_one_and_update(
+            {
+                "request_id": request_id,
+                "user_id": user_id,
+                "status": {"$ne": "cancelled"},
+                "can_cancel": {"$ne": False}
+            },
+            {
+                "$set": {
+                    "status": "cancelled",
+                    "can_cancel": False,
+                    "refunded": True,
+                    "cancelled_at": now,
+                    "updated_at": now
+                }
+            },
+            session=session
+        )
+        if not purchase:
+            return None
+
+        # FIX 4: Refund on the job queue - durable, retried, credited once per request_id
+        job_queue.enqueue(
+            "number_refund",
+            {
+                "request_id": request_id,
+                "user_id": user_id,
+                "amount": purchase["charged_price"],
+                "number": purchase["number"],
+                "profit": purchase.get("profit_earned", 0),
+                # purchase is the pre-cancel document, so its status says if the number was still active
+                "was_active": purchase.get("status") == "waiting_sms"
+            },
+            dedupe_key=f"refund:{request_id}",
+            session=session
+        )
+        return purchase
+
+    return run_in_transaction(claim)
+
 @router.post("/cancel/{request_id}")
 async def cancel_number_endpoint(
     request_id: int,
@@ -331,71 +373,40 @@ async def cancel_number_endpoint(
     try:
         user_id = current_user.get("id")
         
-        # Get purchase record
-        purchase = smsman_purchases_collection.find_one({
-            "request_id": request_id,
-            "user_id": user_id
-        })
-        
+        purchase = await run_db(_claim_cancellation, request_id, user_id)
+
         if not purchase:
-            raise HTTPException(status_code=404, detail="Purchase not found")
-        
-        # FIX 4: Check if can cancel
-        if not purchase.get("can_cancel", True):
+            purchase = await run_db(smsman_purchases_collection.find_one, {
+                "request_id": request_id,
+                "user_id": user_id
+            })
+            if not purchase:
+                raise HTTPException(status_code=404, detail="Purchase not found")
+            if purchase.get("status") == "cancelled":
+                raise HTTPException(status_code=400, detail="Already cancelled")
+            # FIX 4: SMS already received
             raise HTTPException(
                 status_code=400,
                 detail="Cannot cancel - SMS already received!"
             )
-        
-        if purchase.get("status") == "cancelled":
-            raise HTTPException(status_code=400, detail="Already cancelled")
-        
-        # Cancel on SMSMan (using reject status)
-        # Note: SMSMan API doesn't have explicit cancel, we mark as reject
+
+        # Release the number upstream (SMSMan: reject status) in the background
+        provider_router.cancel_later(purchase.get("provider"), request_id)
         refund_amount = purchase["charged_price"]
+
+        sms_hub.publish(request_id, {
+            "status": "cancelled",
+            "sms_received": False,
+            "message": "Number cancelled and refunded"
+        }, final=True)
         
-        # FIX 4: Refund to wallet
-        users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"balance": refund_amount}}
-        )
-        
-        # Update purchase status
-        smsman_purchases_collection.update_one(
-            {"request_id": request_id},
-            {
-                "$set": {
-                    "status": "cancelled",
-                    "refunded": True,
-                    "refund_amount": refund_amount,
-                    "cancelled_at": time.time(),
-                    "updated_at": time.time()
-                }
-            }
-        )
-        
-        # Log refund transaction
-        payment_record = {
-            "user_id": user_id,
-            "type": "credit",
-            "amount": refund_amount,
-            "reason": f"Refund - Number {purchase['number']} cancelled",
-            "status": "completed",
-            "created_at": time.time()
-        }
-        payments_collection.insert_one(payment_record)
-        
-        # Get new balance
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        new_balance = user.get("balance", 0)
-        
-        print(f"✅ Cancelled & Refunded: Request {request_id}, Amount: ₹{refund_amount}")
+        print(f"✅ Cancelled, refund queued: Request {request_id}, Amount: ₹{refund_amount}")
         
         return {
             "success": True,
-            "message": "Number cancelled and refunded successfully",
+            "message": "Number cancelled, refund is being processed",
             "refund_amount": refund_amount,
-            "new_balance": new_balance,
+            "refund_pending": True,
             "number": purchase["number"]
         }
         
@@ -412,9 +423,9 @@ async def get_my_purchases(current_user: dict = Depends(get_current_user)):
     try:
         user_id = current_user.get("id")
         
-        purchases = list(smsman_purchases_collection.find({
+        purchases = await run_db(lambda: list(smsman_purchases_collection.find({
             "user_id": user_id
-        }).sort("created_at", -1).limit(50))
+        }).sort("created_at", -1).limit(50)))
         
         # Convert ObjectId to string
         for purchase in purchases:
@@ -448,3 +459,26 @@ async def get_meta_endpoint():
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# ===== PRICE CACHE STATUS =====
+@router.get("/pricing-status")
+async def get_pricing_status_endpoint():
+    """Price-sheet age per hot country plus catalog cache and coalescing counters"""
+    return {
+        "success": True,
+        "refresher": price_refresher.refresh_status(),
+        "caches": cache_stats() + [catalog_render.stats()],
+        "coalesced": singleflight.stats()
+    }
+
+# ===== SMS POLLER METRICS =====
+@router.get("/poller-stats")
+async def get_poller_stats_endpoint():
+    """Central SMS poller load, polls saved and time-to-code"""
+    return {"success": True, "poller": sms_hub.metrics()}
+
+# ===== PROVIDER ROUTING STATS =====
+@router.get("/provider-stats")
+async def get_provider_stats_endpoint():
+    """Rolling buy success, latency, SMS rate and time-to-SMS per provider and offer"""
+    return {"success": True, "routing": provider_router.metrics()}
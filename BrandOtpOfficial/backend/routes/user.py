@@ -5,7 +5,10 @@ from datetime import datetime
 from bson import ObjectId
 
 # Import database
-from backend.db import users_collection
+from backend.db import users_collection, run_db
+from backend.utils.auth_utils import get_current_user
+from backend.utils.wallet_utils import get_wallet_balance
+from backend.utils.user_counters import get_counters
 
 router = APIRouter()
 
@@ -47,40 +50,45 @@ def get_current_user_simple(token: str = None):
     except Exception as e:
         raise HTTPException(status_code=401, detail="Authentication failed")
 
-# ✅ GET USER PROFILE (Simple version without auth dependency)
+# ✅ GET USER PROFILE
 @router.get("/profile")
-async def get_user_profile():
-    """Get current user profile - simplified version"""
+async def get_user_profile(current_user: dict = Depends(get_current_user)):
+    """Get current user profile with order totals from the per-user counters"""
     try:
-        # For now, return a simple success message
-        # This will be enhanced once auth is fully working
+        balance = await run_db(get_wallet_balance, current_user["id"])
+        counters = await run_db(get_counters, current_user["id"])
+        
         return {
             "success": True,
-            "message": "User profile endpoint working",
             "user": {
-                "username": "User",
-                "email": "user@example.com", 
-                "balance": 0.0
+                "id": current_user["id"],
+                "username": current_user.get("username", "User"),
+                "email": current_user.get("email", ""),
+                "balance": balance or 0.0,
+                "is_active": current_user.get("is_active", True),
+                "total_orders": counters["total_orders"],
+                "total_spent": counters["total_spent"]
             }
         }
         
     except Exception as e:
         print(f"❌ Profile error: {e}")
-        return {
-            "success": False,
-            "message": "Profile endpoint working but with demo data"
-        }
+        raise HTTPException(status_code=500, detail="Failed to load profile")
 
 # ✅ GET DASHBOARD STATS  
 @router.get("/stats")
-async def get_dashboard_stats():
-    """Get dashboard statistics"""
+async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+    """Get dashboard statistics - one counters read plus the live balance"""
     try:
+        balance = await run_db(get_wallet_balance, current_user["id"])
+        counters = await run_db(get_counters, current_user["id"])
+        
         stats = {
-            "total_balance": 0.0,
-            "total_orders": 0,
-            "active_numbers": 0,
-            "pending_requests": 0
+            "total_balance": balance or 0.0,
+            "total_orders": counters["total_orders"],
+            "total_spent": counters["total_spent"],
+            "active_numbers": counters["active_numbers"],
+            "pending_requests": counters["otp_pending"]
         }
         
         return {
@@ -90,10 +98,7 @@ async def get_dashboard_stats():
         
     except Exception as e:
         print(f"❌ Stats error: {e}")
-        return {
-            "success": False,
-            "message": "Stats endpoint error"
-        }
+        raise HTTPException(status_code=500, detail="Failed to load stats")
 
 # ✅ TEST ENDPOINT
 @router.get("/test")
@@ -3,16 +3,17 @@
 from fastapi import APIRouter, Request, Form, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
 from bson import ObjectId
 
 # Import dependencies
-from backend.db import get_db, users_collection, wallets_collection
+from backend.db import get_db, users_collection, wallets_collection, run_db
 from backend.utils.auth_utils import get_current_user
 
 # --- ✅ STEP 1: IMPORT FROM THE NEW UTILS FILE ---
-from backend.utils.wallet_utils import credit_user_wallet, debit_user_wallet
+from backend.utils.wallet_utils import credit_user_wallet, debit_user_wallet, get_wallet_balance
+from backend.utils.pagination import fetch_page
 # ------------------------------------------------
 
 # ✅ CREATE ROUTER INSTANCE
@@ -26,24 +27,23 @@ router = APIRouter()
 async def get_balance(current_user: dict = Depends(get_current_user)):
     """Get user wallet balance"""
     try:
-        if "balance" not in current_user or current_user["balance"] is None:
-            users_collection.update_one(
-                {"_id": ObjectId(current_user["id"])},
-                {"$set": {"balance": 0.0}}
-            )
-            current_user["balance"] = 0.0
+        balance = await run_db(get_wallet_balance, current_user["id"])
+        if balance is None:
+            raise HTTPException(status_code=404, detail="User not found")
         
         return JSONResponse(
             status_code=200,
             content={
                 "success": True,
-                "balance": float(current_user.get("balance", 0.0)),
+                "balance": balance,
                 "user": {
                     "username": current_user.get("username", "User"),
                     "email": current_user.get("email", "")
                 }
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "detail": f"Failed to get balance: {str(e)}"})
 
@@ -85,16 +85,18 @@ async def add_money(
 async def get_transactions(
     current_user: dict = Depends(get_current_user),
     limit: int = 20,
-    skip: int = 0
+    skip: int = 0,
+    cursor: Optional[str] = None
 ):
-    """Get user wallet transactions"""
+    """Get user wallet transactions (pass next_cursor back as cursor for the next page)"""
     try:
-        transactions = list(
-            wallets_collection
-            .find({"user_id": current_user["id"]})
-            .sort("created_at", -1)
-            .skip(skip)
-            .limit(limit)
+        transactions, next_cursor = await run_db(
+            fetch_page,
+            wallets_collection,
+            {"user_id": current_user["id"]},
+            limit,
+            cursor=cursor,
+            skip=skip
         )
         
         for transaction in transactions:
@@ -107,9 +109,12 @@ async def get_transactions(
             content={
                 "success": True,
                 "transactions": transactions,
-                "current_balance": float(current_user.get("balance", 0.0))
+                "next_cursor": next_cursor,
+                "current_balance": await run_db(get_wallet_balance, current_user["id"]) or 0.0
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "detail": f"Failed to get transactions: {str(e)}"})
 
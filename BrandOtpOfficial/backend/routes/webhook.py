@@ -1,16 +1,15 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
-from bson import ObjectId
-import time
 
-from backend.db import users_collection, payments_collection
+from backend.db import payments_collection, run_db
+from backend.utils import topups
 
 router = APIRouter()
 
 @router.post("/webhook")
 async def pay0_webhook(request: Request):
     """
-    Pay0 webhook handler
+    Pay0 webhook handler: claim the order atomically, ack, credit in the background
     """
     try:
         data = await request.form()
@@ -27,7 +26,7 @@ async def pay0_webhook(request: Request):
             print(f"⚠️ Manual update detected. Fetching user from payment record...")
             
             # Try to find existing payment record
-            existing_payment = payments_collection.find_one({"order_id": order_id})
+            existing_payment = await run_db(payments_collection.find_one, {"order_id": order_id}, {"user_id": 1})
             if existing_payment and existing_payment.get("user_id"):
                 user_id_str = existing_payment.get("user_id")
                 print(f"✅ Found user_id from payment record: {user_id_str}")
@@ -47,70 +46,24 @@ async def pay0_webhook(request: Request):
             print(f"⚠️ Status not SUCCESS: {status}")
             return JSONResponse(content={"success": False, "message": "Status not SUCCESS"})
         
-        # Check if already processed
-        existing_payment = payments_collection.find_one({"order_id": order_id})
-        if existing_payment and existing_payment.get("status") == "SUCCESS":
+        # ✅ Only one caller (webhook retry or status check) wins the claim
+        claimed = await run_db(
+            topups.claim,
+            order_id,
+            user_id_str,  # Store as string
+            amount,
+            "Wallet Top-up via Pay0 Webhook",
+            source="webhook"
+        )
+        if not claimed:
             print(f"⚠️ Already processed: {order_id}")
             return JSONResponse(content={"success": True, "message": "Already processed"})
         
-        # ✅ FIX 3: Validate and convert user_id to ObjectId
-        try:
-            if len(user_id_str) == 24:
-                user_object_id = ObjectId(user_id_str)
-                print(f"✅ Valid ObjectId: {user_object_id}")
-            else:
-                print(f"⚠️ Invalid ObjectId format: {user_id_str}")
-                user_object_id = user_id_str  # Use as string
-        except Exception as e:
-            print(f"❌ ObjectId conversion error: {e}")
-            user_object_id = user_id_str
-        
-        # ✅ FIX 4: Update user wallet in MongoDB
-        try:
-            if isinstance(user_object_id, ObjectId):
-                update_result = users_collection.update_one(
-                    {"_id": user_object_id},
-                    {"$inc": {"balance": amount}}
-                )
-            else:
-                # Fallback: try updating by string ID field
-                update_result = users_collection.update_one(
-                    {"user_id": user_object_id},
-                    {"$inc": {"balance": amount}}
-                )
-            
-            print(f"✅ Wallet update result: {update_result.modified_count} document(s) updated")
-            
-            if update_result.modified_count == 0:
-                print(f"⚠️ No document updated! User might not exist: {user_id_str}")
-        except Exception as e:
-            print(f"❌ Wallet update error: {e}")
-        
-        # ✅ FIX 5: Save/update payment record
-        payment_data = {
-            "order_id": order_id,
-            "user_id": user_id_str,  # Store as string
-            "amount": amount,
-            "status": "SUCCESS",
-            "type": "credit",
-            "reason": "Wallet Top-up via Pay0 Webhook",
-            "created_at": time.time(),
-            "updated_at": time.time()
-        }
-        
-        if existing_payment:
-            payments_collection.update_one(
-                {"order_id": order_id},
-                {"$set": payment_data}
-            )
-            print(f"✅ Payment record updated")
-        else:
-            payments_collection.insert_one(payment_data)
-            print(f"✅ Payment record created")
-        
-        print(f"✅ [WEBHOOK] Wallet updated: User {user_id_str}, Amount +₹{amount}")
+        # Ack now; the credit runs on the job queue with retries
+        await run_db(topups.enqueue_credit, order_id)
+        print(f"✅ [WEBHOOK] Claimed: Order {order_id}, User {user_id_str}, Amount +₹{amount}")
         
-        return JSONResponse(content={"success": True, "message": "Wallet updated successfully"})
+        return JSONResponse(content={"success": True, "message": "Payment accepted"})
         
     except Exception as e:
         print(f"❌ [WEBHOOK] Error: {e}")
@@ -0,0 +1,165 @@
+# backend/sqlite_store.py
+"""
+SQLite storage for number_orders / wallet_transactions.
+
+Each worker thread of a small dedicated pool keeps one connection open for
+its lifetime, so requests skip connect/pragma setup and reuse the
+connection's prepared-statement cache. The database runs in WAL mode:
+history reads proceed while a write is in flight, and writers wait on
+busy_timeout instead of failing with "database is locked".
+
+Async routes call the query functions through run_sqlite, which keeps the
+blocking sqlite3 calls off the event loop.
+"""
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "database.db")
+SQLITE_WORKERS = int(os.getenv("SQLITE_WORKERS", 8))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # Durable across app crashes in WAL mode, fsync only at checkpoints
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",  # ~8 MB page cache per connection
+    "PRAGMA foreign_keys=ON"
+)
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS number_orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT UNIQUE NOT NULL,
+        user_id INTEGER NOT NULL,
+        service TEXT NOT NULL,
+        phone_number TEXT NOT NULL,
+        country TEXT NOT NULL,
+        amount REAL NOT NULL,
+        sms_status TEXT DEFAULT 'waiting',
+        order_status TEXT DEFAULT 'active',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        balance REAL DEFAULT 0.0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS wallet_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        transaction_id TEXT UNIQUE,
+        type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        reason TEXT,
+        status TEXT DEFAULT 'completed',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # History pages: WHERE user_id = ? ORDER BY created_at DESC
+    "CREATE INDEX IF NOT EXISTS idx_number_orders_user_created ON number_orders (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_wallet_transactions_user_created ON wallet_transactions (user_id, created_at)"
+)
+
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_sqlite_executor = ThreadPoolExecutor(max_workers=SQLITE_WORKERS, thread_name_prefix="sqlite")
+
+def get_connection() -> sqlite3.Connection:
+    """This thread's connection, opened and configured on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(
+            SQLITE_PATH,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,  # Autocommit: each statement is its own short write transaction
+            check_same_thread=False,  # Only its own thread uses it; shutdown closes it from another
+            cached_statements=128
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+async def run_sqlite(fn, *args, **kwargs):
+    """Run a blocking SQLite call on the SQLite thread pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_sqlite_executor, functools.partial(fn, *args, **kwargs))
+
+def init_schema() -> None:
+    """Create tables and indexes (idempotent)"""
+    conn = get_connection()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    print(f"✅ SQLite tables initialized ({SQLITE_PATH}, journal_mode=WAL)")
+
+# ----- number_orders -----
+
+def list_number_orders(user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+    rows = get_connection().execute(
+        """
+        SELECT order_id, service, phone_number, country, amount,
+               sms_status, order_status, created_at
+        FROM number_orders
+        WHERE user_id = ?
+        ORDER BY created_at DESC
+        LIMIT ?
+        """,
+        (user_id, limit)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def insert_number_order(
+    order_id: str,
+    user_id: int,
+    service: str,
+    phone_number: str,
+    country: str,
+    amount: float
+) -> None:
+    get_connection().execute(
+        """
+        INSERT INTO number_orders
+        (order_id, user_id, service, phone_number, country, amount, sms_status, order_status)
+        VALUES (?, ?, ?, ?, ?, ?, 'waiting', 'active')
+        """,
+        (order_id, user_id, service, phone_number, country, amount)
+    )
+
+def update_number_order_status(order_id: str, sms_status: str, order_status: str) -> int:
+    """Returns the number of rows updated"""
+    cursor = get_connection().execute(
+        """
+        UPDATE number_orders
+        SET sms_status = ?, order_status = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE order_id = ?
+        """,
+        (sms_status, order_status, order_id)
+    )
+    return cursor.rowcount
+
+def close_connections() -> None:
+    """Drain the pool, then close every thread's connection (checkpoints the WAL)"""
+    _sqlite_executor.shutdown(wait=True)
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
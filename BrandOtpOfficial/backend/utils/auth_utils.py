@@ -1,10 +1,15 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 import jwt
+import os
+import threading
+import time
 from bson import ObjectId
 
 # Import database
-from backend.db import users_collection
+from backend.db import users_collection, run_db
 
 # JWT Configuration
 SECRET_KEY = "brandotpsecretkey2025"
@@ -13,46 +18,111 @@ ALGORITHM = "HS256"
 # Create HTTPBearer instance
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from JWT token"""
+# Authenticated user records (no balance - wallet reads always hit Mongo),
+# shared by the event loop and DB pool threads
+USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10000))
+_user_cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+_invalidated_at: Dict[str, float] = {}  # user_id -> last local invalidation
+_cache_lock = threading.Lock()
+
+def _decode_token(token: str) -> dict:
     try:
-        # Extract token from Authorization header
-        token = credentials.credentials
-        
-        # Decode JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        email = payload.get("email")
-        
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-        
-        # Get user from database
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
-        
-        # Return user data
-        return {
-            "id": str(user["_id"]),
-            "username": user.get("username", "User"),
-            "email": user.get("email", ""),
-            "balance": float(user.get("balance", 0.0)),
-            "is_active": user.get("is_active", True)
-        }
-        
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
+    if payload.get("user_id") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    return payload
+
+def _fast_user(payload: dict) -> Optional[dict]:
+    """User from the in-process cache or fresh verified claims, without touching Mongo"""
+    user_id = payload["user_id"]
+    now = time.time()
+    with _cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached is not None and now - cached[1] < USER_CACHE_TTL:
+            _user_cache.move_to_end(user_id)
+            return dict(cached[0])
+        invalidated_at = _invalidated_at.get(user_id, 0.0)
+
+    # Claims are only trusted as long as a cache entry would be, and never
+    # across a status change made on this worker after the token was issued
+    issued_at = payload.get("iat")
+    if "is_active" in payload and issued_at and now - issued_at < USER_CACHE_TTL and issued_at > invalidated_at:
+        return {
+            "id": user_id,
+            "username": payload.get("username", "User"),
+            "email": payload.get("email", ""),
+            "is_active": payload["is_active"]
+        }
+    return None
+
+def _load_user(user_id: str) -> dict:
+    """Fetch the user from Mongo and cache it"""
+    user = users_collection.find_one(
+        {"_id": ObjectId(user_id)},
+        {"username": 1, "email": 1, "is_active": 1}
+    )
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+
+    user_data = {
+        "id": str(user["_id"]),
+        "username": user.get("username", "User"),
+        "email": user.get("email", ""),
+        "is_active": user.get("is_active", True)
+    }
+
+    with _cache_lock:
+        _user_cache[user_id] = (user_data, time.time())
+        _user_cache.move_to_end(user_id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+    return dict(user_data)
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a user's cached record after an admin or profile change"""
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+        _invalidated_at[user_id] = time.time()
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get current user from JWT token"""
+    try:
+        payload = _decode_token(credentials.credentials)
+        user = _fast_user(payload)
+        if user is not None:
+            return user
+        # Cache miss - the user lookup runs on the DB pool
+        return await run_db(_load_user, payload["user_id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Auth error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication failed"
+        )
+
+def get_user_from_token(token: str):
+    """Resolve a raw JWT (header or query string) to the current user"""
+    try:
+        payload = _decode_token(token)
+        return _fast_user(payload) or _load_user(payload["user_id"])
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Auth error: {e}")
         raise HTTPException(
@@ -0,0 +1,120 @@
+# backend/utils/cache.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+Fetcher = Callable[[], Awaitable[Any]]
+
+class CatalogCache:
+    """
+    Async TTL cache with stale-while-revalidate and single-flight refresh.
+
+    - fresh (age < ttl): served straight from memory
+    - stale (age < ttl + stale_ttl): served immediately, refreshed in background
+    - missing / expired: callers share ONE upstream fetch for the key
+
+    A failed refresh (exception or empty result) keeps the previous value, so
+    an upstream outage degrades to stale data instead of an empty page.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        stale_ttl: float,
+        max_entries: int = 128,
+        ttl_overrides: Optional[Dict[Hashable, float]] = None
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.ttl_overrides = dict(ttl_overrides or {})
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "failures": 0}
+
+    def ttl_for(self, key: Hashable) -> float:
+        return self.ttl_overrides.get(key, self.ttl)
+
+    async def get(self, key: Hashable, fetcher: Fetcher) -> Any:
+        """Return the cached value for key, fetching or revalidating as needed"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            ttl = self.ttl_for(key)
+            self._entries.move_to_end(key)
+
+            if age < ttl:
+                self._stats["hits"] += 1
+                return value
+
+            if age < ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._start_refresh(key, fetcher)
+                return value
+
+        self._stats["misses"] += 1
+        return await asyncio.shield(self._start_refresh(key, fetcher))
+
+    async def refresh(self, key: Hashable, fetcher: Fetcher) -> Any:
+        """Force a refresh of key (joins an in-flight refresh if there is one)"""
+        return await asyncio.shield(self._start_refresh(key, fetcher))
+
+    def peek(self, key: Hashable) -> Any:
+        """Return whatever is cached for key regardless of age, without fetching"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since key was last stored, or None if it was never cached"""
+        entry = self._entries.get(key)
+        return time.monotonic() - entry[1] if entry is not None else None
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    def invalidate(self, key: Hashable = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            **self._stats
+        }
+
+    def _start_refresh(self, key: Hashable, fetcher: Fetcher) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_fetch(key, fetcher))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._inflight.pop(k, None) if self._inflight.get(k) is t else None)
+        return task
+
+    async def _run_fetch(self, key: Hashable, fetcher: Fetcher) -> Any:
+        self._stats["refreshes"] += 1
+        try:
+            value = await fetcher()
+        except Exception as e:
+            print(f"❌ {self.name} cache refresh failed for {key}: {e}")
+            value = None
+
+        if value:
+            self._store(key, value)
+            return value
+
+        self._stats["failures"] += 1
+        return self.peek(key) if key in self._entries else value
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
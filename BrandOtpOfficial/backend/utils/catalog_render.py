@@ -0,0 +1,124 @@
+# backend/utils/catalog_render.py
+"""
+Service catalog responses rendered once per price-sheet version.
+
+get_services_by_country hands back the same list object for as long as the
+country's price sheet and the application list are unchanged (PriceSheet
+joins once per version). That list identity is the version: the first
+request for a new version encodes the JSON body once, and gzip/brotli
+variants are compressed from it once. Each variant is stored as bytes with an
+ETag. Every later request either gets a 304 (If-None-Match) or the stored
+bytes.
+
+orjson and brotli are used when installed; without them the body is
+encoded with the stdlib json module and only gzip is offered.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Dict, Hashable, List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("CATALOG_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("CATALOG_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("CATALOG_BROTLI_QUALITY", 6))
+
+class RenderedCatalog:
+    __slots__ = ("source", "etag", "body", "gzip", "br")
+
+    def __init__(self, source: List[Dict[str, Any]], body: bytes):
+        self.source = source  # Held so its identity cannot be reused while cached
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.gzip = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(body, quality=BROTLI_QUALITY)
+
+_rendered: Dict[Hashable, RenderedCatalog] = {}
+_inflight: Dict[Hashable, asyncio.Future] = {}
+_stats = {"renders": 0, "reused": 0, "not_modified": 0}
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _render(services: List[Dict[str, Any]], payload: Dict[str, Any]) -> RenderedCatalog:
+    return RenderedCatalog(services, _encode(payload))
+
+async def render(key: Hashable, services: List[Dict[str, Any]], payload: Dict[str, Any]) -> RenderedCatalog:
+    """
+    The rendered bytes for key at this version (services identity). Encoding
+    and compression run off the event loop, and concurrent callers share one render.
+    """
+    cached = _rendered.get(key)
+    if cached is not None and cached.source is services:
+        _stats["reused"] += 1
+        return cached
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        rendered = await asyncio.shield(pending)
+        if rendered.source is services:
+            return rendered
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, _render, services, payload)
+    _inflight[key] = future
+    try:
+        rendered = await asyncio.shield(future)
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+    _rendered[key] = rendered
+    _stats["renders"] += 1
+    return rendered
+
+def _accepts(request: Request, coding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def respond(request: Request, rendered: RenderedCatalog) -> Response:
+    """304 when the client already has this version, otherwise the best pre-encoded variant"""
+    headers = {"ETag": rendered.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if rendered.etag in tags or "*" in tags:
+            _stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+    body = rendered.body
+    if rendered.br is not None and _accepts(request, "br"):
+        body = rendered.br
+        headers["Content-Encoding"] = "br"
+    elif rendered.gzip is not None and _accepts(request, "gzip"):
+        body = rendered.gzip
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def stats() -> Dict[str, Any]:
+    return {"name": "catalog_render", "entries": len(_rendered), **_stats}
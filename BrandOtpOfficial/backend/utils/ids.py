@@ -0,0 +1,51 @@
+# backend/utils/ids.py
+"""
+Order IDs: ULIDs (26 chars, Crockford base32).
+
+    48-bit millisecond timestamp | 80 random bits
+
+Workers need no coordination: 80 random bits per millisecond make a
+cross-process collision practically impossible. Within one process, IDs
+generated in the same millisecond increment the random part instead of
+drawing new bits, so they stay strictly increasing. IDs therefore sort by
+creation time, both as strings and as UNIQUE keys, and can be used directly
+as pagination cursors.
+"""
+import os
+import threading
+import time
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(_ALPHABET[index])
+    return "".join(reversed(chars))
+
+def new_id() -> str:
+    """Monotonic, k-sortable 26-character ULID"""
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _last_random = int.from_bytes(os.urandom(10), "big")
+        elif _last_random < _RANDOM_MAX:
+            # Same millisecond (or the clock stepped back): keep ordering by incrementing
+            _last_random += 1
+        else:
+            _last_ms += 1
+            _last_random = int.from_bytes(os.urandom(10), "big")
+        return _encode(_last_ms, 10) + _encode(_last_random, 16)
+
+def new_order_id(prefix: str = "ORD") -> str:
+    """Prefixed order ID, e.g. ORD_01J9Z3K8R5T0QXQ8N6M2V4W7YB"""
+    return f"{prefix}_{new_id()}"
@@ -0,0 +1,235 @@
+# backend/utils/job_queue.py
+"""
+Mongo-backed job queue for side effects that must not be lost or make the
+user wait (refunds, wallet credits, purchase bookkeeping).
+
+Job documents in the jobs collection:
+
+    {type, payload, state: queued|running|done|dead, attempts, max_attempts,
+     run_at, lease_until, last_error, dedupe_key, created_at, updated_at, finished_at}
+
+Delivery is at-least-once. A worker leases a job with find_one_and_update.
+A job whose worker died is picked up again when its lease expires, so
+handlers must be idempotent. A failure is retried with exponential backoff
+and jitter; after max_attempts the job is dead-lettered (state "dead") and
+kept for inspection. Finished jobs expire through a TTL index on finished_at;
+dead jobs have none and stay until retried or removed.
+
+Handlers are plain blocking functions registered with @handler("type"). They
+run on the DB thread pool.
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import suppress
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.db import jobs_collection, run_db
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_LEASE = float(os.getenv("JOB_LEASE", 60))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 8))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", 2))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 600))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def handler(job_type: str):
+    """Register the blocking function that runs jobs of job_type"""
+    def register(fn: Callable[[Dict[str, Any]], Any]):
+        _handlers[job_type] = fn
+        return fn
+    return register
+
+def _notify() -> None:
+    """Wake an idle worker; enqueue usually runs on a DB pool thread"""
+    if _loop is not None and _wakeup is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+def enqueue(
+    job_type: str,
+    payload: Dict[str, Any],
+    dedupe_key: Optional[str] = None,
+    delay: float = 0,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    session=None
+) -> Optional[str]:
+    """
+    Insert a job and return its id. With dedupe_key, a job that is still
+    queued or running for the same key is reused instead. Pass session to
+    enqueue inside the transaction that makes the job necessary.
+    """
+    now = time.time()
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "state": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now + delay,
+        "created_at": now,
+        "updated_at": now
+    }
+    try:
+        if dedupe_key:
+            # Finished and dead jobs drop their dedupe_key, so this only matches a live job
+            job["dedupe_key"] = dedupe_key
+            result = jobs_collection.update_one(
+                {"dedupe_key": dedupe_key}, {"$setOnInsert": job}, upsert=True, session=session
+            )
+            if result.upserted_id is None:
+                existing = jobs_collection.find_one({"dedupe_key": dedupe_key}, {"_id": 1}, session=session)
+                return str(existing["_id"]) if existing else None
+            job_id = result.upserted_id
+        else:
+            job_id = jobs_collection.insert_one(job, session=session).inserted_id
+    except DuplicateKeyError:
+        # Lost an upsert race to a concurrent enqueue of the same key
+        existing = jobs_collection.find_one({"dedupe_key": dedupe_key}, {"_id": 1})
+        return str(existing["_id"]) if existing else None
+    _notify()
+    return str(job_id)
+
+def _backoff(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+def _lease() -> Optional[Dict[str, Any]]:
+    """Take the oldest runnable job: due and queued, or running with an expired lease"""
+    now = time.time()
+    return jobs_collection.find_one_and_update(
+        {"$or": [
+            {"state": "queued", "run_at": {"$lte": now}},
+            {"state": "running", "lease_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {"state": "running", "lease_until": now + JOB_LEASE, "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def _finish(job: Dict[str, Any]) -> None:
+    jobs_collection.update_one(
+        {"_id": job["_id"], "state": "running"},
+        {
+            "$set": {"state": "done", "finished_at": datetime.utcnow(), "updated_at": time.time()},
+            "$unset": {"lease_until": "", "dedupe_key": ""}
+        }
+    )
+
+def _fail(job: Dict[str, Any], error: str) -> None:
+    now = time.time()
+    if job["attempts"] >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+        print(f"💀 Job {job['type']} {job['_id']} dead after {job['attempts']} attempts: {error}")
+        update = {
+            "$set": {"state": "dead", "last_error": error, "updated_at": now},
+            "$unset": {"lease_until": "", "dedupe_key": ""}
+        }
+    else:
+        retry_in = _backoff(job["attempts"])
+        print(f"⚠️ Job {job['type']} {job['_id']} failed (attempt {job['attempts']}), retry in {retry_in:.0f}s: {error}")
+        update = {
+            "$set": {"state": "queued", "run_at": now + retry_in, "last_error": error, "updated_at": now},
+            "$unset": {"lease_until": ""}
+        }
+    jobs_collection.update_one({"_id": job["_id"], "state": "running"}, update)
+
+def run_one() -> bool:
+    """Lease and run one job; False when nothing is runnable"""
+    job = _lease()
+    if job is None:
+        return False
+
+    fn = _handlers.get(job["type"])
+    if fn is None:
+        _fail(job, f"No handler registered for job type '{job['type']}'")
+        return True
+
+    try:
+        fn(job.get("payload") or {})
+    except Exception as e:
+        _fail(job, str(e) or e.__class__.__name__)
+    else:
+        _finish(job)
+    return True
+
+async def _worker(index: int) -> None:
+    while True:
+        try:
+            ran = await run_db(run_one)
+        except Exception as e:
+            print(f"❌ Job worker {index} error: {e}")
+            ran = False
+        if ran:
+            continue
+        _wakeup.clear()
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+
+def queue_depth() -> Dict[str, Any]:
+    """Jobs per type and state, plus how overdue the oldest runnable job is"""
+    by_type: Dict[str, Dict[str, int]] = {}
+    totals = {"queued": 0, "running": 0, "dead": 0}
+    for row in jobs_collection.aggregate([
+        {"$match": {"state": {"$in": ["queued", "running", "dead"]}}},
+        {"$group": {"_id": {"type": "$type", "state": "$state"}, "count": {"$sum": 1}}}
+    ]):
+        job_type, state = row["_id"]["type"], row["_id"]["state"]
+        by_type.setdefault(job_type, {"queued": 0, "running": 0, "dead": 0})[state] = row["count"]
+        totals[state] += row["count"]
+
+    oldest = jobs_collection.find_one(
+        {"state": "queued", "run_at": {"$lte": time.time()}},
+        {"run_at": 1},
+        sort=[("run_at", ASCENDING)]
+    )
+    return {
+        "totals": totals,
+        "by_type": by_type,
+        "oldest_due_seconds": round(time.time() - oldest["run_at"], 1) if oldest else 0,
+        "workers": len(_workers)
+    }
+
+def retry_dead(job_type: Optional[str] = None) -> int:
+    """Put dead-lettered jobs back in the queue with a fresh attempt budget"""
+    query: Dict[str, Any] = {"state": "dead"}
+    if job_type:
+        query["type"] = job_type
+    result = jobs_collection.update_many(
+        query,
+        {"$set": {"state": "queued", "attempts": 0, "run_at": time.time(), "updated_at": time.time()}}
+    )
+    if result.modified_count:
+        _notify()
+    return result.modified_count
+
+def start() -> None:
+    """Start the workers (called from the FastAPI startup hook)"""
+    global _wakeup, _loop
+    if _workers:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    for index in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker(index)))
+    print(f"✅ Job queue started: {JOB_WORKERS} workers, handlers: {', '.join(sorted(_handlers))}")
+
+async def stop() -> None:
+    """Stop the workers; a job cut off mid-run is re-leased after JOB_LEASE"""
+    for task in _workers:
+        task.cancel()
+    for task in _workers:
+        with suppress(asyncio.CancelledError):
+            await task
+    _workers.clear()
@@ -0,0 +1,79 @@
+# backend/utils/jobs.py
+"""
+Job handlers for the job queue. Importing this module registers them.
+
+Delivery is at-least-once, so every handler checks what is already done
+before doing it again. A raised exception means "retry later".
+"""
+import time
+from typing import Any, Dict
+
+from backend.db import payments_collection, smsman_purchases_collection, run_in_transaction
+from backend.utils.job_queue import handler
+from backend.utils.wallet_utils import credit_user_wallet
+from backend.utils.stats_rollups import record_cancellation, record_purchase
+from backend.utils.user_counters import record_number_cancelled, record_number_purchase
+from backend.utils import topups
+
+@handler("number_refund")
+def refund_cancelled_number(payload: Dict[str, Any]) -> None:
+    """Refund a cancelled SMSMan number; the ledger entry keyed by request_id makes it idempotent"""
+    request_id = payload["request_id"]
+    user_id = payload["user_id"]
+    amount = payload["amount"]
+
+    if payments_collection.find_one({"request_id": request_id, "type": "credit"}, {"_id": 1}):
+        return  # Refunded on an earlier attempt
+
+    # The unique (request_id, type) refund index rejects a second credit from a concurrent run
+
+    refund = credit_user_wallet(
+        user_id,
+        amount,
+        f"Refund - Number {payload['number']} cancelled",
+        ledger=payments_collection,
+        created_at=time.time(),
+        request_id=request_id
+    )
+    if refund.get("duplicate"):
+        print(f"⚠️ Refund already applied: Request {request_id}")
+        return
+    if not refund["success"]:
+        raise RuntimeError(f"Refund failed: {refund['error']}")
+
+    smsman_purchases_collection.update_one(
+        {"request_id": request_id},
+        {"$set": {"refund_amount": amount, "refunded_at": time.time()}}
+    )
+    record_cancellation(amount, payload.get("profit", 0))
+    record_number_cancelled(user_id, amount, payload.get("was_active", False))
+    print(f"✅ Refunded: Request {request_id}, Amount: ₹{amount}")
+
+@handler("topup_credit")
+def credit_topup(payload: Dict[str, Any]) -> None:
+    result = topups.apply_credit(payload["order_id"])
+    if not result["success"] and result.get("retry"):
+        raise RuntimeError(result["error"])
+
+@handler("purchase_recorded")
+def record_number_purchase_stats(payload: Dict[str, Any]) -> None:
+    """Count a committed purchase once: the stats_recorded marker on the purchase gates the $incs"""
+    request_id = payload.get("request_id")
+    if request_id is None:
+        # Queued before the payload carried request_id; nothing to gate on
+        record_purchase(payload["amount"], payload["profit"])
+        record_number_purchase(payload["user_id"], payload["amount"])
+        return
+
+    def write(session):
+        marked = smsman_purchases_collection.update_one(
+            {"request_id": request_id, "stats_recorded": {"$ne": True}},
+            {"$set": {"stats_recorded": True}},
+            session=session
+        )
+        if not marked.modified_count:
+            return  # Counted on an earlier delivery
+        record_purchase(payload["amount"], payload["profit"], session=session)
+        record_number_purchase(payload["user_id"], payload["amount"], session=session)
+
+    run_in_transaction(write)
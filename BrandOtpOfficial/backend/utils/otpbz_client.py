@@ -1,18 +1,31 @@
 import httpx, os, json
 
+from backend.utils.upstream_guard import guard
+from backend.utils.singleflight import single_flight
+
 API_KEY = os.getenv("OTPBZ_API_KEY")
 BASE = "https://flashsms.pro/stubs/handler_api.php"
 
+_guard = guard("otpbz", rate=5, burst=10)
+
+async def _fetch(params: dict) -> httpx.Response:
+    async with httpx.AsyncClient(timeout=15) as c:
+        return await c.get(BASE, params=params)
+
 async def _raw(action: str, **kw):
     params = {"api_key": API_KEY, "action": action, **kw}
-    async with httpx.AsyncClient(timeout=15) as c:
-        txt = (await c.get(BASE, params=params)).text.strip()
+    response = await _guard.call(
+        lambda: _fetch(params),
+        is_failure=lambda r: r.status_code >= 500 or r.status_code == 429
+    )
+    txt = response.text.strip()
     
     # Better error handling
     if any(err in txt for err in ["BAD_KEY", "ERROR_SQL", "NO_BALANCE", "NO_NUMBERS", "BAD_SERVICE", "BAD_SERVER"]):
         raise RuntimeError(txt)
     return txt
 
+@single_flight("otpbz.balance")
 async def balance() -> float:
     try:
         txt = await _raw("getBalance")
@@ -40,6 +53,7 @@ def _merge_services(api_services: list[str], popular_services: list[str]) -> lis
     
     return result[:60]  # Limit for better UX
 
+@single_flight("otpbz.services")
 async def services() -> list[str]:
     try:
         # Get API response
@@ -89,6 +103,7 @@ async def services() -> list[str]:
             "lf", "mb", "dr", "rv", "4fun", "51exch", "51game", "567slots"
         ]
 
+@single_flight("otpbz.servers")
 async def servers() -> list[int]:
     try:
         txt = await _raw("getServers")
@@ -122,6 +137,18 @@ async def servers() -> list[int]:
         print(f"Servers error: {e}")
         return [2, 3, 4, 5, 6, 7, 8, 9, 12, 13, 14, 15]
 
+@single_flight("otpbz.price", key=lambda service, server: (service, int(server)))
+async def price(service: str, server: int):
+    """Cost of one number for service on server (handler_api getPrices), None if unavailable"""
+    try:
+        data = json.loads(await _raw("getPrices", service=service, country=server))
+        offer = data.get(str(server), {}).get(service, {})
+        if int(offer.get("count", 0)) <= 0:
+            return None
+        return float(offer["cost"])
+    except (RuntimeError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
 async def buy(service: str, server: int):
     txt = await _raw("getNumber", service=service, server=server)
     if "ACCESS_NUMBER:" in txt:
@@ -130,6 +157,7 @@ async def buy(service: str, server: int):
             return {"id": int(parts[1]), "number": parts[2]}
     raise RuntimeError("Failed to buy number")
 
+@single_flight("otpbz.sms", key=lambda oid: int(oid))
 async def sms(oid: int):
     txt = await _raw("getStatus", id=oid)
     if txt.startswith("STATUS_OK:"):
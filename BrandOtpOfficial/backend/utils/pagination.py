@@ -0,0 +1,102 @@
+# backend/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+# Newest first; _id breaks ties between documents created in the same instant
+PAGE_SORT = [("created_at", -1), ("_id", -1)]
+
+TOTAL_MODES = ("exact", "estimated", "none")
+ESTIMATE_CAP = 10000  # Filtered "estimated" totals stop counting here
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque token for the position right after doc"""
+    created_at = doc.get("created_at")
+    if isinstance(created_at, datetime):
+        position = {"k": "dt", "c": created_at.isoformat()}
+    elif isinstance(created_at, (int, float)):
+        position = {"k": "num", "c": created_at}
+    else:
+        position = {"k": "null", "c": None}
+    position["i"] = str(doc["_id"])
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        if position["k"] == "dt":
+            created_at = datetime.fromisoformat(position["c"])
+        elif position["k"] == "num":
+            created_at = float(position["c"])
+        else:
+            created_at = None
+        return created_at, ObjectId(position["i"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(query: Dict[str, Any], cursor: str) -> Dict[str, Any]:
+    """
+    query restricted to documents after the cursor in PAGE_SORT order.
+
+    Some collections mix datetime and epoch-float created_at (the payments
+    ledger does). A descending sort puts dates first, then numbers, then
+    missing/null. $lt only compares within one BSON type, so every type
+    that sorts after the cursor's is included explicitly.
+    """
+    created_at, last_id = decode_cursor(cursor)
+    if created_at is None:
+        # Documents without created_at sort last; only the _id tiebreak remains
+        after = {"created_at": None, "_id": {"$lt": last_id}}
+    else:
+        branches = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}}
+        ]
+        if isinstance(created_at, datetime):
+            branches.append({"created_at": {"$type": "number"}})
+        branches.append({"created_at": None})
+        after = {"$or": branches}
+    return {"$and": [query, after]} if query else after
+
+def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page in (created_at, _id) order plus the cursor for the next page.
+
+    With a cursor the page is an index range scan; without one the legacy
+    skip offset still works. One extra document is read to know if more exist.
+    """
+    if cursor:
+        query = keyset_filter(query, cursor)
+
+    find = collection.find(query, projection).sort(PAGE_SORT)
+    if not cursor and skip:
+        find = find.skip(skip)
+
+    docs = list(find.limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return docs, (encode_cursor(docs[-1]) if has_more and docs else None)
+
+def count_total(collection, query: Dict[str, Any], mode: str) -> Optional[int]:
+    """exact: full count, estimated: metadata count (capped when filtered), none: skip it"""
+    if mode == "none":
+        return None
+    if mode == "estimated":
+        if not query:
+            return collection.estimated_document_count()
+        return collection.count_documents(query, limit=ESTIMATE_CAP)
+    return collection.count_documents(query)
@@ -0,0 +1,71 @@
+# backend/utils/password_utils.py
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+# bcrypt releases the GIL, so a small thread pool hashes in parallel while the
+# event loop keeps serving SMS polls and balance checks
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 4))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 64))  # running + waiting
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0  # Only touched from the event loop
+
+async def _run(fn, *args):
+    """Run a bcrypt call on the password pool, shedding load once the queue is full"""
+    global _pending
+    if _pending >= PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts right now, please retry in a moment",
+            headers={"Retry-After": "2"}
+        )
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args))
+    finally:
+        _pending -= 1
+
+def _hash(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+async def hash_password(password: str) -> str:
+    """Hash password using bcrypt"""
+    try:
+        return await _run(_hash, password)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Hash password error: {e}")
+        raise HTTPException(status_code=500, detail="Password hashing failed")
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify password using bcrypt"""
+    if not plain_password or not hashed_password:
+        return False
+    try:
+        return await _run(_verify, plain_password, hashed_password)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Password verification error: {e}")
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with fewer rounds than BCRYPT_ROUNDS"""
+    try:
+        # $2b$<cost>$<salt+hash>
+        return int(hashed_password.split("$")[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
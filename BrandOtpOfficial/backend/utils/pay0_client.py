@@ -1,27 +1,81 @@
 # backend/utils/pay0_client.py
 import os
-import requests
-import uuid
+import asyncio
+import httpx
 import typing as t
 
+from backend.utils.ids import new_order_id
+
 BASE_URL = "https://pay0.shop/api"
 USER_TOKEN = os.getenv("PAY0_USER_TOKEN")  # Make sure this is set in .env
 
-def _post(endpoint: str, data: dict) -> dict:
-    """Helper function to make POST requests to Pay0 API"""
+MAX_RETRIES = int(os.getenv("PAY0_MAX_RETRIES", 2))
+_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+
+_client: t.Optional[httpx.AsyncClient] = None
+
+async def start_client() -> httpx.AsyncClient:
+    """Create the shared Pay0 client (called from the FastAPI startup hook)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(base_url=BASE_URL, timeout=_TIMEOUT, limits=_LIMITS)
+    return _client
+
+async def close_client() -> None:
+    """Close the shared Pay0 client (called from the FastAPI shutdown hook)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _body(resp: httpx.Response) -> dict:
+    if not resp.content:
+        return {"status": False, "message": "Empty response"}
     try:
-        resp = requests.post(
-            f"{BASE_URL}{endpoint}",
-            data=data,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-            timeout=10
-        )
-        return resp.json() if resp.content else {"status": False, "message": "Empty response"}
-    except Exception as e:
-        return {"status": False, "message": str(e)}
-
-def create_order(mobile: str, amount: float, redirect: str,
-                 remark1: str = "", remark2: str = "") -> dict:
+        return resp.json()
+    except ValueError:
+        return {"status": False, "message": "Invalid JSON response"}
+
+async def send_form(endpoint: str, data: dict, idempotent: bool = True) -> t.Tuple[t.Optional[int], dict]:
+    """
+    POST a form to the Pay0 API through the shared client; returns
+    (HTTP status, parsed body), or (None, error dict flagged network_error)
+    when Pay0 could not be reached.
+    Requests that never reached Pay0 (connect errors) are always retried;
+    timeouts and 5xx responses only for idempotent calls, so an order is
+    never created twice.
+    """
+    client = _client if _client is not None and not _client.is_closed else await start_client()
+    last_error = "Pay0 request failed"
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            resp = await client.post(endpoint, data=data)
+            if resp.status_code >= 500 and idempotent and attempt < MAX_RETRIES:
+                last_error = f"Pay0 HTTP {resp.status_code}"
+            else:
+                return resp.status_code, _body(resp)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            last_error = str(e) or type(e).__name__
+        except httpx.TransportError as e:
+            last_error = str(e) or type(e).__name__
+            if not idempotent:
+                break
+
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    return None, {"status": False, "message": last_error, "network_error": True}
+
+async def post_form(endpoint: str, data: dict, idempotent: bool = True) -> dict:
+    """Body of a Pay0 form POST whatever its HTTP status (see send_form to check it)"""
+    _, body = await send_form(endpoint, data, idempotent)
+    return body
+
+async def create_order(mobile: str, amount: float, redirect: str,
+                       remark1: str = "", remark2: str = "",
+                       order_id: t.Optional[str] = None) -> dict:
     """
     Create Pay0 order with 5 parameters:
     - mobile: Customer mobile number
@@ -29,20 +83,21 @@ def create_order(mobile: str, amount: float, redirect: str,
     - redirect: Redirect URL after payment
     - remark1: Optional remark (e.g., user_id)
     - remark2: Optional remark (e.g., payment type)
+    - order_id: Our order ID (generated if not given)
     """
     payload = {
         "customer_mobile": mobile,
         "customer_name": "BrandOtp User",
         "user_token": USER_TOKEN,
         "amount": f"{amount:.2f}",
-        "order_id": f"ORD_{uuid.uuid4().hex[:12]}",
+        "order_id": order_id or new_order_id("ORD"),
         "redirect_url": redirect,
         "remark1": remark1,
         "remark2": remark2
     }
-    return _post("/create-order", payload)
+    return await post_form("/create-order", payload, idempotent=False)
 
-def check_status(order_id: str) -> dict:
+async def check_status(order_id: str, user_token: t.Optional[str] = None) -> dict:
     """Check Pay0 order status"""
-    return _post("/check-order-status",
-                 {"user_token": USER_TOKEN, "order_id": order_id})
+    return await post_form("/check-order-status",
+                       {"user_token": user_token or USER_TOKEN, "order_id": order_id})
@@ -1,8 +1,9 @@
-import requests
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+from backend.utils import pay0_client
+
 class Pay0SDK:
     """Pay0 Payment Gateway SDK for BrandOtp"""
     
@@ -13,7 +14,7 @@ class Pay0SDK:
         if not self.api_key:
             raise ValueError("PAY0_API_KEY not found in environment variables")
     
-    def create_order(
+    async def create_order(
         self, 
         customer_mobile: str, 
         amount: float, 
@@ -36,42 +37,39 @@ class Pay0SDK:
             "remark2": remark2
         }
         
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        
-        try:
-            print(f"📤 Pay0 Create Order Request:")
-            print(f"   Endpoint: {endpoint}")
-            print(f"   Order ID: {order_id}")
-            print(f"   Amount: ₹{amount}")
-            print(f"   Mobile: {customer_mobile}")
-            
-            response = requests.post(endpoint, data=payload, headers=headers, timeout=30)
-            
-            print(f"📥 Pay0 Response Status: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Pay0 Order Created: {result}")
-                return {
-                    "success": True,
-                    "data": result
-                }
-            else:
-                print(f"❌ Pay0 API Error: {response.status_code} - {response.text}")
-                return {
-                    "success": False, 
-                    "message": f"Pay0 API Error: {response.status_code}",
-                    "error": response.text
-                }
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Pay0 Request Exception: {e}")
+        print(f"📤 Pay0 Create Order Request:")
+        print(f"   Endpoint: {endpoint}")
+        print(f"   Order ID: {order_id}")
+        print(f"   Amount: ₹{amount}")
+        print(f"   Mobile: {customer_mobile}")
+        
+        # Not idempotent - only retried when the request never reached Pay0
+        status_code, result = await pay0_client.send_form(endpoint, payload, idempotent=False)
+        
+        if status_code is None:
+            print(f"❌ Pay0 Request Exception: {result.get('message')}")
             return {
                 "success": False, 
-                "message": f"Network error: {str(e)}"
+                "message": f"Network error: {result.get('message')}"
             }
+        
+        print(f"📥 Pay0 Response Status: {status_code}")
+        
+        if status_code != 200:
+            print(f"❌ Pay0 API Error: {status_code} - {result}")
+            return {
+                "success": False, 
+                "message": f"Pay0 API Error: {status_code}",
+                "error": result
+            }
+        
+        print(f"✅ Pay0 Order Created: {result}")
+        return {
+            "success": True,
+            "data": result
+        }
     
-    def check_order_status(self, order_id: str) -> Dict[str, Any]:
+    async def check_order_status(self, order_id: str) -> Dict[str, Any]:
         """Check payment status with Pay0"""
         
         endpoint = self.base_url + "check-order-status"
@@ -81,30 +79,28 @@ class Pay0SDK:
             "order_id": order_id
         }
         
-        try:
-            print(f"📤 Pay0 Status Check: {order_id}")
-            
-            response = requests.post(endpoint, data=payload, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"📊 Pay0 Status: {result}")
-                return {
-                    "success": True,
-                    "data": result
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Status check failed: {response.status_code}"
-                }
-                
-        except Exception as e:
-            print(f"❌ Status check error: {e}")
+        print(f"📤 Pay0 Status Check: {order_id}")
+        
+        status_code, result = await pay0_client.send_form(endpoint, payload)
+        
+        if status_code is None:
+            print(f"❌ Status check error: {result.get('message')}")
             return {
                 "success": False,
-                "message": str(e)
+                "message": result.get("message")
             }
+        
+        if status_code != 200:
+            return {
+                "success": False,
+                "message": f"Status check failed: {status_code}"
+            }
+        
+        print(f"📊 Pay0 Status: {result}")
+        return {
+            "success": True,
+            "data": result
+        }
 
 # Initialize global SDK instance
 pay0_sdk = Pay0SDK()
@@ -0,0 +1,96 @@
+# backend/utils/price_refresher.py
+import asyncio
+import os
+import random
+import time
+from contextlib import suppress
+from typing import Any, Dict, List, Optional
+
+from backend.utils import smsman_client
+
+def _parse_countries(raw: str) -> List[int]:
+    countries = []
+    for part in raw.split(","):
+        try:
+            country_id = int(part.strip())
+        except ValueError:
+            continue
+        if country_id not in countries:
+            countries.append(country_id)
+    return countries
+
+# Hot countries are refreshed in order, so keep India (91) first
+HOT_COUNTRIES = _parse_countries(os.getenv("SMSMAN_HOT_COUNTRIES", "91,7"))
+REFRESH_INTERVAL = float(os.getenv("SMSMAN_PRICE_REFRESH_INTERVAL", 240))
+REFRESH_JITTER = float(os.getenv("SMSMAN_PRICE_REFRESH_JITTER", 30))
+
+_task: Optional[asyncio.Task] = None
+_last_results: Dict[int, Dict[str, Any]] = {}  # {country_id: last refresh outcome}
+
+async def refresh_hot_countries() -> None:
+    """Refresh the application list and every hot country's price sheet once"""
+    await smsman_client.warm_applications()
+
+    for country_id in HOT_COUNTRIES:
+        started = time.time()
+        try:
+            fetched, services = await smsman_client.refresh_country_pricing(country_id)
+            _last_results[country_id] = {
+                "ok": fetched,
+                "services": services,
+                "refreshed_at": started,
+                "duration": round(time.time() - started, 3)
+            }
+            if not fetched:
+                _last_results[country_id]["error"] = (
+                    "Fetch failed, serving the previous price sheet" if services else "Fetch failed, no price sheet"
+                )
+                print(f"⚠️ Price refresh failed for country {country_id}, {services} services still served from cache")
+        except Exception as e:
+            print(f"❌ Price refresh failed for country {country_id}: {e}")
+            _last_results[country_id] = {"ok": False, "error": str(e), "refreshed_at": started}
+
+        # Spread upstream calls out instead of bursting every country at once
+        await asyncio.sleep(random.uniform(0.5, 2.0))
+
+async def _run() -> None:
+    print(f"🔄 Price refresher started for countries {HOT_COUNTRIES}")
+    while True:
+        await refresh_hot_countries()
+        delay = REFRESH_INTERVAL + random.uniform(-REFRESH_JITTER, REFRESH_JITTER)
+        await asyncio.sleep(max(delay, 5.0))
+
+def start() -> None:
+    """Start the background refresher (called from the FastAPI startup hook)"""
+    global _task
+    if not smsman_client.SMSMAN_API_KEY or not HOT_COUNTRIES:
+        print("⚠️ Price refresher disabled (no API key or hot countries)")
+        return
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run())
+
+async def stop() -> None:
+    """Stop the background refresher (called from the FastAPI shutdown hook)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _task
+        _task = None
+
+def refresh_status() -> Dict[str, Any]:
+    """Price-sheet age and last refresh outcome for every hot country"""
+    countries = {}
+    for country_id in HOT_COUNTRIES:
+        age = smsman_client.pricing_age(country_id)
+        countries[str(country_id)] = {
+            "age_seconds": round(age, 1) if age is not None else None,
+            **_last_results.get(country_id, {})
+        }
+
+    return {
+        "running": _task is not None and not _task.done(),
+        "interval": REFRESH_INTERVAL,
+        "jitter": REFRESH_JITTER,
+        "countries": countries
+    }
@@ -0,0 +1,163 @@
+# backend/utils/price_sheet.py
+"""
+SMSMan price sheets parsed once into a compact, array-backed index.
+
+/get-prices comes back in one of three shapes:
+
+    [{"application_id": 1, "cost": "15", "count": 40}, ...]     list of rows
+    {"1": {"cost": "15", "count": 40}, ...}                      dict by service
+    {"0": {"1": {"cost": "15", "count": 40}, ...}, ...}          dict nested one level
+
+The field names vary between rows (application_id/app_id/id/service_id,
+cost/price/amount, count/quantity/available). Aliases are probed in that
+priority order on every row, so a row carrying several of them always
+resolves to the same one whatever the rows before it looked like.
+
+Rows are appended one at a time into parallel arrays (service id, cost,
+count) with a dict mapping service id -> row, so a lookup is O(1) and the
+sheet holds three machine arrays rather than one dict per service. A
+PriceEntry is only built when a row is actually read.
+"""
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+ID_FIELDS = ("application_id", "app_id", "id", "service_id")
+COST_FIELDS = ("cost", "price", "amount")
+COUNT_FIELDS = ("count", "quantity", "available")
+
+class PriceEntry:
+    __slots__ = ("service_id", "original", "user_price", "count")
+
+    def __init__(self, service_id: int, original: float, user_price: float, count: int):
+        self.service_id = service_id
+        self.original = original
+        self.user_price = user_price
+        self.count = count
+
+def _read(item: Dict[str, Any], names: Sequence[str], cast) -> Any:
+    """The first alias, in priority order, whose value casts cleanly"""
+    for name in names:
+        if name in item:
+            try:
+                return cast(item[name])
+            except (ValueError, TypeError):
+                continue
+    return None
+
+class PriceSheet:
+    """Immutable once parsed; falsy when it priced nothing (so caches keep the old sheet)"""
+    __slots__ = ("margin", "_ids", "_costs", "_counts", "_index", "_joined")
+
+    def __init__(self, margin: float):
+        self.margin = margin
+        self._ids = array("q")
+        self._costs = array("d")
+        self._counts = array("q")
+        self._index: Dict[int, int] = {}
+        # (applications dict, country_id, services list) from the last join
+        self._joined = None
+
+    def _add(self, service_id: int, cost: float, count: int) -> None:
+        row = self._index.get(service_id)
+        if row is not None:  # Later rows win, as with the old dict build
+            self._costs[row] = cost
+            self._counts[row] = count
+            return
+        self._index[service_id] = len(self._ids)
+        self._ids.append(service_id)
+        self._costs.append(cost)
+        self._counts.append(count)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, service_id: int) -> bool:
+        return service_id in self._index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def get(self, service_id: int) -> Optional[PriceEntry]:
+        row = self._index.get(service_id)
+        if row is None:
+            return None
+        cost = self._costs[row]
+        return PriceEntry(service_id, cost, cost * self.margin, self._counts[row])
+
+    def services(self, applications: Dict[int, str], country_id: int) -> List[Dict[str, Any]]:
+        """
+        The priced services joined against the application list, sorted by name.
+        Built once per (sheet, application list); later calls return the same list.
+        """
+        joined = self._joined
+        if joined is not None and joined[0] is applications and joined[1] == country_id:
+            return joined[2]
+
+        services = []
+        index, costs, counts, margin = self._index, self._costs, self._counts, self.margin
+        for service_id, name in applications.items():
+            row = index.get(service_id)
+            if row is None:
+                continue
+            original_price = costs[row]
+            user_price = original_price * margin
+            services.append({
+                "id": service_id,
+                "name": name,
+                "display_price": f"₹{user_price:.2f}",
+                "pricing": {
+                    "user_price": round(user_price, 2),
+                    "original_price": round(original_price, 2),
+                    "profit_amount": round(user_price - original_price, 2),
+                    "margin_percent": round((margin - 1) * 100),
+                    "live_api": True,
+                    "availability": counts[row],
+                    "country_id": country_id
+                }
+            })
+        services.sort(key=lambda service: service["name"].lower())
+
+        self._joined = (applications, country_id, services)
+        return services
+
+def _to_int(value: Any) -> int:
+    return int(str(value).strip())
+
+def _to_float(value: Any) -> float:
+    return float(str(value).strip())
+
+def parse(payload: Any, margin: float) -> PriceSheet:
+    """Normalize a /get-prices payload into a PriceSheet; rows without id or cost are skipped"""
+    sheet = PriceSheet(margin)
+
+    def add(service_id: Optional[int], item: Dict[str, Any]) -> None:
+        if not service_id or service_id <= 0:
+            return
+        cost = _read(item, COST_FIELDS, _to_float)
+        if not cost or cost <= 0:
+            return
+        sheet._add(service_id, cost, _read(item, COUNT_FIELDS, _to_int) or 0)
+
+    if isinstance(payload, list):
+        for item in payload:
+            if isinstance(item, dict):
+                add(_read(item, ID_FIELDS, _to_int), item)
+
+    elif isinstance(payload, dict):
+        for key, value in payload.items():
+            if not isinstance(value, dict):
+                continue
+            if "cost" in value or "price" in value:
+                add(_key_id(key), value)
+                continue
+            for nested_key, nested in value.items():
+                if isinstance(nested, dict):
+                    add(_key_id(nested_key), nested)
+
+    return sheet
+
+def _key_id(key: Any) -> Optional[int]:
+    try:
+        return _to_int(key)
+    except (ValueError, TypeError):
+        return None
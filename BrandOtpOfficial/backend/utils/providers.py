@@ -0,0 +1,302 @@
+# backend/utils/providers.py
+"""
+Number providers behind one interface, and a router that buys from whichever
+is currently the best deal.
+
+Every provider exposes price / buy / get_sms / cancel with the same shapes:
+
+    price(service, country)   -> cost in ₹, or None when it has no price (stock is the buy's call)
+    buy(service, country)     -> {"request_id", "number"} or {"error"}
+    get_sms(request_id)       -> {"status": "received", "sms_code"} / {"status": "waiting"} / {"status": "error"}
+    cancel(request_id)        -> bool
+
+An Offer names one provider's product: (provider, service, country) in that
+provider's own codes. The router keeps rolling stats per offer (buy success,
+buy latency, SMS delivery rate, time-to-SMS) and ranks the offers for a
+purchase by expected cost:
+
+    score = cost / (buy success * SMS rate) * (1 + time-to-SMS / TTS_REFERENCE)
+
+Offers without history start from an optimistic prior, so a new provider gets
+traffic and earns its own numbers.
+
+SMSMan is always offered. An OTP.bz equivalent is offered for the SMSMan
+(application, country) pairs listed in OTPBZ_OFFERS, e.g.
+OTPBZ_OFFERS='{"1:91": ["wa", 22]}'.
+"""
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from backend.utils import otpbz_client, smsman_client
+
+STATS_WINDOW = int(os.getenv("PROVIDER_STATS_WINDOW", 200))  # Outcomes kept per offer
+TTS_REFERENCE = float(os.getenv("PROVIDER_TTS_REFERENCE", 120))  # Seconds of waiting that double a score
+DEFAULT_TTS = 60.0
+PRICE_TTL = float(os.getenv("PROVIDER_PRICE_TTL", 60))
+OTPBZ_PRICE_RATE = float(os.getenv("OTPBZ_PRICE_RATE", 1.0))  # OTP.bz balance currency -> ₹
+
+class Offer(NamedTuple):
+    provider: str
+    service: Any
+    country: Any
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.service}:{self.country}"
+
+# ===== PROVIDERS =====
+
+class SmsProvider(ABC):
+    name = ""
+
+    @abstractmethod
+    async def price(self, service: Any, country: Any) -> Optional[float]:
+        ...
+
+    @abstractmethod
+    async def buy(self, service: Any, country: Any) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def get_sms(self, request_id: int) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def cancel(self, request_id: int) -> bool:
+        ...
+
+class SmsManProvider(SmsProvider):
+    """service = SMSMan application_id, country = SMSMan country_id"""
+    name = "smsman"
+
+    async def price(self, service: int, country: int) -> Optional[float]:
+        # The cached sheet's count can be minutes old, and SMSMan often omits or
+        # zeroes it - a listed price is enough, the buy itself decides on stock
+        price_info = await smsman_client.get_service_price(service, country)
+        if "error" in price_info:
+            return None
+        return price_info["original_price"]
+
+    async def buy(self, service: int, country: int) -> Dict[str, Any]:
+        result = await smsman_client.buy_number(service, country)
+        if "number" not in result or "request_id" not in result:
+            return {"error": result.get("error", "Invalid response from SMSMan")}
+        return {"request_id": result["request_id"], "number": result["number"]}
+
+    async def get_sms(self, request_id: int) -> Dict[str, Any]:
+        return await smsman_client.get_sms(str(request_id))
+
+    async def cancel(self, request_id: int) -> bool:
+        return await smsman_client.cancel_number(str(request_id))
+
+class OtpBzProvider(SmsProvider):
+    """service = OTP.bz service code, country = OTP.bz server"""
+    name = "otpbz"
+
+    # OTP.bz order ids are shifted into their own range so they can never
+    # collide with SMSMan request_ids in smsman_purchases
+    ID_OFFSET = 10 ** 12
+
+    async def price(self, service: str, country: int) -> Optional[float]:
+        cost = await otpbz_client.price(service, country)
+        return round(cost * OTPBZ_PRICE_RATE, 2) if cost is not None else None
+
+    async def buy(self, service: str, country: int) -> Dict[str, Any]:
+        try:
+            result = await otpbz_client.buy(service, country)
+        except Exception as e:
+            return {"error": str(e)}
+        return {"request_id": self.ID_OFFSET + result["id"], "number": result["number"]}
+
+    async def get_sms(self, request_id: int) -> Dict[str, Any]:
+        try:
+            code = await otpbz_client.sms(int(request_id) - self.ID_OFFSET)
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        if code:
+            return {"status": "received", "sms_code": code}
+        return {"status": "waiting"}
+
+    async def cancel(self, request_id: int) -> bool:
+        try:
+            await otpbz_client.cancel(int(request_id) - self.ID_OFFSET)
+            return True
+        except Exception as e:
+            print(f"⚠️ OTP.bz cancel failed for {request_id}: {e}")
+            return False
+
+PROVIDERS: Dict[str, SmsProvider] = {p.name: p for p in (SmsManProvider(), OtpBzProvider())}
+
+def get_provider(name: Optional[str]) -> SmsProvider:
+    """Purchases stored before routing existed have no provider field - they are SMSMan"""
+    return PROVIDERS.get(name or "smsman", PROVIDERS["smsman"])
+
+def _load_otpbz_offers() -> Dict[Tuple[int, int], Tuple[str, int]]:
+    raw = os.getenv("OTPBZ_OFFERS", "")
+    if not raw:
+        return {}
+    try:
+        offers = {}
+        for pair, (service, server) in json.loads(raw).items():
+            app_id, country_id = pair.split(":")
+            offers[(int(app_id), int(country_id))] = (str(service), int(server))
+        return offers
+    except (ValueError, TypeError) as e:
+        print(f"⚠️ Ignoring invalid OTPBZ_OFFERS: {e}")
+        return {}
+
+OTPBZ_OFFERS = _load_otpbz_offers()
+
+# ===== ROLLING STATS =====
+
+class _OfferStats:
+    __slots__ = ("buys", "buy_latency", "deliveries", "time_to_sms")
+
+    def __init__(self):
+        self.buys: Deque[bool] = deque(maxlen=STATS_WINDOW)
+        self.buy_latency: Deque[float] = deque(maxlen=STATS_WINDOW)
+        self.deliveries: Deque[bool] = deque(maxlen=STATS_WINDOW)
+        self.time_to_sms: Deque[float] = deque(maxlen=STATS_WINDOW)
+
+    @staticmethod
+    def _rate(outcomes: Deque[bool]) -> float:
+        # Laplace-smoothed with an optimistic prior so unseen offers get tried
+        return (sum(outcomes) + 4) / (len(outcomes) + 5)
+
+    def buy_rate(self) -> float:
+        return self._rate(self.buys)
+
+    def delivery_rate(self) -> float:
+        return self._rate(self.deliveries)
+
+    def median_tts(self) -> float:
+        if not self.time_to_sms:
+            return DEFAULT_TTS
+        timings = sorted(self.time_to_sms)
+        return timings[len(timings) // 2]
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.buy_latency)
+        return {
+            "buys": len(self.buys),
+            "buy_success_rate": round(sum(self.buys) / len(self.buys), 3) if self.buys else None,
+            "buy_latency_p50": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "deliveries": len(self.deliveries),
+            "sms_rate": round(sum(self.deliveries) / len(self.deliveries), 3) if self.deliveries else None,
+            "time_to_sms_p50": round(self.median_tts(), 1) if self.time_to_sms else None
+        }
+
+# ===== ROUTER =====
+
+class ProviderRouter:
+    def __init__(self):
+        self._stats: Dict[str, _OfferStats] = {}
+        self._prices: Dict[str, Tuple[float, Optional[float]]] = {}  # key -> (fetched_at, cost)
+        self._chosen: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _offer_stats(self, offer: Offer) -> _OfferStats:
+        stats = self._stats.get(offer.key)
+        if stats is None:
+            stats = self._stats[offer.key] = _OfferStats()
+        return stats
+
+    def offers_for(self, application_id: int, country_id: int) -> List[Offer]:
+        """Every provider's product for an SMSMan (application, country) pair"""
+        offers = [Offer("smsman", application_id, country_id)]
+        otpbz = OTPBZ_OFFERS.get((application_id, country_id))
+        if otpbz:
+            offers.append(Offer("otpbz", *otpbz))
+        return offers
+
+    async def _price(self, offer: Offer) -> Optional[float]:
+        cached = self._prices.get(offer.key)
+        if cached and time.time() - cached[0] < PRICE_TTL:
+            return cached[1]
+        try:
+            cost = await PROVIDERS[offer.provider].price(offer.service, offer.country)
+        except Exception as e:
+            print(f"⚠️ Price lookup failed for {offer.key}: {e}")
+            cost = None
+        self._prices[offer.key] = (time.time(), cost)
+        return cost
+
+    def score(self, offer: Offer, cost: float) -> float:
+        stats = self._offer_stats(offer)
+        success = stats.buy_rate() * stats.delivery_rate()
+        return cost / max(success, 0.01) * (1 + stats.median_tts() / TTS_REFERENCE)
+
+    async def rank(self, offers: List[Offer], max_cost: float) -> List[Tuple[Offer, float]]:
+        """Offers in stock at or under max_cost, best score first, with their cost"""
+        costs = await asyncio.gather(*(self._price(offer) for offer in offers))
+        priced = [
+            (offer, cost) for offer, cost in zip(offers, costs)
+            if cost is not None and cost <= max_cost
+        ]
+        return sorted(priced, key=lambda item: self.score(*item))
+
+    async def buy(self, offers: List[Offer], max_cost: float) -> Dict[str, Any]:
+        """Buy from the best-ranked offer, failing over down the ranking"""
+        ranked = await self.rank(offers, max_cost)
+        if not ranked:
+            return {"error": "No provider has this number in stock"}
+
+        errors = []
+        for offer, cost in ranked:
+            started = time.monotonic()
+            try:
+                result = await PROVIDERS[offer.provider].buy(offer.service, offer.country)
+            except Exception as e:
+                result = {"error": str(e)}
+            self.record_buy(offer, "error" not in result, time.monotonic() - started)
+
+            if "error" not in result:
+                self._chosen[offer.provider] = self._chosen.get(offer.provider, 0) + 1
+                return {**result, "offer": offer, "cost": cost}
+            errors.append(f"{offer.provider}: {result['error']}")
+            self._prices.pop(offer.key, None)  # Likely out of stock - re-price next time
+
+        return {"error": "; ".join(errors)}
+
+    def cancel_later(self, provider: Optional[str], request_id: int) -> None:
+        """Release a cancelled number upstream without holding up the response"""
+        task = asyncio.create_task(get_provider(provider).cancel(request_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def record_buy(self, offer: Offer, ok: bool, latency: float) -> None:
+        stats = self._offer_stats(offer)
+        stats.buys.append(ok)
+        stats.buy_latency.append(latency)
+
+    def record_delivery(self, offer: Offer, received: bool, seconds: Optional[float] = None) -> None:
+        stats = self._offer_stats(offer)
+        stats.deliveries.append(received)
+        if received and seconds is not None:
+            stats.time_to_sms.append(seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Rolling stats per provider and per offer"""
+        providers: Dict[str, Dict[str, Any]] = {}
+        for name in PROVIDERS:
+            merged = _OfferStats()
+            for key, stats in self._stats.items():
+                if key.startswith(f"{name}:"):
+                    merged.buys.extend(stats.buys)
+                    merged.buy_latency.extend(stats.buy_latency)
+                    merged.deliveries.extend(stats.deliveries)
+                    merged.time_to_sms.extend(stats.time_to_sms)
+            providers[name] = {**merged.snapshot(), "chosen": self._chosen.get(name, 0)}
+
+        offers = {}
+        for key, stats in self._stats.items():
+            cached = self._prices.get(key)
+            offers[key] = {**stats.snapshot(), "cost": cached[1] if cached else None}
+        return {"providers": providers, "offers": offers}
+
+provider_router = ProviderRouter()
@@ -0,0 +1,319 @@
+# backend/utils/purchase_saga.py
+import asyncio
+import os
+import time
+from contextlib import suppress
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+
+from backend.db import (
+    users_collection,
+    payments_collection,
+    smsman_purchases_collection,
+    purchase_sagas_collection,
+    run_db,
+    run_in_transaction
+)
+from backend.utils.smsman_client import get_service_price
+from backend.utils.providers import provider_router
+from backend.utils.wallet_utils import credit_user_wallet, debit_user_wallet
+from backend.utils import job_queue
+
+# Saga states:
+#   started -> reserved -> bought -> committed
+#   started / reserved / bought -> compensating -> compensated
+#   started -> failed (reservation refused, nothing to undo)
+OPEN_STATES = ["started", "reserved", "bought", "compensating"]
+
+# A saga untouched for this long belongs to a dead request and is resolved by recovery
+SAGA_STALE_AFTER = float(os.getenv("PURCHASE_SAGA_STALE_AFTER", 120))
+RECOVERY_INTERVAL = float(os.getenv("PURCHASE_SAGA_RECOVERY_INTERVAL", 300))
+
+_task: Optional[asyncio.Task] = None
+
+class _SagaMoved(Exception):
+    """The saga left the state a commit expected (recovery resolved it first)"""
+
+def _failure(status_code: int, error: str) -> Dict[str, Any]:
+    return {"success": False, "status_code": status_code, "error": error}
+
+def _set_state(saga_id: ObjectId, from_state: str, to_state: str, **fields: Any) -> bool:
+    """Move a saga between states; False if another worker moved it first"""
+    result = purchase_sagas_collection.update_one(
+        {"_id": saga_id, "state": from_state},
+        {"$set": {"state": to_state, "updated_at": time.time(), **fields}}
+    )
+    return result.modified_count == 1
+
+def _purchase_record(saga: Dict[str, Any]) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "user_id": saga["user_id"],
+        "request_id": saga["request_id"],
+        "country_id": saga["country_id"],
+        "application_id": saga["application_id"],
+        "provider": saga.get("provider", "smsman"),
+        "provider_service": saga.get("provider_service", saga["application_id"]),
+        "provider_country": saga.get("provider_country", saga["country_id"]),
+        "number": saga["number"],
+        "country_code": saga["country_code"],
+        "original_price": saga["original_price"],
+        "charged_price": saga["amount"],
+        "profit_earned": saga["profit"],
+        "status": "waiting_sms",
+        "sms_code": None,
+        "can_cancel": True,
+        "saga_id": saga["_id"],
+        "created_at": now,
+        "updated_at": now
+    }
+
+# ----- steps (blocking, run on the DB pool) -----
+
+def _reserve(saga: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the saga, then take the funds with the guarded wallet debit"""
+    purchase_sagas_collection.insert_one(saga)
+
+    debit = debit_user_wallet(
+        saga["user_id"],
+        saga["amount"],
+        f"Number Purchase - service {saga['application_id']}, country {saga['country_id']}",
+        ledger=payments_collection,
+        created_at=time.time(),
+        saga_id=saga["_id"]
+    )
+    if debit["success"]:
+        _set_state(saga["_id"], "started", "reserved")
+    else:
+        _set_state(saga["_id"], "started", "failed", error=debit["error"])
+    return debit
+
+def _commit(saga: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Persist the bought number, then write purchase, ledger and saga in one
+    transaction. None when recovery already compensated the saga (the buy ran
+    past SAGA_STALE_AFTER): the user has been refunded, so nothing is written.
+    """
+    moved = _set_state(
+        saga["_id"], "reserved", "bought",
+        request_id=saga["request_id"],
+        number=saga["number"],
+        provider=saga["provider"],
+        provider_service=saga["provider_service"],
+        provider_country=saga["provider_country"],
+        original_price=saga["original_price"],
+        profit=saga["profit"]
+    )
+    if not moved:
+        return None
+    return _finish_commit(saga)
+
+def _finish_commit(saga: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Write purchase, ledger and saga for a bought saga; None if another worker already did"""
+    record = _purchase_record(saga)
+
+    def write(session):
+        # Gate first: without transaction support nothing is written once this misses
+        moved = purchase_sagas_collection.update_one(
+            {"_id": saga["_id"], "state": "bought"},
+            {"$set": {"state": "committed", "updated_at": time.time()}},
+            session=session
+        )
+        if moved.modified_count != 1:
+            raise _SagaMoved()
+        # Upsert on request_id so recovery can replay a half-finished commit
+        smsman_purchases_collection.update_one(
+            {"request_id": record["request_id"]},
+            {"$setOnInsert": record},
+            upsert=True,
+            session=session
+        )
+        payments_collection.update_one(
+            {"saga_id": saga["_id"], "type": "debit"},
+            {"$set": {"reason": f"Number Purchase - {saga['number']}", "request_id": saga["request_id"]}},
+            session=session
+        )
+        job_queue.enqueue(
+            "purchase_recorded",
+            {
+                "request_id": saga["request_id"],
+                "user_id": saga["user_id"],
+                "amount": saga["amount"],
+                "profit": saga["profit"]
+            },
+            dedupe_key=f"purchase:{saga['request_id']}",
+            session=session
+        )
+
+    try:
+        run_in_transaction(write)
+    except _SagaMoved:
+        return None
+    return record
+
+def _compensate(saga: Dict[str, Any], from_state: str, error: str) -> Optional[Dict[str, Any]]:
+    """Refund the reservation exactly once; the ledger is the source of truth"""
+    if from_state != "compensating" and not _set_state(saga["_id"], from_state, "compensating", error=error):
+        return None  # Already resolved elsewhere
+
+    refund = None
+    debited = payments_collection.find_one({"saga_id": saga["_id"], "type": "debit"}, {"_id": 1})
+    refunded = payments_collection.find_one({"saga_id": saga["_id"], "type": "credit"}, {"_id": 1})
+    if debited and not refunded:
+        refund = credit_user_wallet(
+            saga["user_id"],
+            saga["amount"],
+            "Refund - Number purchase failed",
+            ledger=payments_collection,
+            created_at=time.time(),
+            saga_id=saga["_id"]
+        )
+        if refund.get("duplicate"):
+            refund = None  # Another worker's recovery refunded it first (unique saga_id + type)
+        elif not refund["success"]:
+            print(f"❌ Saga {saga['_id']} refund failed: {refund['error']}")
+            return refund
+
+    _set_state(saga["_id"], "compensating", "compensated")
+    return refund
+
+# ----- pipeline -----
+
+async def run_purchase(user_id: str, app_id: int, country_id: int, country_code: str) -> Dict[str, Any]:
+    """
+    Buy a number as a saga: reserve funds, buy from the best-ranked provider,
+    then commit or compensate. Every step is recorded in purchase_sagas so a crash at any
+    point is resolved by recover_stale_sagas instead of drifting the wallet.
+    """
+    # Price lookup and user check are independent - run them together
+    user, price_info = await asyncio.gather(
+        run_db(users_collection.find_one, {"_id": ObjectId(user_id)}, {"balance": 1}),
+        get_service_price(app_id, country_id)
+    )
+
+    if not user:
+        return _failure(404, "User not found")
+    if "error" in price_info:
+        return _failure(400, f"Pricing error: {price_info['error']}")
+
+    user_price = price_info["user_price"]
+    user_balance = float(user.get("balance", 0))
+    print(f"💰 Price: Original=₹{price_info['original_price']}, User=₹{user_price}, Balance=₹{user_balance}")
+
+    # Fast fail - the guarded debit below is the real check
+    if user_balance < user_price:
+        shortage = user_price - user_balance
+        return _failure(
+            400,
+            f"Insufficient balance. Required: ₹{user_price}, Available: ₹{user_balance}, Shortage: ₹{shortage:.2f}"
+        )
+
+    now = time.time()
+    saga = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "application_id": app_id,
+        "country_id": country_id,
+        "country_code": country_code,
+        "amount": user_price,
+        "original_price": price_info["original_price"],
+        "profit": price_info["profit_amount"],
+        "state": "started",
+        "created_at": now,
+        "updated_at": now
+    }
+
+    # STEP 1: Reserve funds
+    debit = await run_db(_reserve, saga)
+    if not debit["success"]:
+        return _failure(400 if debit["error"] == "Insufficient balance" else 404, debit["error"])
+
+    # STEP 2: Buy upstream - whichever provider is currently fastest and cheapest,
+    # never above what the user is paying
+    try:
+        buy_result = await provider_router.buy(provider_router.offers_for(app_id, country_id), max_cost=user_price)
+    except Exception as e:
+        buy_result = {"error": str(e)}
+
+    if "error" in buy_result:
+        await run_db(_compensate, saga, "reserved", buy_result["error"])
+        return _failure(500, f"Purchase failed: {buy_result['error']}")
+
+    # STEP 3: Commit
+    offer = buy_result["offer"]
+    saga.update({
+        "request_id": buy_result["request_id"],
+        "number": buy_result["number"],
+        "provider": offer.provider,
+        "provider_service": offer.service,
+        "provider_country": offer.country,
+        "original_price": buy_result["cost"],
+        "profit": round(user_price - buy_result["cost"], 2)
+    })
+    record = await run_db(_commit, saga)
+    if record is None:
+        # Recovery gave up on this saga and refunded the user - release the number
+        provider_router.cancel_later(offer.provider, saga["request_id"])
+        return _failure(504, "Purchase took too long and was refunded, please try again")
+
+    return {
+        "success": True,
+        "purchase": record,
+        "charged_amount": user_price,
+        "original_cost": saga["original_price"],
+        "profit": saga["profit"],
+        "new_balance": debit["new_balance"]
+    }
+
+# ----- recovery -----
+
+def _resolve(saga: Dict[str, Any]) -> str:
+    state = saga["state"]
+    if state == "bought":
+        # The number exists upstream - finish the purchase
+        _finish_commit(saga)
+        return "committed"
+
+    # started / reserved: the provider outcome is unknown, so give the money back
+    _compensate(saga, state, "Recovered: request died before the purchase finished")
+    return "compensated"
+
+def recover_stale_sagas() -> Dict[str, int]:
+    """Resolve sagas left half-finished by a crashed or restarted worker"""
+    cutoff = time.time() - SAGA_STALE_AFTER
+    results = {"committed": 0, "compensated": 0, "errors": 0}
+
+    for saga in purchase_sagas_collection.find({"state": {"$in": OPEN_STATES}, "updated_at": {"$lt": cutoff}}):
+        try:
+            results[_resolve(saga)] += 1
+        except Exception as e:
+            print(f"❌ Saga {saga['_id']} recovery failed: {e}")
+            results["errors"] += 1
+
+    return results
+
+async def _run() -> None:
+    while True:
+        try:
+            results = await run_db(recover_stale_sagas)
+            if any(results.values()):
+                print(f"🔁 Purchase saga recovery: {results}")
+        except Exception as e:
+            print(f"❌ Purchase saga recovery error: {e}")
+        await asyncio.sleep(RECOVERY_INTERVAL)
+
+def start() -> None:
+    """Start the recovery job (called from the FastAPI startup hook)"""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run())
+
+async def stop() -> None:
+    """Stop the recovery job (called from the FastAPI shutdown hook)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _task
+        _task = None
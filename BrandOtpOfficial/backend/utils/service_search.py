@@ -0,0 +1,198 @@
+# backend/utils/service_search.py
+"""
+In-memory search over the cached service catalog.
+
+Built once per catalog version (the services list identity handed out by
+get_services_by_country, as in catalog_render), per country:
+
+    prefix trie   every word of every name -> entries having a word with that prefix
+    trigrams      every 3-gram of the compacted name -> entries containing it
+
+A query matches when each of its words prefixes some word of the name
+("tele" -> Telegram, "wh app" -> WhatsApp Business). Names that contain the
+query elsewhere or nearly match it ("gram" -> Telegram, "whatsap" -> WhatsApp)
+come from the trigram table, ranked by how many of the query's trigrams they
+share, after the prefix hits.
+
+Prices, availability and each row's rank in name order sit in parallel
+arrays, so filtering and sorting never touch the service dicts; only the
+requested page is sliced out.
+Popularity is purchases per application in the last POPULARITY_WINDOW,
+aggregated from smsman_purchases and cached for POPULARITY_TTL.
+"""
+import os
+import re
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.db import smsman_purchases_collection, run_db
+
+SORTS = ("relevance", "name", "price", "-price", "popularity")
+NGRAM = 3
+NGRAM_MIN_SIMILARITY = float(os.getenv("SEARCH_NGRAM_MIN_SIMILARITY", 0.6))
+POPULARITY_WINDOW = float(os.getenv("SEARCH_POPULARITY_WINDOW", 30 * 24 * 3600))
+POPULARITY_TTL = float(os.getenv("SEARCH_POPULARITY_TTL", 600))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+def _grams(compact: str) -> Iterable[str]:
+    return {compact[i:i + NGRAM] for i in range(len(compact) - NGRAM + 1)}
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: List[int] = []
+
+class SearchIndex:
+    __slots__ = ("source", "names", "prices", "counts", "ids", "by_name", "name_rank", "_trie", "_grams")
+
+    def __init__(self, services: List[Dict[str, Any]]):
+        self.source = services
+        self.names: List[str] = []
+        self.prices = array("d")
+        self.counts = array("q")
+        self.ids = array("q")
+        self._trie = _TrieNode()
+        self._grams: Dict[str, List[int]] = {}
+
+        for row, service in enumerate(services):
+            pricing = service.get("pricing", {})
+            name = str(service.get("name", "")).lower()
+            self.names.append(name)
+            self.prices.append(pricing.get("user_price", 0.0))
+            self.counts.append(int(pricing.get("availability", 0) or 0))
+            self.ids.append(int(service.get("id", 0)))
+
+            words = _words(name)
+            for word in words:
+                self._insert(word, row)
+            for gram in _grams("".join(words)):
+                self._grams.setdefault(gram, []).append(row)
+
+        self.by_name = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self.name_rank = array("q", bytes(8 * len(self.names)))
+        for rank, row in enumerate(self.by_name):
+            self.name_rank[row] = rank
+
+    def _insert(self, word: str, row: int) -> None:
+        node = self._trie
+        for char in word:
+            node = node.children.setdefault(char, _TrieNode())
+            if not node.ids or node.ids[-1] != row:  # Rows are inserted in order
+                node.ids.append(row)
+
+    def _prefixed(self, prefix: str) -> List[int]:
+        node = self._trie
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.ids
+
+    def match(self, query: str) -> List[int]:
+        """Matching rows, best first: prefix hits (exact, then name-prefix, then word-prefix), then trigram hits"""
+        words = _words(query)
+        if not words:
+            return list(self.by_name)
+
+        hits = set(self._prefixed(words[0]))
+        for word in words[1:]:
+            if not hits:
+                break
+            hits.intersection_update(self._prefixed(word))
+
+        phrase = " ".join(words)
+        names = self.names
+        ranked = sorted(hits, key=lambda row: (names[row] != phrase, not names[row].startswith(phrase), row))
+
+        compact = "".join(words)
+        if len(compact) >= NGRAM:
+            grams = _grams(compact)
+            shared: Dict[int, int] = {}
+            for gram in grams:
+                for row in self._grams.get(gram, ()):
+                    shared[row] = shared.get(row, 0) + 1
+            needed = NGRAM_MIN_SIMILARITY * len(grams)
+            fuzzy = [row for row, count in shared.items() if count >= needed and row not in hits]
+            fuzzy.sort(key=lambda row: (-shared[row], row))
+            ranked.extend(fuzzy)
+
+        return ranked
+
+_indexes: Dict[int, SearchIndex] = {}
+_popularity: Dict[int, Tuple[float, Dict[int, int]]] = {}  # country_id -> (fetched_at, {app_id: purchases})
+
+def index_for(country_id: int, services: List[Dict[str, Any]]) -> SearchIndex:
+    """The search index for this catalog version, rebuilt when the services list changes"""
+    index = _indexes.get(country_id)
+    if index is None or index.source is not services:
+        index = _indexes[country_id] = SearchIndex(services)
+    return index
+
+def _count_purchases(country_id: int) -> Dict[int, int]:
+    rows = smsman_purchases_collection.aggregate([
+        {"$match": {"country_id": country_id, "created_at": {"$gte": time.time() - POPULARITY_WINDOW}}},
+        {"$group": {"_id": "$application_id", "purchases": {"$sum": 1}}}
+    ])
+    return {row["_id"]: row["purchases"] for row in rows if row["_id"] is not None}
+
+async def popularity(country_id: int) -> Dict[int, int]:
+    cached = _popularity.get(country_id)
+    if cached and time.time() - cached[0] < POPULARITY_TTL:
+        return cached[1]
+    try:
+        counts = await run_db(_count_purchases, country_id)
+    except Exception as e:
+        print(f"⚠️ Popularity lookup failed for country {country_id}: {e}")
+        return cached[1] if cached else {}
+    _popularity[country_id] = (time.time(), counts)
+    return counts
+
+async def search(
+    country_id: int,
+    services: List[Dict[str, Any]],
+    query: str = "",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_count: int = 0,
+    sort: str = "relevance",
+    page: int = 1,
+    limit: int = 20
+) -> Dict[str, Any]:
+    """One page of matching services plus the total match count"""
+    index = index_for(country_id, services)
+    rows = index.match(query)
+
+    prices, counts = index.prices, index.counts
+    if min_price is not None or max_price is not None or min_count > 0:
+        low = min_price if min_price is not None else float("-inf")
+        high = max_price if max_price is not None else float("inf")
+        rows = [row for row in rows if low <= prices[row] <= high and counts[row] >= min_count]
+
+    if sort == "name" and _words(query):
+        rows.sort(key=index.name_rank.__getitem__)
+    elif sort == "price":
+        rows.sort(key=prices.__getitem__)
+    elif sort == "-price":
+        rows.sort(key=prices.__getitem__, reverse=True)
+    elif sort == "popularity":
+        purchases = await popularity(country_id)
+        ids = index.ids
+        rows.sort(key=lambda row: -purchases.get(ids[row], 0))
+
+    start = (page - 1) * limit
+    return {
+        "success": True,
+        "query": query,
+        "country_id": country_id,
+        "total": len(rows),
+        "page": page,
+        "limit": limit,
+        "services": [services[row] for row in rows[start:start + limit]]
+    }
@@ -0,0 +1,72 @@
+# backend/utils/singleflight.py
+"""
+Request coalescing for idempotent upstream reads.
+
+Concurrent calls with the same key share ONE in-flight call: the first
+caller starts it, later callers await the same task, and everyone gets the
+same result (or the same exception). Once the call finishes the key is free
+again, so nothing is cached; use CatalogCache for that.
+
+    @single_flight("smsman.get_sms")
+    async def get_sms(request_id: str): ...
+
+The shared task is shielded, so a caller that gives up (client disconnect,
+timeout) does not cancel the call for the others. Results are shared
+objects: callers must treat them as read-only.
+
+Only use it for reads. Purchases and cancels must stay one call per request.
+"""
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._stats = {"calls": 0, "upstream_calls": 0, "deduplicated": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() for key, or join the call already in flight for it"""
+        self._stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats["upstream_calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            self._stats["deduplicated"] += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved even if every caller gave up
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "inflight": len(self._inflight), **self._stats}
+
+FLIGHTS: Dict[str, SingleFlight] = {}
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Coalesce concurrent calls to an async function. The key defaults to the
+    call's arguments; pass key= when the same call can be spelled differently
+    (positional vs keyword, default values).
+    """
+    flight = FLIGHTS.setdefault(name, SingleFlight(name))
+
+    def decorate(fn: Callable[..., Awaitable[Any]]):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return await flight.do(call_key, lambda: fn(*args, **kwargs))
+        wrapper.flight = flight
+        return wrapper
+    return decorate
+
+def stats() -> List[Dict[str, Any]]:
+    """Calls, upstream calls and deduplicated joins per coalesced function"""
+    return [flight.stats() for flight in FLIGHTS.values()]
@@ -0,0 +1,451 @@
+# backend/utils/sms_poller.py
+import asyncio
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from contextlib import suppress
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+from backend.db import smsman_purchases_collection, run_db
+from backend.utils.providers import Offer, get_provider, provider_router
+from backend.utils.user_counters import record_numbers_completed, record_number_expired
+
+TICK_INTERVAL = float(os.getenv("SMS_POLL_TICK", 1))
+SYNC_INTERVAL = float(os.getenv("SMS_POLL_SYNC_INTERVAL", 30))
+POLL_CONCURRENCY = int(os.getenv("SMS_POLL_CONCURRENCY", 10))
+MAX_POLLS_PER_SECOND = float(os.getenv("SMS_MAX_POLLS_PER_SECOND", 5))
+SMS_WAIT_TIMEOUT = float(os.getenv("SMS_WAIT_TIMEOUT", 1200))  # SMSMan numbers live ~20 minutes
+SETTLED_TTL = 600  # Keep finished purchases in memory so late reads stay cheap
+POLL_LEASE = float(os.getenv("SMS_POLL_LEASE", SYNC_INTERVAL * 3))  # Renewed every sync
+
+# Owner tag for this process's polling leases on waiting purchases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# (purchase age limit in seconds, poll interval) - fast right after purchase, then back off
+POLL_SCHEDULE = ((60, 3.0), (180, 5.0), (600, 10.0), (float("inf"), 20.0))
+
+def _poll_interval(age: float) -> float:
+    for age_limit, interval in POLL_SCHEDULE:
+        if age < age_limit:
+            return interval
+    return POLL_SCHEDULE[-1][1]
+
+def _received_update(sms_code: str, now: float) -> Dict[str, Any]:
+    return {
+        "$set": {
+            "sms_code": sms_code,
+            "status": "completed",
+            "can_cancel": False,  # Cannot cancel after SMS
+            "completed_at": now,
+            "updated_at": now
+        }
+    }
+
+_STATUS_FROM_DB = {"waiting_sms": "waiting", "completed": "completed", "cancelled": "cancelled", "expired": "expired"}
+
+class _Tracked:
+    __slots__ = (
+        "request_id", "user_id", "number", "country_code", "created_at", "offer",
+        "status", "sms_code", "next_poll_at", "polls", "settled_at", "subscribers", "leased"
+    )
+
+    def __init__(self, purchase: Dict[str, Any]):
+        self.request_id = purchase["request_id"]
+        self.user_id = purchase.get("user_id")
+        self.number = purchase.get("number", "")
+        self.country_code = purchase.get("country_code", "")
+        self.created_at = float(purchase.get("created_at") or time.time())
+        # Purchases from before provider routing are SMSMan ones
+        self.offer = Offer(
+            purchase.get("provider") or "smsman",
+            purchase.get("provider_service", purchase.get("application_id")),
+            purchase.get("provider_country", purchase.get("country_id"))
+        )
+        self.status = _STATUS_FROM_DB.get(purchase.get("status"), "waiting")
+        self.sms_code = purchase.get("sms_code")
+        if self.sms_code:
+            self.status = "completed"
+        self.next_poll_at = 0.0
+        self.polls = 0
+        self.settled_at: Optional[float] = None if self.status == "waiting" else time.time()
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.leased = False  # Only the worker holding a purchase's lease polls it
+
+def _settled_event(purchase: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Final event for a purchase record that is no longer waiting, else None"""
+    status = _STATUS_FROM_DB.get(purchase.get("status"))
+    if not status or status == "waiting":
+        return None
+    return {
+        "status": status,
+        "sms_received": bool(purchase.get("sms_code")),
+        "sms_code": purchase.get("sms_code")
+    }
+
+class SmsHub:
+    """
+    Single scheduler that owns every number purchase waiting for an SMS,
+    whichever provider it was bought from.
+
+    Purchases are tracked from the buy endpoint and adopted from Mongo on a
+    periodic sync (other workers, restarts). With several workers, each
+    waiting purchase is polled by one of them: the worker holding its lease
+    (poll_owner / poll_lease_until on the record), taken at purchase or by
+    the first sync that finds it free and renewed on every sync. Other
+    workers only track it for reads and settle it from Mongo. Each leased
+    purchase is polled on an adaptive
+    schedule - fast right after purchase, then backing off - with a global
+    polls-per-second cap. Received codes are written back in one bulk write
+    per tick and pushed to stream subscribers; get_sms_endpoint only reads the
+    in-memory state.
+    """
+
+    def __init__(self):
+        self._tracked: Dict[int, _Tracked] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._tokens = MAX_POLLS_PER_SECOND
+        self._last_sync = 0.0
+        self._started_at = time.time()
+        self._counters = {"upstream_polls": 0, "client_reads": 0, "codes_received": 0, "expired": 0}
+        self._time_to_code = deque(maxlen=500)
+
+    # ----- tracking -----
+
+    def track(self, purchase: Dict[str, Any]) -> _Tracked:
+        """Start (or keep) tracking a purchase record"""
+        entry = self._tracked.get(purchase["request_id"])
+        if entry is None:
+            entry = self._tracked[purchase["request_id"]] = _Tracked(purchase)
+        return entry
+
+    async def adopt(self, purchase: Dict[str, Any]) -> _Tracked:
+        """Track a purchase made on this worker and take its polling lease right away"""
+        entry = self.track(purchase)
+        if entry.status == "waiting" and not entry.leased:
+            try:
+                _, won = await run_db(self._sync_leases, [], [entry.request_id], time.time())
+                entry.leased = entry.request_id in won
+            except Exception as e:
+                # The next sync claims it if it is still free
+                print(f"⚠️ SMS poller lease failed for {entry.request_id}: {e}")
+        return entry
+
+    def get_state(self, request_id: int) -> Optional[_Tracked]:
+        return self._tracked.get(request_id)
+
+    def record_read(self) -> None:
+        """Count a client status read that no longer costs an upstream call"""
+        self._counters["client_reads"] += 1
+
+    # ----- streaming -----
+
+    def subscribe(self, entry: _Tracked) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        entry.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, request_id: int, queue: asyncio.Queue) -> None:
+        entry = self._tracked.get(request_id)
+        if entry is not None:
+            entry.subscribers.discard(queue)
+
+    def publish(self, request_id: int, event: Dict[str, Any], final: bool = False) -> None:
+        """Fan an event out to every subscriber; a final event settles the purchase"""
+        entry = self._tracked.get(request_id)
+        if entry is None:
+            return
+
+        if final:
+            entry.status = event.get("status", entry.status)
+            entry.sms_code = event.get("sms_code", entry.sms_code)
+            entry.settled_at = time.time()
+
+        event = {**event, "request_id": request_id, "final": final}
+        for queue in list(entry.subscribers):
+            queue.put_nowait(event)
+        if final:
+            entry.subscribers.clear()
+
+    # ----- lifecycle -----
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._started_at = time.time()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        last_tick = time.monotonic()
+        while True:
+            try:
+                now = time.monotonic()
+                self._tokens = min(self._tokens + (now - last_tick) * MAX_POLLS_PER_SECOND, MAX_POLLS_PER_SECOND * 2)
+                last_tick = now
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ SMS poller tick error: {e}")
+            await asyncio.sleep(TICK_INTERVAL)
+
+    async def _tick(self) -> None:
+        now = time.time()
+
+        if now - self._last_sync >= SYNC_INTERVAL:
+            self._last_sync = now
+            await self._sync_from_db(now)
+
+        due: List[_Tracked] = []
+        expired: List[_Tracked] = []
+        for entry in list(self._tracked.values()):
+            if entry.status != "waiting":
+                if entry.settled_at and now - entry.settled_at > SETTLED_TTL:
+                    self._tracked.pop(entry.request_id, None)
+                continue
+            if now - entry.created_at >= SMS_WAIT_TIMEOUT:
+                expired.append(entry)
+                continue
+            if entry.leased and entry.next_poll_at <= now:
+                due.append(entry)
+
+        if expired:
+            await self._settle_expired(expired, now)
+
+        if not due:
+            return
+
+        # Global rate limit: oldest-due first, as many as the token bucket allows
+        due.sort(key=lambda e: e.next_poll_at)
+        budget = int(self._tokens)
+        due = due[:budget]
+        self._tokens -= len(due)
+
+        semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+
+        async def poll_one(entry: _Tracked):
+            async with semaphore:
+                return entry, await get_provider(entry.offer.provider).get_sms(entry.request_id)
+
+        results = await asyncio.gather(*(poll_one(entry) for entry in due), return_exceptions=True)
+
+        received = []
+        now = time.time()
+        for result in results:
+            if isinstance(result, BaseException):
+                continue
+            entry, sms_result = result
+            entry.polls += 1
+            self._counters["upstream_polls"] += 1
+            if sms_result.get("status") == "received" and sms_result.get("sms_code"):
+                received.append((entry, sms_result["sms_code"]))
+            else:
+                entry.next_poll_at = now + _poll_interval(now - entry.created_at)
+
+        if not received:
+            return
+
+        completed, others = await run_db(self._store_received, received, now)
+
+        for entry, code in received:
+            if entry.request_id not in completed:
+                continue
+            self._counters["codes_received"] += 1
+            self._time_to_code.append(now - entry.created_at)
+            provider_router.record_delivery(entry.offer, True, now - entry.created_at)
+            print(f"✅ SMS Received: Request {entry.request_id}, Code: {code}")
+            self.publish(entry.request_id, {
+                "status": "completed",
+                "sms_received": True,
+                "sms_code": code
+            }, final=True)
+
+        # Cancelled (or settled elsewhere) before the code arrived: report what the record says
+        for request_id, purchase in others.items():
+            event = _settled_event(purchase)
+            if event:
+                self.publish(request_id, event, final=True)
+
+    @staticmethod
+    def _store_received(received: List[tuple], now: float) -> Tuple[Set[int], Dict[int, Dict[str, Any]]]:
+        """
+        One bulk write for every code this tick, then the owners' counters.
+        Returns the request ids this write completed, and the current record
+        of each one it did not.
+        """
+        result = smsman_purchases_collection.bulk_write(
+            [
+                UpdateOne({"request_id": entry.request_id, "status": "waiting_sms"}, _received_update(code, now))
+                for entry, code in received
+            ],
+            ordered=False
+        )
+        others: Dict[int, Dict[str, Any]] = {}
+        if result.modified_count == len(received):
+            completed = {entry.request_id for entry, _ in received}
+            user_ids = [entry.user_id for entry, _ in received]
+        else:
+            # Some were cancelled meanwhile - count only the ones this write completed
+            completed, user_ids = set(), []
+            for doc in smsman_purchases_collection.find(
+                {"request_id": {"$in": [entry.request_id for entry, _ in received]}},
+                {"request_id": 1, "user_id": 1, "status": 1, "sms_code": 1, "completed_at": 1}
+            ):
+                if doc.get("status") == "completed" and doc.get("completed_at") == now:
+                    completed.add(doc["request_id"])
+                    user_ids.append(doc["user_id"])
+                else:
+                    others[doc["request_id"]] = doc
+        record_numbers_completed(user_ids)
+        return completed, others
+
+    @staticmethod
+    def _sync_leases(held: List[int], free: List[int], now: float) -> Tuple[Set[int], Set[int]]:
+        """
+        Renew the leases this worker holds and try to take the free ones.
+        Returns (held ids still ours, free ids won).
+        """
+        kept: Set[int] = set()
+        if held:
+            owned = {"request_id": {"$in": held}, "status": "waiting_sms", "poll_owner": WORKER_ID}
+            smsman_purchases_collection.update_many(owned, {"$set": {"poll_lease_until": now + POLL_LEASE}})
+            kept = {doc["request_id"] for doc in smsman_purchases_collection.find(owned, {"request_id": 1})}
+
+        won: Set[int] = set()
+        for request_id in free:
+            result = smsman_purchases_collection.update_one(
+                {
+                    "request_id": request_id,
+                    "status": "waiting_sms",
+                    "$or": [{"poll_owner": WORKER_ID}, {"poll_lease_until": {"$not": {"$gte": now}}}]
+                },
+                {"$set": {"poll_owner": WORKER_ID, "poll_lease_until": now + POLL_LEASE}}
+            )
+            if result.matched_count:
+                won.add(request_id)
+        return kept, won
+
+    async def _settle_expired(self, expired: List[_Tracked], now: float) -> None:
+        """Publish "expired" only for the numbers this write expired; the rest settle as their record says"""
+        stored, others = await run_db(self._store_expired, expired, now)
+        for entry in expired:
+            if entry.request_id in stored:
+                self._counters["expired"] += 1
+                provider_router.record_delivery(entry.offer, False)
+                self.publish(entry.request_id, {"status": "expired", "message": "Number expired without SMS"}, final=True)
+            elif entry.request_id in others:
+                event = _settled_event(others[entry.request_id])
+                if event:
+                    self.publish(entry.request_id, event, final=True)
+            else:
+                # No record to settle against; stop tracking it as waiting
+                self.publish(entry.request_id, {"status": "expired", "message": "Number expired without SMS"}, final=True)
+
+    @staticmethod
+    def _store_expired(expired: List[_Tracked], now: float) -> Tuple[Set[int], Dict[int, Dict[str, Any]]]:
+        """
+        Mark still-waiting purchases expired. Returns the request ids this
+        write expired, and the current record of each one it did not
+        (completed or cancelled meanwhile, or expired by another worker).
+        """
+        stored: Set[int] = set()
+        for entry in expired:
+            result = smsman_purchases_collection.update_one(
+                {"request_id": entry.request_id, "status": "waiting_sms"},
+                {"$set": {"status": "expired", "updated_at": now}}
+            )
+            if result.modified_count:
+                stored.add(entry.request_id)
+                record_number_expired(entry.user_id)
+
+        others: Dict[int, Dict[str, Any]] = {}
+        rest = [entry.request_id for entry in expired if entry.request_id not in stored]
+        if rest:
+            for doc in smsman_purchases_collection.find(
+                {"request_id": {"$in": rest}}, {"request_id": 1, "status": 1, "sms_code": 1}
+            ):
+                others[doc["request_id"]] = doc
+        return stored, others
+
+    async def _sync_from_db(self, now: float) -> None:
+        """Adopt waiting purchases from Mongo, renew or take polling leases, settle ones finished elsewhere"""
+        waiting_ids = set()
+        free = []
+        for purchase in await run_db(lambda: list(smsman_purchases_collection.find(
+            {"status": "waiting_sms", "created_at": {"$gte": now - SMS_WAIT_TIMEOUT}},
+            {
+                "request_id": 1, "user_id": 1, "number": 1, "country_code": 1, "created_at": 1, "status": 1,
+                "provider": 1, "provider_service": 1, "provider_country": 1, "application_id": 1, "country_id": 1,
+                "poll_lease_until": 1
+            }
+        ))):
+            waiting_ids.add(purchase["request_id"])
+            entry = self.track(purchase)
+            if not entry.leased and (purchase.get("poll_lease_until") or 0) < now:
+                free.append(entry.request_id)
+
+        held = [entry.request_id for entry in self._tracked.values() if entry.leased and entry.status == "waiting"]
+        kept, won = await run_db(self._sync_leases, held, free, now)
+        for request_id in held:
+            entry = self._tracked.get(request_id)
+            if entry is not None:
+                entry.leased = request_id in kept
+        for request_id in won:
+            entry = self._tracked.get(request_id)
+            if entry is not None:
+                entry.leased = True
+        if won:
+            print(f"🔁 SMS poller adopted {len(won)} waiting purchases")
+
+        # Cancelled or completed by another worker since the last sync
+        gone = [
+            entry.request_id for entry in self._tracked.values()
+            if entry.status == "waiting" and entry.request_id not in waiting_ids and now - entry.created_at > SYNC_INTERVAL
+        ]
+        if not gone:
+            return
+        for purchase in await run_db(lambda: list(smsman_purchases_collection.find(
+            {"request_id": {"$in": gone}}, {"request_id": 1, "status": 1, "sms_code": 1}
+        ))):
+            event = _settled_event(purchase)
+            if event:
+                self.publish(purchase["request_id"], event, final=True)
+
+    # ----- metrics -----
+
+    def metrics(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self._started_at, 1.0)
+        timings = sorted(self._time_to_code)
+
+        def percentile(p: float) -> Optional[float]:
+            if not timings:
+                return None
+            return round(timings[min(int(len(timings) * p), len(timings) - 1)], 1)
+
+        return {
+            "tracked": len(self._tracked),
+            "waiting": sum(1 for e in self._tracked.values() if e.status == "waiting"),
+            "leased": sum(1 for e in self._tracked.values() if e.leased and e.status == "waiting"),
+            "subscribers": sum(len(e.subscribers) for e in self._tracked.values()),
+            **self._counters,
+            "upstream_polls_per_second": round(self._counters["upstream_polls"] / elapsed, 3),
+            # Each client read used to trigger its own upstream get-sms call
+            "polls_saved_per_second": round(self._counters["client_reads"] / elapsed, 3),
+            "time_to_code": {
+                "samples": len(timings),
+                "avg": round(sum(timings) / len(timings), 1) if timings else None,
+                "p50": percentile(0.5),
+                "p90": percentile(0.9)
+            }
+        }
+
+sms_hub = SmsHub()
@@ -3,7 +3,13 @@ import httpx
 import os
 import json
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+from backend.utils.cache import CatalogCache
+from backend.utils import price_sheet
+from backend.utils.price_sheet import PriceSheet
+from backend.utils.upstream_guard import guard
+from backend.utils.singleflight import single_flight
 
 # Load API key from environment
 SMSMAN_API_KEY = os.getenv("SMSMAN_API_KEY")
@@ -15,51 +21,183 @@ PROFIT_MARGIN = 1.70  # 70% markup
 print(f"🔑 SMSMan API Key: {SMSMAN_API_KEY[:10] if SMSMAN_API_KEY else 'NOT FOUND'}...")
 print(f"🌐 Using SMSMan API v2.0: {SMSMAN_BASE_URL}")
 
+# ===== SHARED HTTP CLIENT =====
+# One pooled client for every SMSMan call so keep-alive connections (and the
+# TLS session) are reused across requests instead of re-handshaking per call.
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("SMSMAN_MAX_CONNECTIONS", 50)),
+    max_keepalive_connections=int(os.getenv("SMSMAN_MAX_KEEPALIVE", 20)),
+    keepalive_expiry=60.0
+)
+
+# Per-operation timeouts (catalog downloads are large, polling must be snappy)
+_TIMEOUTS = {
+    "countries": httpx.Timeout(30.0, connect=5.0),
+    "applications": httpx.Timeout(60.0, connect=5.0),
+    "prices": httpx.Timeout(60.0, connect=5.0),
+    "buy": httpx.Timeout(20.0, connect=5.0),
+    "sms": httpx.Timeout(10.0, connect=3.0),
+    "status": httpx.Timeout(10.0, connect=3.0),
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Rate limit + circuit breaker shared by every SMSMan call
+_guard = guard("smsman", rate=20, burst=40)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+async def start_client() -> httpx.AsyncClient:
+    """Create the shared SMSMan client (called from the FastAPI startup hook)"""
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = _http2_available()
+        _client = httpx.AsyncClient(
+            base_url=SMSMAN_BASE_URL,
+            http2=http2,
+            limits=_HTTP_LIMITS,
+            timeout=_TIMEOUTS["sms"]
+        )
+        print(f"✅ SMSMan HTTP client ready (http2={http2})")
+    return _client
+
+async def close_client() -> None:
+    """Close the shared SMSMan client (called from the FastAPI shutdown hook)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _get(path: str, operation: str, **params) -> httpx.Response:
+    """
+    GET an SMSMan endpoint through the shared client with the operation's timeout.
+    Raises UpstreamUnavailable without calling SMSMan while its circuit is open.
+    """
+    client = _client if _client is not None and not _client.is_closed else await start_client()
+    return await _guard.call(
+        lambda: client.get(
+            path,
+            params={"token": SMSMAN_API_KEY, **params},
+            timeout=_TIMEOUTS[operation]
+        ),
+        is_failure=lambda response: response.status_code >= 500 or response.status_code == 429
+    )
+
 # ===== CACHE SYSTEM =====
-_country_pricing_cache = {}  # {country_id: {service_id: pricing_data}}
+def _parse_ttl_overrides(raw: str) -> Dict[int, float]:
+    """Parse per-country TTLs like "91:120,7:300" into {91: 120.0, 7: 300.0}"""
+    overrides = {}
+    for part in raw.split(","):
+        if ":" not in part:
+            continue
+        country_id, ttl = part.split(":", 1)
+        try:
+            overrides[int(country_id.strip())] = float(ttl.strip())
+        except ValueError:
+            continue
+    return overrides
+
+_CATALOG_TTL = float(os.getenv("SMSMAN_CATALOG_TTL", 3600))
+_CATALOG_STALE_TTL = float(os.getenv("SMSMAN_CATALOG_STALE_TTL", 86400))
+
+_countries_cache = CatalogCache(
+    "smsman_countries", ttl=_CATALOG_TTL, stale_ttl=_CATALOG_STALE_TTL, max_entries=1
+)
+_applications_cache = CatalogCache(
+    "smsman_applications", ttl=_CATALOG_TTL, stale_ttl=_CATALOG_STALE_TTL, max_entries=1
+)
+# {country_id: PriceSheet}
+_country_pricing_cache = CatalogCache(
+    "smsman_prices",
+    ttl=float(os.getenv("SMSMAN_PRICE_TTL", 300)),
+    stale_ttl=float(os.getenv("SMSMAN_PRICE_STALE_TTL", 3600)),
+    max_entries=int(os.getenv("SMSMAN_PRICE_CACHE_SIZE", 64)),
+    ttl_overrides=_parse_ttl_overrides(os.getenv("SMSMAN_PRICE_TTL_OVERRIDES", ""))
+)
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Hit/miss counters for the SMSMan catalog caches"""
+    return [
+        _countries_cache.stats(),
+        _applications_cache.stats(),
+        _country_pricing_cache.stats()
+    ]
+
+async def refresh_country_pricing(country_id: int) -> Tuple[bool, int]:
+    """
+    Force-refresh one country's price sheet; returns (fetched, priced services).
+    fetched is False when the fetch failed and the cache kept the previous
+    sheet, whose size is what gets counted then.
+    """
+    previous = _country_pricing_cache.peek(country_id)
+    pricing = await _country_pricing_cache.refresh(
+        country_id, lambda: _fetch_country_pricing(country_id)
+    )
+    # A failed refresh hands back the cached sheet; a successful one is always a new PriceSheet
+    fetched = bool(pricing) and pricing is not previous
+    return fetched, len(pricing or {})
+
+async def warm_applications() -> None:
+    """Make sure the application list is cached (revalidates it when stale)"""
+    await _applications_cache.get("all", _fetch_applications)
+
+def pricing_age(country_id: int) -> Optional[float]:
+    """Seconds since the country's price sheet was last refreshed, None if never"""
+    return _country_pricing_cache.age(country_id)
+
+async def _get_country_pricing(country_id: int) -> PriceSheet:
+    return await _country_pricing_cache.get(
+        country_id, lambda: _fetch_country_pricing(country_id)
+    ) or PriceSheet(PROFIT_MARGIN)
 
 async def get_countries() -> List[Dict[str, Any]]:
-    """Fetch ALL countries from SMSMan API v2.0"""
+    """Fetch ALL countries from SMSMan API v2.0 (cached)"""
     
     if not SMSMAN_API_KEY:
         return []
     
+    return await _countries_cache.get("all", _fetch_countries) or []
+
+async def _fetch_countries() -> List[Dict[str, Any]]:
+    """Download the country list from SMSMan"""
+    
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                f"{SMSMAN_BASE_URL}/countries",
-                params={"token": SMSMAN_API_KEY}
-            )
+        response = await _get("/countries", "countries")
             
-            if response.status_code == 200:
-                data = response.json()
-                countries = []
+        if response.status_code == 200:
+            data = response.json()
+            countries = []
                 
-                if isinstance(data, dict):
-                    for country_id, country_info in data.items():
-                        try:
-                            clean_id = int(str(country_id).strip())
+            if isinstance(data, dict):
+                for country_id, country_info in data.items():
+                    try:
+                        clean_id = int(str(country_id).strip())
                             
-                            if isinstance(country_info, dict):
-                                clean_name = str(country_info.get('title', country_info.get('name', ''))).strip()
-                            elif isinstance(country_info, str):
-                                clean_name = str(country_info).strip()
-                            else:
-                                continue
+                        if isinstance(country_info, dict):
+                            clean_name = str(country_info.get('title', country_info.get('name', ''))).strip()
+                        elif isinstance(country_info, str):
+                            clean_name = str(country_info).strip()
+                        else:
+                            continue
                             
-                            if clean_name and len(clean_name) > 1:
-                                countries.append({
-                                    "id": clean_id,
-                                    "title": clean_name,
-                                    "code": generate_country_code(clean_name)
-                                })
+                        if clean_name and len(clean_name) > 1:
+                            countries.append({
+                                "id": clean_id,
+                                "title": clean_name,
+                                "code": generate_country_code(clean_name)
+                            })
                                 
-                        except Exception:
-                            continue
+                    except Exception:
+                        continue
                 
-                if countries:
-                    countries.sort(key=lambda x: x['title'])
-                    return countries
+            if countries:
+                countries.sort(key=lambda x: x['title'])
+                return countries
                         
     except Exception as e:
         print(f"❌ Countries error: {e}")
@@ -88,10 +226,71 @@ async def get_services() -> List[Dict[str, Any]]:
     
     return []
 
+async def _fetch_applications() -> Dict[int, str]:
+    """Download the SMSMan application list as {service_id: name}"""
+    
+    services_response = await _get("/applications", "applications")
+    
+    if services_response.status_code != 200:
+        print(f"❌ Services API failed: {services_response.status_code}")
+        return {}
+    
+    services_data = services_response.json()
+    print(f"📋 Got {len(services_data)} services")
+    
+    applications = {}
+    
+    if isinstance(services_data, dict):
+        for service_id, service_info in services_data.items():
+            try:
+                clean_id = int(str(service_id).strip())
+                
+                if isinstance(service_info, dict):
+                    clean_name = str(service_info.get('title', service_info.get('name', ''))).strip()
+                elif isinstance(service_info, str):
+                    clean_name = str(service_info).strip()
+                else:
+                    continue
+                
+                if clean_name and len(clean_name) > 1:
+                    applications[clean_id] = clean_name
+                    
+            except Exception:
+                continue
+    
+    return applications
+
+async def _fetch_country_pricing(country_id: int) -> PriceSheet:
+    """Download the SMSMan price sheet for one country and index it"""
+    
+    print(f"💰 Fetching LIVE pricing for country {country_id}...")
+    
+    pricing_response = await _get("/get-prices", "prices", country_id=country_id)
+    
+    if pricing_response.status_code != 200:
+        print(f"❌ Pricing API failed for country {country_id}: {pricing_response.status_code}")
+        return PriceSheet(PROFIT_MARGIN)
+    
+    try:
+        pricing_raw = pricing_response.json()
+    except json.JSONDecodeError as e:
+        print(f"❌ Country {country_id} pricing JSON error: {e}")
+        return PriceSheet(PROFIT_MARGIN)
+    
+    sheet = price_sheet.parse(pricing_raw, PROFIT_MARGIN)
+    
+    if sheet:
+        print(f"✅ Country {country_id}: Parsed pricing for {len(sheet)} services")
+    else:
+        print(f"⚠️ Country {country_id}: No services parsed from {type(pricing_raw).__name__} payload: {str(pricing_raw)[:200]}")
+    
+    return sheet
+
+@single_flight("smsman.get_services_by_country", key=lambda country_id: int(country_id))
 async def get_services_by_country(country_id: int) -> List[Dict[str, Any]]:
     """
     Fetch services with country-specific pricing
-    ✅ IMPROVED LIST/DICT PARSING WITH DEBUG LOGS
+    ✅ Application list and price sheets come from the catalog cache
     """
     
     if not SMSMAN_API_KEY:
@@ -99,241 +298,23 @@ async def get_services_by_country(country_id: int) -> List[Dict[str, Any]]:
         return []
     
     try:
-        print(f"📱 Fetching services for country {country_id}...")
+        applications, country_pricing = await asyncio.gather(
+            _applications_cache.get("all", _fetch_applications),
+            _get_country_pricing(country_id)
+        )
+        
+        # If no pricing, return empty
+        if not country_pricing:
+            print(f"❌ No pricing data for country {country_id}")
+            return []
+        
+        # Joined once per sheet/application list, reused until either refreshes
+        services = country_pricing.services(applications or {}, country_id)
+        
+        print(f"🎯 Country {country_id} RESULT: {len(services)} services with live pricing")
+        
+        return services
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            # Step 1: Get all services
-            services_response = await client.get(
-                f"{SMSMAN_BASE_URL}/applications",
-                params={"token": SMSMAN_API_KEY}
-            )
-            
-            if services_response.status_code != 200:
-                print(f"❌ Services API failed for country {country_id}")
-                return []
-            
-            services_data = services_response.json()
-            print(f"📋 Got {len(services_data)} services for country {country_id}")
-            
-            # Step 2: Get country-specific pricing
-            print(f"💰 Fetching LIVE pricing for country {country_id}...")
-            
-            pricing_response = await client.get(
-                f"{SMSMAN_BASE_URL}/get-prices",
-                params={
-                    "token": SMSMAN_API_KEY,
-                    "country_id": country_id
-                }
-            )
-            
-            print(f"💰 Country {country_id} pricing status: {pricing_response.status_code}")
-            
-            if pricing_response.status_code != 200:
-                print(f"❌ Pricing API failed for country {country_id}")
-                return []
-            
-            try:
-                pricing_raw = pricing_response.json()
-                print(f"📊 Country {country_id} pricing type: {type(pricing_raw)}")
-                
-                # ✅ DEBUG: Print sample to understand format
-                if isinstance(pricing_raw, list):
-                    if len(pricing_raw) > 0:
-                        print(f"📊 Sample LIST item [0]: {str(pricing_raw[0])[:200]}")
-                        if len(pricing_raw) > 1:
-                            print(f"📊 Sample LIST item [1]: {str(pricing_raw[1])[:200]}")
-                elif isinstance(pricing_raw, dict):
-                    keys = list(pricing_raw.keys())[:3]
-                    for key in keys:
-                        print(f"📊 Sample DICT key '{key}': {str(pricing_raw[key])[:200]}")
-                
-            except json.JSONDecodeError as e:
-                print(f"❌ Country {country_id} pricing JSON error: {e}")
-                return []
-            
-            # Step 3: Parse pricing - IMPROVED LOGIC
-            country_pricing = {}
-            
-            try:
-                # ✅ FORMAT 1: LIST (Most common)
-                if isinstance(pricing_raw, list):
-                    print(f"🔄 Processing LIST format for country {country_id}...")
-                    
-                    for idx, item in enumerate(pricing_raw):
-                        if not isinstance(item, dict):
-                            continue
-                        
-                        try:
-                            # Try different field name combinations
-                            service_id = None
-                            cost = None
-                            count = 0
-                            
-                            # Service ID variations
-                            for field in ['application_id', 'app_id', 'id', 'service_id']:
-                                if field in item:
-                                    try:
-                                        service_id = int(str(item[field]).strip())
-                                        break
-                                    except (ValueError, TypeError):
-                                        continue
-                            
-                            # Cost variations
-                            for field in ['cost', 'price', 'amount']:
-                                if field in item:
-                                    try:
-                                        cost = float(str(item[field]).strip())
-                                        break
-                                    except (ValueError, TypeError):
-                                        continue
-                            
-                            # Count variations
-                            for field in ['count', 'quantity', 'available']:
-                                if field in item:
-                                    try:
-                                        count = int(str(item[field]).strip())
-                                        break
-                                    except (ValueError, TypeError):
-                                        continue
-                            
-                            if service_id and service_id > 0 and cost and cost > 0:
-                                country_pricing[service_id] = {
-                                    'original': cost,
-                                    'user_price': cost * PROFIT_MARGIN,
-                                    'count': count
-                                }
-                                
-                                # Debug first 5 items
-                                if idx < 5:
-                                    print(f"✅ LIST[{idx}] - Service {service_id}: ₹{cost} → ₹{cost * PROFIT_MARGIN:.2f}")
-                                
-                        except Exception as e:
-                            if idx < 5:
-                                print(f"⚠️ Parse error LIST[{idx}]: {e}")
-                            continue
-                
-                # ✅ FORMAT 2: DICT (Nested)
-                elif isinstance(pricing_raw, dict):
-                    print(f"🔄 Processing DICT format for country {country_id}...")
-                    
-                    parsed_count = 0
-                    
-                    # Try multiple nesting levels
-                    for key1, value1 in pricing_raw.items():
-                        if not isinstance(value1, dict):
-                            continue
-                        
-                        # Level 1: Direct service IDs {"123": {"cost": "15"}}
-                        if 'cost' in value1 or 'price' in value1:
-                            try:
-                                service_id = int(str(key1).strip())
-                                cost = float(value1.get('cost', value1.get('price', 0)))
-                                
-                                if service_id > 0 and cost > 0:
-                                    country_pricing[service_id] = {
-                                        'original': cost,
-                                        'user_price': cost * PROFIT_MARGIN,
-                                        'count': int(value1.get('count', 0))
-                                    }
-                                    
-                                    if parsed_count < 5:
-                                        print(f"✅ DICT Level1 - Service {service_id}: ₹{cost} → ₹{cost * PROFIT_MARGIN:.2f}")
-                                    parsed_count += 1
-                            except (ValueError, TypeError):
-                                pass
-                        
-                        # Level 2: Nested service IDs {"0": {"123": {"cost": "15"}}}
-                        else:
-                            for key2, value2 in value1.items():
-                                if not isinstance(value2, dict):
-                                    continue
-                                
-                                try:
-                                    service_id = int(str(key2).strip())
-                                    cost = float(value2.get('cost', value2.get('price', 0)))
-                                    
-                                    if service_id > 0 and cost > 0:
-                                        country_pricing[service_id] = {
-                                            'original': cost,
-                                            'user_price': cost * PROFIT_MARGIN,
-                                            'count': int(value2.get('count', 0))
-                                        }
-                                        
-                                        if parsed_count < 5:
-                                            print(f"✅ DICT Level2 - Service {service_id}: ₹{cost} → ₹{cost * PROFIT_MARGIN:.2f}")
-                                        parsed_count += 1
-                                except (ValueError, TypeError):
-                                    continue
-                
-                print(f"✅ Country {country_id}: Parsed pricing for {len(country_pricing)} services")
-                
-                # ✅ CACHE THE PRICING
-                if country_pricing:
-                    _country_pricing_cache[country_id] = country_pricing
-                else:
-                    print(f"⚠️ No services parsed! Check debug logs above for format issues.")
-                
-            except Exception as e:
-                print(f"❌ Country {country_id} pricing parsing error: {e}")
-                import traceback
-                traceback.print_exc()
-                return []
-            
-            # If no pricing, return empty
-            if not country_pricing:
-                print(f"❌ No pricing data for country {country_id}")
-                return []
-            
-            # Step 4: Build services list
-            services = []
-            
-            if isinstance(services_data, dict):
-                for service_id, service_info in services_data.items():
-                    try:
-                        clean_id = int(str(service_id).strip())
-                        
-                        if isinstance(service_info, dict):
-                            clean_name = str(service_info.get('title', service_info.get('name', ''))).strip()
-                        elif isinstance(service_info, str):
-                            clean_name = str(service_info).strip()
-                        else:
-                            continue
-                        
-                        if clean_name and len(clean_name) > 1:
-                            # ONLY ADD IF PRICING EXISTS
-                            if clean_id in country_pricing:
-                                pricing_info = country_pricing[clean_id]
-                                user_price = pricing_info['user_price']
-                                original_price = pricing_info['original']
-                                
-                                services.append({
-                                    "id": clean_id,
-                                    "name": clean_name,
-                                    "display_price": f"₹{user_price:.2f}",
-                                    "pricing": {
-                                        "user_price": round(user_price, 2),
-                                        "original_price": round(original_price, 2),
-                                        "profit_amount": round(user_price - original_price, 2),
-                                        "margin_percent": 70,
-                                        "live_api": True,
-                                        "availability": pricing_info['count'],
-                                        "country_id": country_id
-                                    }
-                                })
-                                
-                    except Exception:
-                        continue
-                
-                services.sort(key=lambda x: x['name'].lower())
-                
-                print(f"🎯 Country {country_id} RESULT: {len(services)} services with live pricing")
-                
-                if services:
-                    samples = [(s['name'], s['display_price']) for s in services[:5]]
-                    print(f"🌟 Country {country_id} samples: {samples}")
-                    
-                return services
-                    
     except Exception as e:
         print(f"❌ Country {country_id} services error: {e}")
         import traceback
@@ -344,7 +325,7 @@ async def get_services_by_country(country_id: int) -> List[Dict[str, Any]]:
 async def get_service_price(application_id: int, country_id: int = 91) -> Dict[str, Any]:
     """
     Get LIVE price for specific service
-    ✅ FIX: Uses cached pricing from get_services_by_country()
+    ✅ Reads the cached price sheet; only a cold country triggers a fetch
     """
     
     try:
@@ -353,46 +334,23 @@ async def get_service_price(application_id: int, country_id: int = 91) -> Dict[s
         
         print(f"💰 Getting price: Service {application_id}, Country {country_id}")
         
-        # ✅ CHECK CACHE FIRST
-        if country_id in _country_pricing_cache:
-            country_pricing = _country_pricing_cache[country_id]
-            
-            if application_id in country_pricing:
-                pricing_info = country_pricing[application_id]
-                user_price = pricing_info['user_price']
-                original_price = pricing_info['original']
-                
-                print(f"✅ Using cached price: ₹{user_price:.2f}")
-                
-                return {
-                    "user_price": round(user_price, 2),
-                    "original_price": round(original_price, 2),
-                    "profit_amount": round(user_price - original_price, 2),
-                    "display_price": f"₹{user_price:.2f}",
-                    "live_api": True,
-                    "availability": pricing_info['count']
-                }
-        
-        # ✅ IF NOT IN CACHE, FETCH FRESH
-        print(f"⚠️ Not in cache, fetching fresh pricing for country {country_id}...")
+        country_pricing = await _get_country_pricing(country_id)
+        pricing_info = country_pricing.get(application_id)
         
-        services = await get_services_by_country(country_id)
+        if not pricing_info:
+            return {"error": "No live pricing available", "live_api": False}
         
-        # Find service in list
-        for service in services:
-            if service["id"] == application_id:
-                pricing_data = service.get("pricing", {})
-                
-                return {
-                    "user_price": pricing_data.get("user_price", 0),
-                    "original_price": pricing_data.get("original_price", 0),
-                    "profit_amount": pricing_data.get("profit_amount", 0),
-                    "display_price": service.get("display_price", "N/A"),
-                    "live_api": True,
-                    "availability": pricing_data.get("availability", 0)
-                }
+        user_price = pricing_info.user_price
+        original_price = pricing_info.original
         
-        return {"error": "No live pricing available", "live_api": False}
+        return {
+            "user_price": round(user_price, 2),
+            "original_price": round(original_price, 2),
+            "profit_amount": round(user_price - original_price, 2),
+            "display_price": f"₹{user_price:.2f}",
+            "live_api": True,
+            "availability": pricing_info.count
+        }
         
     except Exception as e:
         print(f"❌ Price error: {e}")
@@ -405,43 +363,40 @@ async def buy_number(application_id: int, country_id: int = 91) -> Dict[str, Any
         if not SMSMAN_API_KEY:
             return {"error": "No API key available", "status": "error"}
             
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(
-                f"{SMSMAN_BASE_URL}/get-number",
-                params={
-                    "token": SMSMAN_API_KEY,
-                    "application_id": application_id,
-                    "country_id": country_id
-                }
-            )
+        response = await _get(
+            "/get-number", "buy",
+            application_id=application_id,
+            country_id=country_id
+        )
             
-            if response.status_code == 200:
-                try:
-                    data = response.json()
+        if response.status_code == 200:
+            try:
+                data = response.json()
                     
-                    if isinstance(data, dict):
-                        if "number" in data and "request_id" in data:
-                            return {
-                                "number": data["number"],
-                                "request_id": data["request_id"],
-                                "status": "success",
-                                "live_purchase": True
-                            }
-                        elif "error_msg" in data:
-                            return {
-                                "error": data["error_msg"],
-                                "status": "api_error",
-                                "live_purchase": False
-                            }
+                if isinstance(data, dict):
+                    if "number" in data and "request_id" in data:
+                        return {
+                            "number": data["number"],
+                            "request_id": data["request_id"],
+                            "status": "success",
+                            "live_purchase": True
+                        }
+                    elif "error_msg" in data:
+                        return {
+                            "error": data["error_msg"],
+                            "status": "api_error",
+                            "live_purchase": False
+                        }
                             
-                except json.JSONDecodeError:
-                    pass
+            except json.JSONDecodeError:
+                pass
         
         return {"error": "Purchase failed", "status": "error"}
         
     except Exception as e:
         return {"error": str(e), "status": "error"}
 
+@single_flight("smsman.get_sms", key=lambda request_id: str(request_id))
 async def get_sms(request_id: str) -> Dict[str, Any]:
     """
     Get SMS for a request ID
@@ -452,47 +407,49 @@ async def get_sms(request_id: str) -> Dict[str, Any]:
         if not SMSMAN_API_KEY:
             return {"error": "No API key available", "status": "error"}
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(
-                f"{SMSMAN_BASE_URL}/get-sms",
-                params={
-                    "token": SMSMAN_API_KEY,
-                    "request_id": request_id
-                }
-            )
-            
-            print(f"📨 SMS API response: {response.status_code} - {response.text}")
+        response = await _get("/get-sms", "sms", request_id=request_id)
             
-            if response.status_code == 200:
-                try:
-                    data = response.json()
+        if response.status_code == 200:
+            try:
+                data = response.json()
                     
-                    if isinstance(data, dict):
-                        # ✅ SMS RECEIVED
-                        if "sms_code" in data and data["sms_code"]:
-                            return {
-                                "sms_code": data["sms_code"],
-                                "sms_text": f"Your code: {data['sms_code']}",
-                                "sender": "Service",
-                                "status": "received"
-                            }
-                        # ⏳ WAITING FOR SMS
-                        elif "error_code" in data and data["error_code"] == "wait_sms":
-                            return {
-                                "status": "waiting",
-                                "message": data.get("error_msg", "Waiting for SMS...")
-                            }
-                        else:
-                            return {"status": "waiting", "message": "No SMS yet"}
+                if isinstance(data, dict):
+                    # ✅ SMS RECEIVED
+                    if "sms_code" in data and data["sms_code"]:
+                        return {
+                            "sms_code": data["sms_code"],
+                            "sms_text": f"Your code: {data['sms_code']}",
+                            "sender": "Service",
+                            "status": "received"
+                        }
+                    # ⏳ WAITING FOR SMS
+                    elif "error_code" in data and data["error_code"] == "wait_sms":
+                        return {
+                            "status": "waiting",
+                            "message": data.get("error_msg", "Waiting for SMS...")
+                        }
+                    else:
+                        return {"status": "waiting", "message": "No SMS yet"}
                             
-                except json.JSONDecodeError:
-                    pass
+            except json.JSONDecodeError:
+                pass
         
         return {"status": "waiting", "message": "Waiting for SMS"}
         
     except Exception as e:
         return {"error": str(e), "status": "error"}
 
+async def cancel_number(request_id: str) -> bool:
+    """Reject a number so SMSMan releases it (API v2 set-status)"""
+    try:
+        if not SMSMAN_API_KEY:
+            return False
+        response = await _get("/set-status", "status", request_id=request_id, status="reject")
+        return response.status_code == 200 and "error" not in response.text.lower()
+    except Exception as e:
+        print(f"⚠️ SMSMan cancel failed for {request_id}: {e}")
+        return False
+
 def generate_country_code(country_name: str) -> str:
     """Generate country code from country name"""
     name = country_name.lower().strip()
@@ -0,0 +1,206 @@
+# backend/utils/stats_rollups.py
+import calendar
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from backend.db import (
+    stats_rollups_collection,
+    users_collection,
+    wallets_collection,
+    orders_collection,
+    services_collection,
+    otp_requests_collection,
+    smsman_purchases_collection
+)
+
+# Rollup documents:
+#   {_id: "totals", users_total, users_active, wallet_balance, ..., rebuilt_at}
+#   {_id: "day:YYYY-MM-DD", date, users_registered, wallet_transactions, purchases, purchase_revenue}
+# Purchase/payment/signup paths $inc them as they happen; a periodic $facet
+# rebuild reconciles drift and fills the gauges nothing increments
+# (services, OTP requests, order revenue).
+ROLLUP_DAYS = 7
+ROLLUP_REBUILD_INTERVAL = float(os.getenv("ROLLUP_REBUILD_INTERVAL", 3600))
+
+TOTAL_FIELDS = (
+    "users_total", "users_active", "wallet_balance", "wallet_transactions",
+    "orders_revenue", "services_total", "services_active", "otp_total", "otp_pending",
+    "purchases", "purchases_cancelled", "purchase_revenue", "purchase_profit"
+)
+DAILY_FIELDS = ("users_registered", "wallet_transactions", "purchases", "purchase_revenue")
+
+def _day(ts: Optional[float] = None) -> str:
+    return datetime.utcfromtimestamp(ts if ts is not None else time.time()).strftime("%Y-%m-%d")
+
+def _recent_days() -> List[str]:
+    today = datetime.utcnow().date()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(ROLLUP_DAYS)]
+
+# ----- incremental updates -----
+
+def record(totals: Optional[Dict[str, float]] = None, daily: Optional[Dict[str, float]] = None, session=None) -> None:
+    """$inc the totals and today's bucket in one bulk write; stats never break the caller"""
+    ops = []
+    if totals:
+        ops.append(UpdateOne({"_id": "totals"}, {"$inc": totals}, upsert=True))
+    if daily:
+        day = _day()
+        ops.append(UpdateOne({"_id": f"day:{day}"}, {"$inc": daily, "$setOnInsert": {"date": day}}, upsert=True))
+    if not ops:
+        return
+    try:
+        stats_rollups_collection.bulk_write(ops, ordered=False, session=session)
+    except Exception as e:
+        print(f"⚠️ Stats rollup update failed: {e}")
+
+def record_signup() -> None:
+    record({"users_total": 1, "users_active": 1}, {"users_registered": 1})
+
+def record_status_change(is_active: bool) -> None:
+    record({"users_active": 1 if is_active else -1})
+
+def record_wallet_change(delta: float, ledger_entry: bool) -> None:
+    """ledger_entry: the change was logged in the wallets ledger (what the report counts)"""
+    if ledger_entry:
+        record({"wallet_balance": delta, "wallet_transactions": 1}, {"wallet_transactions": 1})
+    else:
+        record({"wallet_balance": delta})
+
+def record_purchase(amount: float, profit: float, session=None) -> None:
+    record(
+        {"purchases": 1, "purchase_revenue": amount, "purchase_profit": profit},
+        {"purchases": 1, "purchase_revenue": amount},
+        session=session
+    )
+
+def record_cancellation(amount: float, profit: float) -> None:
+    record({"purchases_cancelled": 1, "purchase_revenue": -amount, "purchase_profit": -profit})
+
+# ----- rebuild -----
+
+def _first(facet: Dict[str, List[dict]], key: str, field: str = "n") -> float:
+    rows = facet.get(key) or []
+    return rows[0].get(field, 0) if rows else 0
+
+def _per_day(facet: Dict[str, List[dict]], key: str, field: str = "n") -> Dict[str, float]:
+    return {row["_id"]: row.get(field, 0) for row in facet.get(key, []) if row.get("_id")}
+
+def _facet(collection, facets: Dict[str, list]) -> Dict[str, List[dict]]:
+    result = list(collection.aggregate([{"$facet": facets}]))
+    return result[0] if result else {}
+
+def rebuild() -> Dict[str, Any]:
+    """Recompute the totals and recent daily buckets with one $facet per collection"""
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=ROLLUP_DAYS - 1), datetime.min.time())
+    since_ts = calendar.timegm(since.timetuple())
+
+    def by_day(date_expr):
+        return {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": date_expr}}, "n": {"$sum": 1}}}
+
+    users = _facet(users_collection, {
+        "total": [{"$count": "n"}],
+        "active": [{"$match": {"is_active": {"$ne": False}}}, {"$count": "n"}],
+        "balance": [{"$group": {"_id": None, "n": {"$sum": "$balance"}}}],
+        "daily": [{"$match": {"created_at": {"$gte": since}}}, by_day("$created_at")]
+    })
+    wallets = _facet(wallets_collection, {
+        "total": [{"$count": "n"}],
+        "daily": [{"$match": {"created_at": {"$gte": since}}}, by_day("$created_at")]
+    })
+    orders = _facet(orders_collection, {
+        "revenue": [
+            {"$match": {"status": {"$in": ["COMPLETED", "SUCCESS"]}}},
+            {"$group": {"_id": None, "n": {"$sum": "$amount"}}}
+        ]
+    })
+    services = _facet(services_collection, {
+        "total": [{"$count": "n"}],
+        "active": [{"$match": {"status": "active"}}, {"$count": "n"}]
+    })
+    otp = _facet(otp_requests_collection, {
+        "total": [{"$count": "n"}],
+        "pending": [{"$match": {"status": "pending"}}, {"$count": "n"}]
+    })
+    # smsman_purchases.created_at is epoch seconds
+    purchase_date = {"$toDate": {"$multiply": ["$created_at", 1000]}}
+    purchases = _facet(smsman_purchases_collection, {
+        "total": [{"$count": "n"}],
+        "cancelled": [{"$match": {"status": "cancelled"}}, {"$count": "n"}],
+        "kept": [
+            {"$match": {"status": {"$ne": "cancelled"}}},
+            {"$group": {"_id": None, "revenue": {"$sum": "$charged_price"}, "profit": {"$sum": "$profit_earned"}}}
+        ],
+        "daily": [
+            {"$match": {"created_at": {"$gte": since_ts}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": purchase_date}},
+                "n": {"$sum": 1},
+                "revenue": {"$sum": "$charged_price"}
+            }}
+        ]
+    })
+
+    totals = {
+        "users_total": _first(users, "total"),
+        "users_active": _first(users, "active"),
+        "wallet_balance": _first(users, "balance"),
+        "wallet_transactions": _first(wallets, "total"),
+        "orders_revenue": _first(orders, "revenue"),
+        "services_total": _first(services, "total"),
+        "services_active": _first(services, "active"),
+        "otp_total": _first(otp, "total"),
+        "otp_pending": _first(otp, "pending"),
+        "purchases": _first(purchases, "total"),
+        "purchases_cancelled": _first(purchases, "cancelled"),
+        "purchase_revenue": _first(purchases, "kept", "revenue"),
+        "purchase_profit": _first(purchases, "kept", "profit"),
+        "rebuilt_at": time.time()
+    }
+
+    registrations = _per_day(users, "daily")
+    transactions = _per_day(wallets, "daily")
+    purchase_counts = _per_day(purchases, "daily")
+    purchase_revenue = _per_day(purchases, "daily", "revenue")
+
+    ops = [UpdateOne({"_id": "totals"}, {"$set": totals}, upsert=True)]
+    for day in _recent_days():
+        ops.append(UpdateOne({"_id": f"day:{day}"}, {"$set": {
+            "date": day,
+            "users_registered": registrations.get(day, 0),
+            "wallet_transactions": transactions.get(day, 0),
+            "purchases": purchase_counts.get(day, 0),
+            "purchase_revenue": purchase_revenue.get(day, 0)
+        }}, upsert=True))
+    stats_rollups_collection.bulk_write(ops, ordered=False)
+
+    print(f"✅ Stats rollups rebuilt: {int(totals['users_total'])} users, {int(totals['purchases'])} purchases")
+    return totals
+
+# ----- read -----
+
+def get_rollups(force_rebuild: bool = False) -> Dict[str, Any]:
+    """Totals plus the last ROLLUP_DAYS daily buckets, rebuilding when stale"""
+    days = _recent_days()
+    ids = ["totals"] + [f"day:{day}" for day in days]
+    docs = {doc["_id"]: doc for doc in stats_rollups_collection.find({"_id": {"$in": ids}})}
+
+    totals = docs.get("totals")
+    if force_rebuild or not totals or time.time() - totals.get("rebuilt_at", 0) > ROLLUP_REBUILD_INTERVAL:
+        rebuild()
+        docs = {doc["_id"]: doc for doc in stats_rollups_collection.find({"_id": {"$in": ids}})}
+        totals = docs.get("totals", {})
+
+    daily = []
+    for day in days:
+        bucket = docs.get(f"day:{day}", {})
+        daily.append({"date": day, **{field: bucket.get(field, 0) for field in DAILY_FIELDS}})
+
+    return {
+        "totals": {field: totals.get(field, 0) for field in TOTAL_FIELDS},
+        "daily": daily,
+        "rebuilt_at": totals.get("rebuilt_at")
+    }
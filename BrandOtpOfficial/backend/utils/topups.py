@@ -0,0 +1,195 @@
+# backend/utils/topups.py
+"""
+Pay0 top-ups: claim once, credit once.
+
+The webhook and the status-check endpoints both learn that an order
+succeeded, and Pay0 retries webhooks. Whoever flips the payments record to
+SUCCESS first wins the claim; everyone else sees "already processed":
+
+    claim:  update_one({order_id, status != SUCCESS}, {$set: SUCCESS, credit_state: pending}, upsert)
+
+With the unique index on payments.order_id a racing upsert fails with
+DuplicateKeyError instead of inserting a second record, so exactly one
+caller gets a modified/upserted result.
+
+The claimed record doubles as a durable work item (credit_state: pending).
+apply_credit leases it, credits the wallet with the order_id as ledger
+reference (unique on wallets.order_id, so a replay cannot credit twice) and
+marks it credited. The credit runs as a "topup_credit" job on the job
+queue; a sweeper re-enqueues any claim left pending by a crash between the
+claim and the enqueue.
+"""
+import asyncio
+import os
+import time
+from contextlib import suppress
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.db import payments_collection, wallets_collection, run_db
+from backend.utils.wallet_utils import credit_user_wallet
+from backend.utils.user_counters import record_topup
+from backend.utils import job_queue
+
+TOPUP_LEASE = float(os.getenv("TOPUP_LEASE", 60))
+TOPUP_SWEEP_INTERVAL = float(os.getenv("TOPUP_SWEEP_INTERVAL", 30))
+TOPUP_MAX_ATTEMPTS = int(os.getenv("TOPUP_MAX_ATTEMPTS", 5))
+
+_task: Optional[asyncio.Task] = None
+
+def record_pending(order_id: str, user_id: str, amount: float) -> None:
+    """PENDING record written when the order is created, so later steps know the owner"""
+    now = time.time()
+    payments_collection.update_one(
+        {"order_id": order_id},
+        {"$setOnInsert": {
+            "order_id": order_id,
+            "user_id": user_id,
+            "amount": amount,
+            "status": "PENDING",
+            "type": "credit",
+            "created_at": now,
+            "updated_at": now
+        }},
+        upsert=True
+    )
+
+def claim(order_id: str, user_id: str, amount: float, reason: str, **fields: Any) -> bool:
+    """
+    Atomically mark the order SUCCESS; True only for the one caller that did it.
+    user_id only applies when there is no record yet: the owner stored by
+    record_pending is never replaced (callers check it first, see owner()).
+    """
+    now = time.time()
+    try:
+        result = payments_collection.update_one(
+            {"order_id": order_id, "status": {"$ne": "SUCCESS"}},
+            {
+                "$set": {
+                    "amount": amount,
+                    "status": "SUCCESS",
+                    "type": "credit",
+                    "reason": reason,
+                    "credit_state": "pending",
+                    "credit_attempts": 0,
+                    "claimed_at": now,
+                    "updated_at": now,
+                    **fields
+                },
+                "$setOnInsert": {"user_id": user_id, "created_at": now}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False  # Another caller's upsert won the race
+    return bool(result.upserted_id or result.modified_count)
+
+def owner(order_id: str) -> Optional[str]:
+    """The user recorded for an order, None if the order has no record yet"""
+    payment = payments_collection.find_one({"order_id": order_id}, {"user_id": 1})
+    return payment.get("user_id") if payment else None
+
+def apply_credit(order_id: str) -> Dict[str, Any]:
+    """Credit a claimed order exactly once; safe to call repeatedly"""
+    now = time.time()
+    payment = payments_collection.find_one_and_update(
+        {
+            "order_id": order_id,
+            "status": "SUCCESS",
+            "credit_state": "pending",
+            "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]
+        },
+        {"$set": {"lease_until": now + TOPUP_LEASE}, "$inc": {"credit_attempts": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not payment:
+        return {"success": False, "retry": False, "error": "Credit already applied or in progress"}
+
+    if wallets_collection.find_one({"order_id": order_id}, {"_id": 1}):
+        # Credited before a crash cut the bookkeeping short
+        payments_collection.update_one(
+            {"_id": payment["_id"]},
+            {"$set": {"credit_state": "credited", "updated_at": time.time()}, "$unset": {"lease_until": ""}}
+        )
+        return {"success": True, "already_credited": True}
+
+    credit = credit_user_wallet(
+        payment["user_id"],
+        payment["amount"],
+        payment.get("reason", "Wallet Top-up via Pay0"),
+        order_id=order_id
+    )
+    if not credit["success"]:
+        failed = payment["credit_attempts"] >= TOPUP_MAX_ATTEMPTS
+        payments_collection.update_one(
+            {"_id": payment["_id"]},
+            {
+                "$set": {
+                    "credit_state": "failed" if failed else "pending",
+                    "last_error": credit["error"],
+                    "updated_at": time.time()
+                },
+                "$unset": {"lease_until": ""}
+            }
+        )
+        print(f"❌ Top-up credit failed for {order_id} (attempt {payment['credit_attempts']}): {credit['error']}")
+        return {**credit, "retry": not failed}
+
+    payments_collection.update_one(
+        {"_id": payment["_id"]},
+        {
+            "$set": {
+                "credit_state": "credited",
+                "transaction_id": credit["transaction_id"],
+                "credited_at": time.time(),
+                "updated_at": time.time()
+            },
+            "$unset": {"lease_until": ""}
+        }
+    )
+    record_topup(payment["user_id"], payment["amount"])
+    print(f"✅ Top-up credited: Order {order_id}, User {payment['user_id']}, +₹{payment['amount']}")
+    return credit
+
+def enqueue_credit(order_id: str) -> Optional[str]:
+    """Queue the credit for a claimed order (one live job per order)"""
+    return job_queue.enqueue("topup_credit", {"order_id": order_id}, dedupe_key=f"topup:{order_id}")
+
+def sweep_pending() -> int:
+    """Re-enqueue claims still pending a while after they were made"""
+    cutoff = time.time() - TOPUP_LEASE
+    queued = 0
+    for payment in payments_collection.find(
+        {"credit_state": "pending", "claimed_at": {"$lt": cutoff}},
+        {"order_id": 1}
+    ):
+        enqueue_credit(payment["order_id"])
+        queued += 1
+    return queued
+
+async def _run() -> None:
+    while True:
+        try:
+            queued = await run_db(sweep_pending)
+            if queued:
+                print(f"🔁 Top-up sweeper queued {queued} pending credits")
+        except Exception as e:
+            print(f"❌ Top-up sweeper error: {e}")
+        await asyncio.sleep(TOPUP_SWEEP_INTERVAL)
+
+def start() -> None:
+    """Start the pending-credit sweeper (called from the FastAPI startup hook)"""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run())
+
+async def stop() -> None:
+    """Stop the sweeper (called from the FastAPI shutdown hook)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _task
+        _task = None
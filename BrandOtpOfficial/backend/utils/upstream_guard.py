@@ -0,0 +1,198 @@
+# backend/utils/upstream_guard.py
+"""
+Rate limiting and circuit breaking for provider APIs.
+
+Every call to an upstream goes through its UpstreamGuard:
+
+    token bucket      at most `rate` requests/s with bursts up to `burst`; a
+                      caller waits for a token up to `max_wait` seconds, past
+                      that it fails fast instead of queueing on the event loop
+    circuit breaker   `threshold` consecutive failures (transport errors,
+                      timeouts, 5xx/429) open the circuit; while open every
+                      call fails immediately with UpstreamUnavailable. After
+                      `reset_timeout` the circuit goes half-open and lets
+                      `probes` calls through: one success closes it, a failure
+                      re-opens it for another reset_timeout.
+
+UpstreamUnavailable is a RuntimeError, so callers that already treat upstream
+errors as "no data" keep working. The catalog caches keep serving their
+stale copy when a refresh raises. Limits are per process.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised without calling the upstream: circuit open or rate limit wait too long"""
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "max_wait", "_tokens", "_updated")
+
+    def __init__(self, rate: float, burst: float, max_wait: float):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Take a token, waiting for one if needed; raises when the wait would exceed max_wait"""
+        self._refill()
+        # Tokens go negative while callers wait, so later callers queue behind them
+        wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+        if wait > self.max_wait:
+            raise UpstreamUnavailable(f"rate limited (next slot in {wait:.1f}s)")
+        self._tokens -= 1
+        if wait:
+            await asyncio.sleep(wait)
+
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+class CircuitBreaker:
+    __slots__ = ("threshold", "reset_timeout", "probes", "state", "failures", "opened_at", "_probing", "_stats")
+
+    def __init__(self, threshold: int, reset_timeout: float, probes: int):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = 0
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def before(self) -> None:
+        """Admit a call or raise UpstreamUnavailable"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self._stats["rejected"] += 1
+                raise UpstreamUnavailable("circuit open")
+            self.state = "half_open"
+            self._probing = 0
+        if self.state == "half_open":
+            if self._probing >= self.probes:
+                self._stats["rejected"] += 1
+                raise UpstreamUnavailable("circuit half-open, probe in flight")
+            self._probing += 1
+
+    def success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probing = 0
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self._stats["opened"] += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = 0
+
+    def release(self) -> None:
+        """A half-open probe that never reached the upstream proves nothing either way"""
+        if self.state == "half_open" and self._probing:
+            self._probing -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = self.reset_timeout - (time.monotonic() - self.opened_at) if self.state == "open" else 0
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in": round(max(retry_in, 0), 1),
+            **self._stats
+        }
+
+class UpstreamGuard:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        max_wait: float = 2.0,
+        threshold: int = 5,
+        reset_timeout: float = 30.0,
+        probes: int = 1
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, max_wait)
+        self.breaker = CircuitBreaker(threshold, reset_timeout, probes)
+        self._stats = {"calls": 0, "failures": 0, "rate_limited": 0}
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        is_failure: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Run fn() under the rate limit and breaker. Exceptions from fn count as
+        failures and are re-raised; is_failure flags bad results (e.g. 5xx).
+        """
+        self.breaker.before()
+        try:
+            await self.bucket.acquire()
+        except UpstreamUnavailable:
+            self._stats["rate_limited"] += 1
+            self.breaker.release()
+            raise
+
+        self._stats["calls"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self._record(False)
+            raise
+        self._record(not (is_failure and is_failure(result)))
+        return result
+
+    def _record(self, ok: bool) -> None:
+        if ok:
+            if self.breaker.state == "half_open":
+                print(f"✅ {self.name} circuit closed after a successful probe")
+            self.breaker.success()
+            return
+        self._stats["failures"] += 1
+        was_open = self.breaker.state == "open"
+        self.breaker.failure()
+        if not was_open and self.breaker.state == "open":
+            print(f"🚫 {self.name} circuit OPEN after {self.breaker.failures} failures, retry in {self.breaker.reset_timeout:.0f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            **self.breaker.snapshot(),
+            "tokens": round(self.bucket.available(), 1),
+            **self._stats
+        }
+
+GUARDS: Dict[str, UpstreamGuard] = {}
+
+def guard(name: str, rate: float, burst: float, **kwargs: Any) -> UpstreamGuard:
+    """Create (once) and register the guard for an upstream; settings can be overridden via env"""
+    if name not in GUARDS:
+        prefix = name.upper()
+        GUARDS[name] = UpstreamGuard(
+            name,
+            rate=float(os.getenv(f"{prefix}_RATE", rate)),
+            burst=float(os.getenv(f"{prefix}_BURST", burst)),
+            max_wait=float(os.getenv(f"{prefix}_RATE_MAX_WAIT", kwargs.get("max_wait", 2.0))),
+            threshold=int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", kwargs.get("threshold", 5))),
+            reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET", kwargs.get("reset_timeout", 30.0))),
+            probes=int(os.getenv(f"{prefix}_BREAKER_PROBES", kwargs.get("probes", 1)))
+        )
+    return GUARDS[name]
+
+def health() -> List[Dict[str, Any]]:
+    """Breaker and rate limiter state for every upstream"""
+    return [g.snapshot() for g in GUARDS.values()]
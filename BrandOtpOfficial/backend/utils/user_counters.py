@@ -0,0 +1,196 @@
+# backend/utils/user_counters.py
+"""
+Per-user dashboard counters in user_counters, one document per user:
+
+    {_id: "<user ObjectId>", total_orders, active_numbers, completed_numbers,
+     cancelled_numbers, total_spent, total_topups, topup_amount,
+     otp_total, otp_pending, otp_active, otp_completed, otp_cancelled, otp_failed, otp_spent}
+
+Purchase, completion, cancel and top-up paths $inc them atomically, so the
+dashboard reads one document by _id. A document without backfilled_at (a new
+user, or one whose first event came before their first read) is rebuilt from
+smsman_purchases / payments / otp_requests on read. The rebuild covers those
+early events too, so it overwrites the partial increments. The whole
+collection can be rebuilt with:
+
+    python -m backend.utils.user_counters
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from backend.db import (
+    user_counters_collection,
+    users_collection,
+    smsman_purchases_collection,
+    payments_collection,
+    otp_requests_collection
+)
+
+COUNTER_FIELDS = (
+    "total_orders", "active_numbers", "completed_numbers", "cancelled_numbers", "total_spent",
+    "total_topups", "topup_amount",
+    "otp_total", "otp_pending", "otp_active", "otp_completed", "otp_cancelled", "otp_failed", "otp_spent"
+)
+OTP_STATUSES = ("pending", "active", "completed", "cancelled", "failed")
+
+def _key(user_ref: str, session=None) -> Optional[str]:
+    """Counters are keyed by user ObjectId; the OTP routes reference users by email"""
+    if user_ref and "@" in user_ref:
+        user = users_collection.find_one({"email": user_ref}, {"_id": 1}, session=session)
+        return str(user["_id"]) if user else None
+    return user_ref or None
+
+def _update(increments: Dict[str, float]) -> Dict[str, Any]:
+    return {"$inc": increments, "$set": {"updated_at": time.time()}}
+
+def bump(user_ref: str, session=None, **increments: float) -> None:
+    """Atomically $inc a user's counters; stats never break the caller"""
+    try:
+        key = _key(user_ref, session)
+        if key:
+            user_counters_collection.update_one({"_id": key}, _update(increments), upsert=True, session=session)
+    except Exception as e:
+        print(f"⚠️ User counters update failed for {user_ref}: {e}")
+
+# ----- events -----
+
+def record_number_purchase(user_id: str, amount: float, session=None) -> None:
+    bump(user_id, session=session, total_orders=1, active_numbers=1, total_spent=amount)
+
+def record_numbers_completed(user_ids: Iterable[str]) -> None:
+    """One bulk write for every number that received its SMS this tick"""
+    ops = [
+        UpdateOne({"_id": user_id}, _update({"active_numbers": -1, "completed_numbers": 1}), upsert=True)
+        for user_id in user_ids if user_id
+    ]
+    if not ops:
+        return
+    try:
+        user_counters_collection.bulk_write(ops, ordered=False)
+    except Exception as e:
+        print(f"⚠️ User counters update failed: {e}")
+
+def record_number_expired(user_id: str) -> None:
+    bump(user_id, active_numbers=-1)
+
+def record_number_cancelled(user_id: str, refund: float, was_active: bool) -> None:
+    bump(
+        user_id,
+        active_numbers=-1 if was_active else 0,
+        cancelled_numbers=1,
+        total_spent=-refund
+    )
+
+def record_topup(user_id: str, amount: float) -> None:
+    bump(user_id, total_topups=1, topup_amount=amount)
+
+def record_otp_created(user_ref: str, status: str, amount: float) -> None:
+    bump(user_ref, otp_total=1, otp_spent=amount, **{f"otp_{status}": 1})
+
+def record_otp_transition(user_ref: str, old_status: Optional[str], new_status: Optional[str]) -> None:
+    if old_status == new_status or old_status not in OTP_STATUSES or new_status not in OTP_STATUSES:
+        return
+    bump(user_ref, **{f"otp_{old_status}": -1, f"otp_{new_status}": 1})
+
+# ----- backfill -----
+
+def _empty() -> Dict[str, float]:
+    return {field: 0 for field in COUNTER_FIELDS}
+
+def _compute(user_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """Counters rebuilt from the source collections (all users, or just user_ids)"""
+    from backend.utils.sms_poller import SMS_WAIT_TIMEOUT  # sms_poller imports this module
+
+    counters: Dict[str, Dict[str, float]] = {}
+    active_since = time.time() - SMS_WAIT_TIMEOUT
+
+    def row(user_id: str) -> Dict[str, float]:
+        return counters.setdefault(user_id, _empty())
+
+    purchase_match = {"user_id": {"$in": user_ids}} if user_ids else {}
+    for doc in smsman_purchases_collection.aggregate([
+        {"$match": purchase_match},
+        {"$group": {
+            "_id": "$user_id",
+            "total": {"$sum": 1},
+            "active": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$status", "waiting_sms"]}, {"$gte": ["$created_at", active_since]}]}, 1, 0
+            ]}},
+            "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+            "cancelled": {"$sum": {"$cond": [{"$eq": ["$status", "cancelled"]}, 1, 0]}},
+            "spent": {"$sum": {"$cond": [{"$eq": ["$status", "cancelled"]}, 0, "$charged_price"]}}
+        }}
+    ]):
+        counters_row = row(doc["_id"])
+        counters_row.update({
+            "total_orders": doc["total"],
+            "active_numbers": doc["active"],
+            "completed_numbers": doc["completed"],
+            "cancelled_numbers": doc["cancelled"],
+            "total_spent": doc["spent"]
+        })
+
+    topup_match: Dict[str, Any] = {"order_id": {"$type": "string"}, "status": "SUCCESS"}
+    if user_ids:
+        topup_match["user_id"] = {"$in": user_ids}
+    for doc in payments_collection.aggregate([
+        {"$match": topup_match},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}, "amount": {"$sum": "$amount"}}}
+    ]):
+        row(doc["_id"]).update({"total_topups": doc["count"], "topup_amount": doc["amount"]})
+
+    # OTP requests reference users by email
+    email_filter = {"_id": {"$in": [ObjectId(u) for u in user_ids if ObjectId.is_valid(u)]}} if user_ids else {}
+    ids_by_email = {
+        user["email"]: str(user["_id"])
+        for user in users_collection.find(email_filter, {"email": 1}) if user.get("email")
+    }
+    otp_match = {"user_id": {"$in": list(ids_by_email)}} if user_ids else {}
+    for doc in otp_requests_collection.aggregate([
+        {"$match": otp_match},
+        {"$group": {
+            "_id": {"user": "$user_id", "status": "$status"},
+            "count": {"$sum": 1},
+            "spent": {"$sum": {"$ifNull": ["$amount_paid", {"$ifNull": ["$price", 0]}]}}
+        }}
+    ]):
+        user_id = ids_by_email.get(doc["_id"]["user"])
+        if not user_id:
+            continue
+        counters_row = row(user_id)
+        counters_row["otp_total"] += doc["count"]
+        counters_row["otp_spent"] += doc["spent"]
+        if doc["_id"]["status"] in OTP_STATUSES:
+            counters_row[f"otp_{doc['_id']['status']}"] += doc["count"]
+
+    for user_id in user_ids or []:
+        row(user_id)
+    return counters
+
+def backfill(user_ids: Optional[List[str]] = None) -> int:
+    """Overwrite counters with values rebuilt from the source collections"""
+    counters = _compute(user_ids)
+    now = time.time()
+    ops = [
+        UpdateOne({"_id": user_id}, {"$set": {**values, "updated_at": now, "backfilled_at": now}}, upsert=True)
+        for user_id, values in counters.items() if user_id
+    ]
+    for start in range(0, len(ops), 500):
+        user_counters_collection.bulk_write(ops[start:start + 500], ordered=False)
+    return len(ops)
+
+def get_counters(user_id: str) -> Dict[str, float]:
+    """One read by _id; a document never backfilled is rebuilt first (blocking - use run_db)"""
+    doc = user_counters_collection.find_one({"_id": user_id})
+    if doc is None or "backfilled_at" not in doc:
+        backfill([user_id])
+        doc = user_counters_collection.find_one({"_id": user_id}) or {}
+    return {field: doc.get(field, 0) for field in COUNTER_FIELDS}
+
+if __name__ == "__main__":
+    started = time.time()
+    count = backfill()
+    print(f"✅ User counters backfilled for {count} users in {time.time() - started:.1f}s")
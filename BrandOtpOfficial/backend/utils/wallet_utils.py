@@ -1,89 +1,125 @@
 # backend/utils/wallet_utils.py
 
 from datetime import datetime
+from typing import Any, Dict, Optional
 from bson import ObjectId
-from backend.db import users_collection, wallets_collection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from backend.db import users_collection, wallets_collection, run_in_transaction
+from backend.utils.stats_rollups import record_wallet_change
 import logging
 
 logger = logging.getLogger(__name__)
 
-def credit_user_wallet(user_id: str, amount: float, reason: str = "Credit") -> dict:
+def _user_filter(user_id: str) -> Optional[dict]:
+    """Users are referenced by ObjectId string, or by email in the older OTP routes"""
+    if "@" in user_id:
+        return {"email": user_id}
+    if ObjectId.is_valid(user_id):
+        return {"_id": ObjectId(user_id)}
+    return None
+
+def get_wallet_balance(user_id: str) -> Optional[float]:
+    """Current balance straight from Mongo (None if the user does not exist)"""
+    base_filter = _user_filter(user_id)
+    if base_filter is None:
+        return None
+    user = users_collection.find_one(base_filter, {"balance": 1})
+    if user is None:
+        return None
+    return float(user.get("balance") or 0.0)
+
+def apply_wallet_change(
+    user_id: str,
+    delta: float,
+    reason: str,
+    ledger=None,
+    **ledger_fields: Any
+) -> Dict[str, Any]:
     """
-    Credits a specified amount to a user's wallet.
-    This is a centralized utility function.
+    Atomically move a user's balance by delta and record it in the ledger.
+
+    The balance change is a single conditional find_one_and_update with $inc;
+    debits carry a balance >= amount guard, so concurrent purchases can never
+    overdraw or lose updates. The ledger entry is written in the same
+    transaction. Extra keyword arguments are stored on the ledger entry.
     """
-    try:
-        # Validate user_id format before querying
-        if not ObjectId.is_valid(user_id):
-            logger.error(f"Invalid ObjectId format for user_id: {user_id}")
-            return {"success": False, "error": "Invalid user ID format"}
+    base_filter = _user_filter(user_id)
+    if base_filter is None:
+        logger.error(f"Invalid ObjectId format for user_id: {user_id}")
+        return {"success": False, "error": "Invalid user ID format"}
+
+    if delta == 0:
+        return {"success": False, "error": "Amount must be non-zero"}
+
+    ledger = ledger if ledger is not None else wallets_collection
+    user_filter = dict(base_filter)
+    if delta < 0:
+        user_filter["balance"] = {"$gte": -delta}
 
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            logger.warning(f"Credit failed: User not found for ID {user_id}")
-            return {"success": False, "error": "User not found"}
-        
-        current_balance = float(user.get("balance", 0.0))
-        new_balance = current_balance + amount
-        
-        result = users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"balance": new_balance}}
+    def write(session):
+        user = users_collection.find_one_and_update(
+            user_filter,
+            {"$inc": {"balance": delta}},
+            projection={"balance": 1, "email": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
         )
-        
-        if result.modified_count > 0:
-            transaction = {
-                "user_id": user_id,
-                "type": "credit",
-                "amount": amount,
-                "previous_balance": current_balance,
-                "new_balance": new_balance,
-                "reason": reason,
-                "status": "completed",
-                "created_at": datetime.utcnow()
-            }
-            # Use wallets_collection consistently
-            tx_result = wallets_collection.insert_one(transaction)
-            
-            logger.info(f"Successfully credited {amount} to user {user_id}. New balance: {new_balance}")
-            return {
-                "success": True,
-                "new_balance": new_balance,
-                "transaction_id": str(tx_result.inserted_id)
-            }
-        else:
-            logger.warning(f"Failed to update balance for user {user_id}, though user was found.")
-            return {"success": False, "error": "Failed to update balance"}
-            
+        if user is None:
+            return None
+
+        new_balance = float(user.get("balance", 0.0))
+        entry = {
+            "user_id": str(user["_id"]),
+            "user_email": user.get("email"),
+            "type": "credit" if delta > 0 else "debit",
+            "amount": abs(delta),
+            "previous_balance": new_balance - delta,
+            "new_balance": new_balance,
+            "reason": reason,
+            "status": "completed",
+            "created_at": datetime.utcnow(),
+            **ledger_fields
+        }
+        ledger.insert_one(entry, session=session)
+        return entry
+
+    try:
+        entry = run_in_transaction(write)
+    except DuplicateKeyError:
+        # A unique ledger key (order_id, refund request_id, saga_id) already has its entry
+        logger.warning(f"Duplicate ledger entry for user {user_id}, change not applied")
+        return {"success": False, "error": "Duplicate ledger entry", "duplicate": True}
     except Exception as e:
-        logger.error(f"Critical error in credit_user_wallet for user {user_id}: {e}")
+        logger.error(f"Critical error in wallet change for user {user_id}: {e}")
         return {"success": False, "error": f"An unexpected error occurred: {str(e)}"}
 
-def debit_user_wallet(user_id: str, amount: float, reason: str = "Debit") -> dict:
-    # (The debit function remains the same, but it's good practice to keep it here)
-    try:
-        if not ObjectId.is_valid(user_id):
-            return {"success": False, "error": "Invalid user ID format"}
-            
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            return {"success": False, "error": "User not found"}
-        
-        current_balance = float(user.get("balance", 0.0))
-        
-        if current_balance < amount:
+    if entry is None:
+        if delta < 0 and users_collection.count_documents(base_filter, limit=1):
             return {"success": False, "error": "Insufficient balance"}
-        
-        new_balance = current_balance - amount
-        
-        users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        # ... (rest of the debit logic)
-        return {"success": True, "new_balance": new_balance}
+        logger.warning(f"Wallet change failed: User not found for ID {user_id}")
+        return {"success": False, "error": "User not found"}
 
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    record_wallet_change(delta, ledger is wallets_collection)
+    logger.info(f"Wallet {entry['type']} of {abs(delta)} for user {user_id}. New balance: {entry['new_balance']}")
+    return {
+        "success": True,
+        "previous_balance": entry["previous_balance"],
+        "new_balance": entry["new_balance"],
+        "transaction_id": str(entry["_id"])
+    }
+
+def credit_user_wallet(user_id: str, amount: float, reason: str = "Credit", ledger=None, **ledger_fields: Any) -> dict:
+    """
+    Credits a specified amount to a user's wallet.
+    This is a centralized utility function.
+    """
+    if amount <= 0:
+        return {"success": False, "error": "Amount must be positive"}
+    return apply_wallet_change(user_id, amount, reason, ledger, **ledger_fields)
 
+def debit_user_wallet(user_id: str, amount: float, reason: str = "Debit", ledger=None, **ledger_fields: Any) -> dict:
+    """Debits a user's wallet only if the balance covers the full amount"""
+    if amount <= 0:
+        return {"success": False, "error": "Amount must be positive"}
+    return apply_wallet_change(user_id, -amount, reason, ledger, **ledger_fields)
@@ -0,0 +1 @@
+# Benchmarks and load checks; run from BrandOtpOfficial with `python -m benchmarks.<name>`
@@ -0,0 +1,81 @@
+# benchmarks/_stub_server.py
+"""
+A local HTTP/1.1 keep-alive server standing in for a provider API.
+
+    server = StubServer({"/get-number": lambda method, params: (200, {...})}, latency=0.05)
+    server.start()  # server.url -> http://127.0.0.1:<port>
+    ...
+    server.stop()
+
+Each request sleeps `latency` seconds (on its own thread) before answering,
+so concurrent clients see the delay in parallel as they would upstream.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+Route = Callable[[str, Dict[str, str]], Tuple[int, Any]]
+
+class StubServer:
+    def __init__(self, routes: Dict[str, Route], latency: float = 0.0):
+        self.routes = routes
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is visible
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def _answer(self, params: Dict[str, str]) -> None:
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                route = stub.routes.get(urlsplit(self.path).path)
+                status, payload = route(self.command, params) if route else (404, {"error": "not found"})
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._answer(dict(parse_qsl(urlsplit(self.path).query)))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self._answer(dict(parse_qsl(self.rfile.read(length).decode("utf-8"))))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
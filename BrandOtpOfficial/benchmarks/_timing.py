@@ -0,0 +1,32 @@
+# benchmarks/_timing.py
+"""Latency summaries shared by the benchmark scripts"""
+import time
+from typing import Callable, Dict, List
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summary(samples: List[float]) -> Dict[str, float]:
+    """p50/p99/max in milliseconds"""
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3)
+    }
+
+def report(name: str, samples: List[float]) -> Dict[str, float]:
+    stats = summary(samples)
+    print(f"📊 {name}: n={stats['n']} p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms max={stats['max_ms']}ms")
+    return stats
+
+def repeat(fn: Callable[[], object], rounds: int) -> List[float]:
+    """Wall time of each of `rounds` calls to fn"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
@@ -0,0 +1,78 @@
+# benchmarks/db_latency.py
+"""
+Load test for run_db under a slow database: every simulated request makes a
+users_collection lookup with DB latency injected in front of it (the Atlas
+round trip). It runs the requests with the lookup inline on the event loop,
+as the routes did before run_db, and then through the DB_EXECUTOR_WORKERS
+pool. It reports request latency, event loop lag (what SMS polls and
+streams would feel) and throughput.
+
+Needs a reachable MongoDB in MONGO_URI; a local mongod is enough, since the
+latency is injected:
+
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.db_latency [--requests 500] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+
+from backend.db import users_collection, run_db, DB_EXECUTOR_WORKERS
+from benchmarks._timing import report
+
+HEARTBEAT = 0.01
+
+def _slow_lookup(user_id: ObjectId, latency: float):
+    time.sleep(latency)  # Network round trip to the database
+    return users_collection.find_one({"_id": user_id}, {"balance": 1})
+
+async def _inline(user_id: ObjectId, latency: float):
+    return _slow_lookup(user_id, latency)
+
+async def _pooled(user_id: ObjectId, latency: float):
+    return await run_db(_slow_lookup, user_id, latency)
+
+async def _load(label: str, lookup, requests: int, concurrency: int, latency: float) -> None:
+    lags, latencies = [], []
+    stop = asyncio.Event()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def heartbeat():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT)
+            lags.append(time.perf_counter() - start - HEARTBEAT)
+
+    async def request():
+        async with gate:
+            start = time.perf_counter()
+            await lookup(ObjectId(), latency)
+            latencies.append(time.perf_counter() - start)
+
+    beat = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    report(f"{label} request", latencies)
+    report(f"{label} loop lag", lags or [0.0])
+    print(f"   {requests / elapsed:.1f} requests/s")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="injected DB latency in seconds")
+    args = parser.parse_args()
+
+    print(f"🧪 {args.requests} requests, {args.concurrency} concurrent, "
+          f"{args.latency * 1000:.0f}ms DB latency, {DB_EXECUTOR_WORKERS} DB workers")
+    # Inline requests serialize on the loop; keep that run short
+    await _load("inline", _inline, min(args.requests, 100), args.concurrency, args.latency)
+    await _load("run_db", _pooled, args.requests, args.concurrency, args.latency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
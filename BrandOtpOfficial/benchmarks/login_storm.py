@@ -0,0 +1,73 @@
+# benchmarks/login_storm.py
+"""
+Login storm: many concurrent password checks through password_utils while a
+heartbeat task measures event loop lag (what every other request on the
+worker would feel). Runs once with bcrypt inline on the loop, which is how
+login worked before the password pool, and once through the pool. It
+reports verify latency, loop lag, throughput and how many calls were shed
+with a 503 once PASSWORD_QUEUE_LIMIT was reached.
+
+    python -m benchmarks.login_storm [--logins 200] [--rounds 12]
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+from fastapi import HTTPException
+
+from backend.utils import password_utils
+from benchmarks._timing import report
+
+HEARTBEAT = 0.01
+
+async def _heartbeat(lags, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(time.perf_counter() - start - HEARTBEAT)
+
+async def _inline_verify(plain: str, hashed: str) -> bool:
+    return password_utils._verify(plain, hashed)
+
+async def _storm(label: str, verify, logins: int, hashed: str) -> None:
+    lags, latencies, shed = [], [], 0
+    stop = asyncio.Event()
+    beat = asyncio.create_task(_heartbeat(lags, stop))
+
+    async def login(i):
+        nonlocal shed
+        start = time.perf_counter()
+        try:
+            # Every tenth attempt is a wrong password, like a real storm
+            await verify("wrong" if i % 10 == 0 else "correct horse", hashed)
+        except HTTPException:
+            shed += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    report(f"{label} verify", latencies)
+    report(f"{label} loop lag", lags or [0.0])
+    print(f"   {len(latencies) / elapsed:.1f} logins/s, {shed} shed with 503")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=password_utils.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(rounds=args.rounds)).decode("utf-8")
+    print(f"🧪 {args.logins} logins, cost {args.rounds}, {password_utils.PASSWORD_WORKERS} workers, "
+          f"queue limit {password_utils.PASSWORD_QUEUE_LIMIT}")
+
+    await _storm("inline", _inline_verify, args.logins, hashed)
+    await _storm("password pool", password_utils.verify_password, args.logins, hashed)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+# benchmarks/pay0_gateway.py
+"""
+Pay0 against a slow stub gateway: a batch of create-order calls hangs for
+--latency seconds each while a steady stream of fast requests (another
+upstream answering in a few ms) runs alongside. It runs once with a
+blocking form POST on the event loop, which is how Pay0 was called before
+pay0_client, and once through pay0_client. The fast stream's latency shows
+whether other requests keep flowing while the gateway is slow.
+
+    python -m benchmarks.pay0_gateway [--orders 20] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import time
+import urllib.parse
+import urllib.request
+
+import httpx
+
+from backend.utils import pay0_client
+from benchmarks._stub_server import StubServer
+from benchmarks._timing import report
+
+def _create_order(method, params):
+    return 200, {"status": True, "message": "Order Created", "result": {"orderId": params.get("order_id")}}
+
+def _ping(method, params):
+    return 200, {"ok": True}
+
+async def _blocking_create_order(mobile: str, amount: float, redirect: str) -> dict:
+    # The pre-pay0_client shape: a synchronous POST straight from the coroutine
+    data = urllib.parse.urlencode({"customer_mobile": mobile, "amount": f"{amount:.2f}", "redirect_url": redirect}).encode()
+    with urllib.request.urlopen(f"{pay0_client.BASE_URL}/create-order", data=data, timeout=30) as resp:
+        return {"status": resp.status == 200}
+
+async def _round(label: str, create_order, orders: int, fast: httpx.AsyncClient, duration_hint: float) -> None:
+    fast_latencies, order_latencies = [], []
+    done = asyncio.Event()
+
+    async def fast_stream():
+        while not done.is_set():
+            start = time.perf_counter()
+            await fast.get("/ping")
+            fast_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    async def order(i):
+        start = time.perf_counter()
+        await create_order("9999999999", 100.0, "https://example.com/return")
+        order_latencies.append(time.perf_counter() - start)
+
+    stream = asyncio.create_task(fast_stream())
+    await asyncio.sleep(0.05)  # Let the stream settle before the gateway gets busy
+    start = time.perf_counter()
+    await asyncio.gather(*(order(i) for i in range(orders)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await stream
+
+    report(f"{label} create_order", order_latencies)
+    report(f"{label} other requests", fast_latencies)
+    print(f"   {orders} orders in {elapsed:.2f}s (gateway latency {duration_hint:.2f}s), "
+          f"{len(fast_latencies)} other requests served")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub gateway delay in seconds")
+    args = parser.parse_args()
+
+    gateway = StubServer({"/create-order": _create_order}, latency=args.latency).start()
+    other = StubServer({"/ping": _ping}, latency=0.005).start()
+    pay0_client.BASE_URL = gateway.url
+    print(f"🧪 Stub Pay0 at {gateway.url} ({args.latency * 1000:.0f}ms), other upstream at {other.url} (5ms)")
+
+    try:
+        async with httpx.AsyncClient(base_url=other.url) as fast:
+            # Blocking calls serialize, so keep that round short
+            await _round("blocking", _blocking_create_order, min(args.orders, 5), fast, args.latency)
+            await pay0_client.start_client()
+            await _round("pay0_client", pay0_client.create_order, args.orders, fast, args.latency)
+    finally:
+        await pay0_client.close_client()
+        gateway.stop()
+        other.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
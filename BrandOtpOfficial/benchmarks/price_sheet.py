@@ -0,0 +1,51 @@
+# benchmarks/price_sheet.py
+"""
+Parser microbenchmark: a 2,000-service /get-prices payload in each of the
+three shapes SMSMan returns, through parse(), get() and the services join.
+
+    python -m benchmarks.price_sheet [--services 2000] [--rounds 200]
+"""
+import argparse
+import random
+
+from backend.utils import price_sheet
+from benchmarks._timing import report, repeat
+
+MARGIN = 1.7
+
+def payloads(services: int):
+    rng = random.Random(services)
+    rows = [
+        {"application_id": service_id, "cost": f"{rng.uniform(1, 80):.2f}", "count": rng.randint(0, 5000)}
+        for service_id in range(1, services + 1)
+    ]
+    by_service = {str(row["application_id"]): {"cost": row["cost"], "count": row["count"]} for row in rows}
+    # Alias-heavy rows: the lower-priority names only, so every probe falls through
+    aliased = [{"service_id": row["application_id"], "amount": row["cost"], "available": row["count"]} for row in rows]
+    return {
+        "list": rows,
+        "list (aliases)": aliased,
+        "dict": by_service,
+        "dict (nested)": {"0": by_service}
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--services", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    shapes = payloads(args.services)
+    for shape, payload in shapes.items():
+        report(f"parse {shape}", repeat(lambda: price_sheet.parse(payload, MARGIN), args.rounds))
+
+    sheet = price_sheet.parse(shapes["list"], MARGIN)
+    ids = list(sheet)
+    report(f"get x{len(ids)}", repeat(lambda: [sheet.get(service_id) for service_id in ids], args.rounds))
+
+    applications = {service_id: f"service {service_id}" for service_id in ids}
+    report("parse + services join", repeat(lambda: price_sheet.parse(shapes["list"], MARGIN).services(applications, 91), args.rounds))
+    report("services join (memoized)", repeat(lambda: sheet.services(applications, 91), args.rounds))
+
+if __name__ == "__main__":
+    main()
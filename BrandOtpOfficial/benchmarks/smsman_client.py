@@ -0,0 +1,86 @@
+# benchmarks/smsman_client.py
+"""
+SMSMan client benchmark against a local stub API: concurrent buy_number and
+get_sms calls through the shared pooled client, and the same load with a new
+client per call (how every call worked before the shared client). Reports
+p50/p99 per operation and how many TCP connections the stub accepted.
+
+    python -m benchmarks.smsman_client [--calls 500] [--concurrency 50] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+# Before the client module reads them: a key so calls are made, and no rate limit in the way
+os.environ.setdefault("SMSMAN_API_KEY", "benchmark")
+os.environ.setdefault("SMSMAN_RATE", "100000")
+os.environ.setdefault("SMSMAN_BURST", "100000")
+
+import httpx
+
+from backend.utils import smsman_client
+from benchmarks._stub_server import StubServer
+from benchmarks._timing import report
+
+_numbers = itertools.count(1)
+
+def _buy(method, params):
+    request_id = next(_numbers)
+    return 200, {"request_id": request_id, "number": f"9199{request_id:08d}"}
+
+def _sms(method, params):
+    return 200, {"request_id": params.get("request_id"), "sms_code": "123456"}
+
+async def _timed(fn, *args):
+    start = time.perf_counter()
+    result = await fn(*args)
+    return time.perf_counter() - start, result
+
+async def _run(fn, calls: int, concurrency: int, args):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            return await _timed(fn, *args(i))
+
+    results = await asyncio.gather(*(one(i) for i in range(calls)))
+    errors = sum(1 for _, result in results if result.get("status") == "error")
+    return [elapsed for elapsed, _ in results], errors
+
+async def _fresh_client_get(path: str, operation: str, **params):
+    # The pre-pooling shape: a new client (and connection) for every call
+    async with httpx.AsyncClient(base_url=smsman_client.SMSMAN_BASE_URL) as client:
+        return await client.get(path, params={"token": smsman_client.SMSMAN_API_KEY, **params},
+                                timeout=smsman_client._TIMEOUTS[operation])
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub response delay in seconds")
+    args = parser.parse_args()
+
+    server = StubServer({"/get-number": _buy, "/get-sms": _sms}, latency=args.latency).start()
+    smsman_client.SMSMAN_BASE_URL = server.url
+    print(f"🧪 Stub SMSMan at {server.url}, {args.latency * 1000:.0f}ms latency")
+
+    try:
+        await smsman_client.start_client()
+        for label in ("shared client", "client per call"):
+            if label == "client per call":
+                smsman_client._get = _fresh_client_get
+            connections = server.connections
+            samples, errors = await _run(smsman_client.buy_number, args.calls, args.concurrency, lambda i: (1, 91))
+            report(f"{label} buy_number", samples)
+            # Distinct request ids, so single_flight does not coalesce the polls
+            samples, errors_sms = await _run(smsman_client.get_sms, args.calls, args.concurrency, lambda i: (str(i),))
+            report(f"{label} get_sms", samples)
+            print(f"   connections opened: {server.connections - connections}, errors: {errors + errors_sms}")
+    finally:
+        await smsman_client.close_client()
+        server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+# benchmarks/sqlite_history.py
+"""
+History reads during writes on the SQLite store: writer tasks insert and
+update number_orders while reader tasks page /api/history/numbers for the
+same users, all through run_sqlite. It then runs the same load with a fresh
+rollback-journal connection per call, which is how the routes used SQLite
+before sqlite_store. It reports read and write latency and any "database is
+locked" failures. Uses throwaway database files in a temp directory.
+
+    python -m benchmarks.sqlite_history [--writes 2000] [--reads 2000] [--users 20]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+_tmp = tempfile.TemporaryDirectory(prefix="sqlite-history-")
+os.environ["SQLITE_PATH"] = os.path.join(_tmp.name, "pooled.db")  # Before sqlite_store reads it
+
+from backend import sqlite_store
+from benchmarks._timing import report
+
+_orders = itertools.count(1)
+
+def _per_call(path: str, fn):
+    """The pre-pool shape: connect, run one statement, close (default journal mode)"""
+    def call(*args):
+        with closing(sqlite3.connect(path, timeout=5)) as conn:
+            conn.row_factory = sqlite3.Row
+            sqlite_store._local.conn = conn  # Route the store's queries through this connection
+            try:
+                result = fn(*args)
+                conn.commit()
+                return result
+            finally:
+                sqlite_store._local.conn = None
+    return call
+
+async def _load(label: str, run, calls, writes: int, reads: int, users: int) -> None:
+    insert, update, history = calls
+    write_latencies, read_latencies, errors = [], [], []
+
+    async def timed(samples, fn, *args):
+        start = time.perf_counter()
+        try:
+            await run(fn, *args)
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+            return
+        samples.append(time.perf_counter() - start)
+
+    async def write(i):
+        order_id = f"BENCH{next(_orders)}"
+        await timed(write_latencies, insert, order_id, i % users, "whatsapp", "+910000000000", "India", 12.5)
+        await timed(write_latencies, update, order_id, "received", "completed")
+
+    async def read(i):
+        await timed(read_latencies, history, i % users, 50)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(write(i) for i in range(writes)), *(read(i) for i in range(reads)))
+    elapsed = time.perf_counter() - start
+
+    report(f"{label} write", write_latencies)
+    report(f"{label} history read", read_latencies)
+    locked = sum("locked" in error for error in errors)
+    print(f"   {(2 * writes + reads) / elapsed:.0f} statements/s, {len(errors)} errors ({locked} database is locked)")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+    queries = (sqlite_store.insert_number_order, sqlite_store.update_number_order_status, sqlite_store.list_number_orders)
+
+    print(f"🧪 {args.writes} orders written (insert + update) and {args.reads} history reads, "
+          f"{sqlite_store.SQLITE_WORKERS} SQLite workers")
+    try:
+        await sqlite_store.run_sqlite(sqlite_store.init_schema)
+        await _load("pooled WAL", sqlite_store.run_sqlite, queries, args.writes, args.reads, args.users)
+    finally:
+        sqlite_store.close_connections()
+
+    # Same load, a connection per call on threads of the default executor
+    path = os.path.join(_tmp.name, "per_call.db")
+    with closing(sqlite3.connect(path)) as conn:
+        for statement in sqlite_store.SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+    loop = asyncio.get_running_loop()
+
+    async def run_per_call(fn, *args):
+        return await loop.run_in_executor(None, _per_call(path, fn), *args)
+
+    await _load("connection per call", run_per_call, queries, args.writes, args.reads, args.users)
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        _tmp.cleanup()
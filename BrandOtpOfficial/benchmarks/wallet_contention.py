@@ -0,0 +1,83 @@
+# benchmarks/wallet_contention.py
+"""
+Hammers one wallet with concurrent debits and credits through
+apply_wallet_change and checks the books afterwards: the final balance must
+equal the starting balance plus every successful change, it must never go
+negative, and the ledger must hold exactly one entry per successful change.
+Reports per-change latency and throughput.
+
+Nothing touches the app's database: the user and the ledger live in a
+separate throwaway database (<DB_NAME>_wallet_benchmark, dropped
+afterwards), and record_wallet_change is patched out for the run so the
+shared stats_rollups totals and day buckets are not incremented. Needs a
+reachable MongoDB in MONGO_URI (a replica set to exercise the
+transactional path):
+
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.wallet_contention [--changes 1000]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from backend.db import DB_NAME, client, run_db
+from backend.utils import wallet_utils
+from benchmarks._timing import report
+
+BENCHMARK_DB = f"{DB_NAME}_wallet_benchmark"
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--changes", type=int, default=1000)
+    parser.add_argument("--start-balance", type=float, default=100.0)
+    args = parser.parse_args()
+
+    bench_db = client[BENCHMARK_DB]
+    users_collection = bench_db["users"]
+    ledger = bench_db["wallet_ledger"]
+    # apply_wallet_change reads the module globals: point it at the throwaway
+    # users and keep the admin stats rollups out of it
+    wallet_utils.users_collection = users_collection
+    wallet_utils.record_wallet_change = lambda delta, ledger_entry: None
+
+    user_oid = users_collection.insert_one({
+        "email": f"wallet-benchmark-{time.time_ns()}@example.invalid",
+        "balance": args.start_balance
+    }).inserted_id
+    user_id = str(user_oid)
+    rng = random.Random(8)
+    # Mostly debits, so the balance guard is hit under contention
+    deltas = [round(rng.uniform(1, 10), 2) * (1 if rng.random() < 0.3 else -1) for _ in range(args.changes)]
+    print(f"🧪 {args.changes} concurrent changes on one wallet, starting at ₹{args.start_balance}")
+
+    latencies = []
+
+    async def change(delta):
+        start = time.perf_counter()
+        result = await run_db(wallet_utils.apply_wallet_change, user_id, delta, "benchmark", ledger)
+        latencies.append(time.perf_counter() - start)
+        return delta, result
+
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(change(delta) for delta in deltas))
+        elapsed = time.perf_counter() - start
+
+        applied = [delta for delta, result in results if result["success"]]
+        refused = [result["error"] for _, result in results if not result["success"]]
+        balance = users_collection.find_one({"_id": user_oid}, {"balance": 1})["balance"]
+        expected = round(args.start_balance + sum(applied), 2)
+        entries = ledger.count_documents({"user_id": user_id})
+        negative = ledger.count_documents({"user_id": user_id, "new_balance": {"$lt": 0}})
+
+        report("apply_wallet_change", latencies)
+        print(f"   {args.changes / elapsed:.1f} changes/s, {len(applied)} applied, {len(refused)} refused "
+              f"({refused.count('Insufficient balance')} insufficient balance)")
+        print(f"   balance ₹{round(balance, 2)} (expected ₹{expected}), ledger entries {entries} (expected {len(applied)}), {negative} went negative")
+        ok = abs(balance - expected) < 0.01 and not negative and entries == len(applied)
+        print("✅ Books balance" if ok else "❌ Books do not balance")
+    finally:
+        client.drop_database(BENCHMARK_DB)
+
+if __name__ == "__main__":
+    asyncio.run(main())
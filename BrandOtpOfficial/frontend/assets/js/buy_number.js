@@ -11,6 +11,7 @@ let allServices = [];
 let filteredServices = [];
 let currentPurchase = null;
 let smsCheckInterval = null;
+let smsEventSource = null;
 let countdownInterval = null;
 let secondsLeft = 5;
 
@@ -418,10 +419,10 @@ function displayPurchasedNumber(data) {
 // ===== SMS CHECKING FUNCTIONS =====
 
 function startSMSChecking() {
-    timerBadge.style.display = 'inline-block';
-    checkForSMS();
-    smsCheckInterval = setInterval(checkForSMS, 5000);
-    startCountdown();
+    // ✅ Prefer the server-push stream; fall back to polling if unavailable
+    if (!startSMSStream()) {
+        startSMSPolling();
+    }
     
     setTimeout(() => {
         stopSMSChecking();
@@ -432,6 +433,65 @@ function startSMSChecking() {
     }, 300000);
 }
 
+function startSMSPolling() {
+    timerBadge.style.display = 'inline-block';
+    checkForSMS();
+    smsCheckInterval = setInterval(checkForSMS, 5000);
+    startCountdown();
+}
+
+function startSMSStream() {
+    if (typeof EventSource === 'undefined' || !currentPurchase) return false;
+    
+    const token = localStorage.getItem('token');
+    const apiUrl = getApiUrl();
+    const streamUrl = `${apiUrl}/api/smsman/sms/${currentPurchase.request_id}/stream?token=${encodeURIComponent(token)}`;
+    
+    smsEventSource = new EventSource(streamUrl);
+    
+    smsEventSource.addEventListener('completed', (event) => {
+        const data = JSON.parse(event.data);
+        displaySMS({
+            code: data.sms_code,
+            message: data.sms_text || `Your verification code: ${data.sms_code}`,
+            from: data.sender || 'Service'
+        });
+        
+        stopSMSChecking();
+        numberStatus.textContent = '✅ SMS Received';
+        numberStatus.className = 'status-badge status-completed';
+        disableCancelButton();
+    });
+    
+    smsEventSource.addEventListener('cancelled', () => {
+        stopSMSChecking();
+    });
+    
+    smsEventSource.addEventListener('expired', () => {
+        stopSMSChecking();
+        numberStatus.textContent = '⏱️ SMS Timeout';
+        numberStatus.className = 'status-badge';
+    });
+    
+    smsEventSource.onerror = () => {
+        // Stream dropped (proxy timeout, server restart) - poll instead
+        console.warn('⚠️ SMS stream lost, falling back to polling');
+        closeSMSStream();
+        if (currentPurchase && !smsCheckInterval) {
+            startSMSPolling();
+        }
+    };
+    
+    return true;
+}
+
+function closeSMSStream() {
+    if (smsEventSource) {
+        smsEventSource.close();
+        smsEventSource = null;
+    }
+}
+
 function startCountdown() {
     secondsLeft = 5;
     countdown.textContent = secondsLeft;
@@ -446,6 +506,7 @@ function startCountdown() {
 }
 
 function stopSMSChecking() {
+    closeSMSStream();
     if (smsCheckInterval) {
         clearInterval(smsCheckInterval);
         smsCheckInterval = null;
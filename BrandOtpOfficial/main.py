@@ -8,10 +8,10 @@ from contextlib import suppress
 import asyncio
 import uvicorn
 import os
-import sqlite3
-import time
 from backend.utils.auth_utils import get_current_user as get_auth_user
-from backend.db import users_collection, payments_collection
+from backend.db import users_collection, payments_collection, run_db
+from backend import db_indexes, sqlite_store
+from backend.sqlite_store import run_sqlite
 from bson import ObjectId
 
 # Import routers
@@ -20,6 +20,11 @@ from backend.routes.pay0_order import router as pay0_router
 from backend.routes.payment_status import router as payment_status_router
 from backend.routes.webhook import router as webhook_router
 from backend.routes.auth import router as auth_router
+from backend.utils import smsman_client, price_refresher, pay0_client, purchase_saga, topups, job_queue
+from backend.utils import jobs  # noqa: F401 - registers the job handlers
+from backend.utils import upstream_guard
+from backend.utils.sms_poller import sms_hub
+from backend.utils.ids import new_order_id
 
 import hashlib
 import secrets
@@ -68,56 +73,6 @@ app.include_router(pay0_router, prefix="/api/payments", tags=["Payments"])
 app.include_router(payment_status_router, prefix="/api/payments", tags=["Payments"])
 app.include_router(webhook_router, prefix="/api/payments", tags=["Payments"])
 
-# Database initialization
-def init_database():
-    """Initialize database with required tables"""
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS number_orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        order_id TEXT UNIQUE NOT NULL,
-        user_id INTEGER NOT NULL,
-        service TEXT NOT NULL,
-        phone_number TEXT NOT NULL,
-        country TEXT NOT NULL,
-        amount REAL NOT NULL,
-        sms_status TEXT DEFAULT 'waiting',
-        order_status TEXT DEFAULT 'active',
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        balance REAL DEFAULT 0.0,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS wallet_transactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        transaction_id TEXT UNIQUE,
-        type TEXT NOT NULL,
-        amount REAL NOT NULL,
-        reason TEXT,
-        status TEXT DEFAULT 'completed',
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print("✅ Database tables initialized")
-
 # Exception Handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -163,21 +118,7 @@ async def get_number_history(request: Request):
         current_user = get_current_user(request)
         user_id = current_user["user_id"]
         
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT order_id, service, phone_number, country, amount, 
-                   sms_status, order_status, created_at 
-            FROM number_orders 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC
-            LIMIT 50
-        """, (user_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        rows = await run_sqlite(sqlite_store.list_number_orders, user_id, 50)
         
         formatted_history = []
         for row in rows:
@@ -212,21 +153,14 @@ async def buy_number_api(
         current_user = get_current_user(request)
         user_id = current_user["user_id"]
         
-        order_id = f"ORD{int(time.time())}"
+        order_id = new_order_id("ORD")
         phone_number = "+91 98765 43210"
         amount = 25.00
         
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO number_orders 
-            (order_id, user_id, service, phone_number, country, amount, sms_status, order_status)
-            VALUES (?, ?, ?, ?, ?, ?, 'waiting', 'active')
-        """, (order_id, user_id, service, phone_number, country, amount))
-        
-        conn.commit()
-        conn.close()
+        await run_sqlite(
+            sqlite_store.insert_number_order,
+            order_id, user_id, service, phone_number, country, amount
+        )
         
         return {
             "success": True,
@@ -251,9 +185,6 @@ async def update_sms_status(
 ):
     """Update SMS status when SMS is received"""
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
         if status == 'received':
             order_status = 'completed'
         elif status == 'timeout':
@@ -263,14 +194,7 @@ async def update_sms_status(
         else:
             order_status = 'active'
         
-        cursor.execute("""
-            UPDATE number_orders 
-            SET sms_status = ?, order_status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE order_id = ?
-        """, (status, order_status, order_id))
-        
-        conn.commit()
-        conn.close()
+        await run_sqlite(sqlite_store.update_number_order_status, order_id, status, order_status)
         
         return {"success": True, "message": f"Status updated to {status}"}
         
@@ -288,7 +212,7 @@ async def get_wallet_balance(current_user: dict = Depends(get_auth_user)):
     try:
         user_id = current_user.get("id")
         
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await run_db(users_collection.find_one, {"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -312,9 +236,9 @@ async def get_wallet_transactions(current_user: dict = Depends(get_auth_user)):
     try:
         user_id = current_user.get("id")
         
-        transactions_cursor = payments_collection.find(
+        transactions_cursor = await run_db(lambda: list(payments_collection.find(
             {"user_id": user_id}
-        ).sort("created_at", -1).limit(50)
+        ).sort("created_at", -1).limit(50)))
         
         transactions = []
         for txn in transactions_cursor:
@@ -461,11 +385,13 @@ async def serve_history():
 # API Health Check
 @app.get("/health")
 async def health_check():
+    upstreams = upstream_guard.health()
     return {
-        "status": "healthy",
+        "status": "degraded" if any(u["state"] != "closed" for u in upstreams) else "healthy",
         "service": "BrandOtp Official API",
         "version": "1.0.0",
-        "features": ["Authentication", "Wallet", "SMSMan Integration", "History Tracking"]
+        "features": ["Authentication", "Wallet", "SMSMan Integration", "History Tracking"],
+        "upstreams": upstreams
     }
 
 # API Root Check  
@@ -489,7 +415,15 @@ async def api_root():
 @app.on_event("startup")
 async def startup_event():
     print("🚀 BrandOtp API Starting...")
-    init_database()
+    await run_sqlite(sqlite_store.init_schema)
+    await run_db(db_indexes.ensure_indexes)
+    await smsman_client.start_client()
+    await pay0_client.start_client()
+    price_refresher.start()
+    sms_hub.start()
+    purchase_saga.start()
+    topups.start()
+    job_queue.start()
     print(f"📁 Frontend directory: {os.path.abspath(frontend_dir)}")
     print("✅ CORS enabled for Netlify deployments")
     print("🏠 Home: http://localhost:8000/")
@@ -506,6 +440,14 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     print("🛑 BrandOtp API Shutting down...")
+    await job_queue.stop()
+    await topups.stop()
+    await purchase_saga.stop()
+    await sms_hub.stop()
+    await price_refresher.stop()
+    await smsman_client.close_client()
+    await pay0_client.close_client()
+    sqlite_store.close_connections()
     with suppress(asyncio.CancelledError):
         await asyncio.sleep(0.1)
 
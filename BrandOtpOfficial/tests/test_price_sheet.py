@@ -0,0 +1,35 @@
+from backend.utils import price_sheet
+
+def test_alias_priority_does_not_depend_on_row_order():
+    sheet = price_sheet.parse([
+        {"application_id": 1, "cost": "abc", "price": 3},
+        {"application_id": 2, "cost": 4, "price": 9}
+    ], 1.0)
+    assert sheet.get(1).original == 3.0
+    assert sheet.get(2).original == 4.0
+
+    sheet = price_sheet.parse([
+        {"id": 5, "cost": 1},
+        {"application_id": 10, "id": 99, "cost": 2}
+    ], 1.0)
+    assert list(sheet) == [5, 10]
+
+def test_dict_shapes_and_margin():
+    sheet = price_sheet.parse({"0": {"7": {"cost": "3", "count": "2"}}, "8": {"price": 1}}, 1.7)
+    assert sorted(sheet) == [7, 8]
+    entry = sheet.get(7)
+    assert (entry.original, entry.count) == (3.0, 2)
+    assert round(entry.user_price, 2) == 5.1
+    assert sheet.get(9) is None
+
+def test_rows_without_id_or_cost_are_skipped():
+    sheet = price_sheet.parse([{"id": 0, "cost": 1}, {"id": 3}, {"id": 4, "cost": -1}, "junk"], 1.0)
+    assert not sheet
+
+def test_services_join_is_sorted_and_reused():
+    sheet = price_sheet.parse([{"id": 1, "cost": 2, "count": 5}, {"id": 2, "cost": 1}], 1.7)
+    applications = {1: "whatsapp", 2: "Telegram", 3: "Unpriced"}
+    services = sheet.services(applications, 91)
+    assert [s["name"] for s in services] == ["Telegram", "whatsapp"]
+    assert services[1]["pricing"]["availability"] == 5
+    assert sheet.services(applications, 91) is services
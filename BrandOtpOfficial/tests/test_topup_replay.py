@@ -0,0 +1,123 @@
+"""
+Pay0 retries webhooks, so the same SUCCESS delivery can arrive many times at
+once. Replays them concurrently against in-memory collections (mongomock)
+and checks the wallet is credited exactly once.
+"""
+import asyncio
+import functools
+import importlib
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("pymongo")
+mongomock = pytest.importorskip("mongomock")
+
+from bson import ObjectId
+
+DELIVERIES = 100
+COLLECTIONS = (
+    "users", "transactions", "services", "orders", "otp_requests", "wallets", "payments",
+    "numbers", "smsman_purchases", "purchase_sagas", "stats_rollups", "user_counters", "jobs"
+)
+MODULES = (
+    "backend.utils.topups", "backend.utils.wallet_utils", "backend.utils.user_counters",
+    "backend.utils.stats_rollups", "backend.utils.job_queue"
+)
+
+class _Atomic:
+    """A collection whose operations are each atomic, as they are on the server"""
+
+    def __init__(self, collection, lock):
+        self._collection = collection
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
+
+@pytest.fixture
+def topups(monkeypatch):
+    """backend.utils.topups (and what it writes through) bound to in-memory collections"""
+    db = mongomock.MongoClient()["brandotp"]
+    db["payments"].create_index("order_id", unique=True)
+    db["wallets"].create_index("order_id", unique=True, sparse=True)
+
+    lock = threading.RLock()
+    executor = ThreadPoolExecutor(max_workers=32)
+
+    async def run_db(fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    fake_db = types.ModuleType("backend.db")
+    fake_db.db = db
+    fake_db.get_db = lambda: db
+    fake_db.run_db = run_db
+    fake_db.run_in_transaction = lambda callback: callback(None)
+    for name in COLLECTIONS:
+        setattr(fake_db, f"{name}_collection", _Atomic(db[name], lock))
+
+    monkeypatch.setitem(sys.modules, "backend.db", fake_db)
+    for module in MODULES:
+        monkeypatch.delitem(sys.modules, module, raising=False)
+    module = importlib.import_module("backend.utils.topups")
+    yield module, fake_db
+    executor.shutdown(wait=True)
+    for name in MODULES:
+        sys.modules.pop(name, None)
+
+def test_concurrent_webhook_replays_credit_once(topups):
+    topups, db = topups
+    user_id = str(db.users_collection.insert_one({"email": "a@example.com", "balance": 0.0}).inserted_id)
+    order_id = "ORD_replay"
+    topups.record_pending(order_id, user_id, 50.0)
+
+    async def deliver():
+        # What the webhook and the status check do for a SUCCESS order
+        claimed = await db.run_db(topups.claim, order_id, user_id, 50.0, "Wallet Top-up via Pay0 Webhook", source="webhook")
+        if claimed:
+            await db.run_db(topups.enqueue_credit, order_id)
+        await db.run_db(topups.apply_credit, order_id)
+        return claimed
+
+    async def replay():
+        return await asyncio.gather(*(deliver() for _ in range(DELIVERIES)))
+
+    claims = asyncio.run(replay())
+
+    assert claims.count(True) == 1
+    assert db.jobs_collection.count_documents({"type": "topup_credit"}) == 1
+    assert db.wallets_collection.count_documents({"order_id": order_id}) == 1
+    user = db.users_collection.find_one({"_id": ObjectId(user_id)})
+    assert user["balance"] == 50.0
+    payment = db.payments_collection.find_one({"order_id": order_id})
+    assert (payment["status"], payment["credit_state"]) == ("SUCCESS", "credited")
+    assert db.user_counters_collection.find_one({"_id": user_id})["total_topups"] == 1
+
+    # A late replay after the credit is a no-op too
+    assert topups.claim(order_id, user_id, 50.0, "Wallet Top-up via Pay0 Webhook") is False
+    assert topups.apply_credit(order_id)["success"] is False
+    assert db.users_collection.find_one({"_id": ObjectId(user_id)})["balance"] == 50.0
+
+def test_claim_keeps_the_recorded_owner(topups):
+    topups, db = topups
+    owner_id = str(db.users_collection.insert_one({"email": "owner@example.com", "balance": 0.0}).inserted_id)
+    other_id = str(db.users_collection.insert_one({"email": "other@example.com", "balance": 0.0}).inserted_id)
+    topups.record_pending("ORD_owned", owner_id, 20.0)
+
+    # A status check by another account must not move the order to it
+    assert topups.claim("ORD_owned", other_id, 20.0, "Wallet Top-up via Pay0") is True
+    assert topups.owner("ORD_owned") == owner_id
+    assert topups.apply_credit("ORD_owned")["success"] is True
+    assert db.users_collection.find_one({"_id": ObjectId(owner_id)})["balance"] == 20.0
+    assert db.users_collection.find_one({"_id": ObjectId(other_id)})["balance"] == 0.0